@@ -3,10 +3,16 @@ import sys
 import streamlit as st
 import datetime
 import json
-from core.pipeline import run_4d_pipeline, build_candidates, get_session_snapshot
-from core.eval import evaluate_candidates, calc_heuristics
+from core.pipeline import stream_candidates, build_candidates, build_candidate_pool, get_session_snapshot
+from core.eval import evaluate_candidates_concurrent, evaluate_candidates_batched
+from core.graph import get_app_graph
 from core.utils import (estimate_token_count, flesch_reading_ease, inline_diff,
-                        load_history, save_session, export_prompt, find_session_by_id, generate_session_id)
+                        export_prompt, find_session_by_id, generate_session_id)
+from core.cache import get_response_cache
+from core.history import get_history_store
+from core import metrics, hedge
+from core.client import get_service_client
+from core import warmup
 from config.settings import get_config, get_openai_api_key
 
 import sys
@@ -14,6 +20,10 @@ from pathlib import Path
 
 # Add the parent directory of the current file to sys.path
 sys.path.append(str(Path(__file__).resolve().parent.parent)) 
+# Modules only needed once candidates exist (selection, compression, compare,
+# embeddings, archive) are imported where they are used, so the first render
+# doesn't wait for them; startup.prewarm loads the tokenizer and LLM clients
+# in the background meanwhile.
 
 # --- Initialization ---
 st.set_page_config(page_title="Prompt Optimizer", layout="wide")
@@ -21,6 +31,17 @@ config = get_config()
 os.environ["OPENAI_API_KEY"] = get_openai_api_key()
 HISTORY_PATH = "data/history.jsonl"
 EXPORTS_DIR = "exports"
+HISTORY_PAGE_SIZE = 20
+AB_HISTORY_SESSIONS = 50
+phase_graph = get_app_graph()
+history_store = get_history_store()
+embed_cfg = config.get("embeddings", {}) or {}
+pool_cfg = config.get("candidate_pool", {}) or {}
+compress_cfg = config.get("compression", {}) or {}
+compare_cfg = config.get("compare", {}) or {}
+service = get_service_client()  # None: run the pipeline in this process
+if service is None:
+    warmup.prewarm_from_settings(os.environ["OPENAI_API_KEY"], config)
 
 # --- Welcome Banner ---
 st.markdown(
@@ -33,11 +54,57 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
+# --- Sidebar: LLM response cache ---
+with st.sidebar:
+    bypass_cache = st.checkbox("Bypass LLM cache", value=False,
+                               help="Always call the API; fresh responses still refresh the cache.")
+    st.caption("Cache: {hits} hits / {misses} misses".format(**get_response_cache().stats()))
+    warm = warmup.prewarm_report()
+    if warm["status"] != "idle":
+        st.caption(f"Warm-up: {warm['status']}" + (f" in {warm['seconds']}s" if warm["status"] == "done" else ""))
+    if hedge.enabled():
+        hs = hedge.hedge_report("gpt-4o")
+        st.caption(f"Hedging: {hs['hedge_rate']:.0%} of {hs['calls']} generations hedged, "
+                   f"{hs['hedge_wins']} won by the hedge; p95 {hs['p95_s']}s vs primary-only {hs['primary_p95_s']}s")
+
 # --- UI State Management ---
 if 'session_id' not in st.session_state:
     st.session_state['session_id'] = generate_session_id()
-if 'history' not in st.session_state:
-    st.session_state['history'] = load_history(HISTORY_PATH)
+# Attribute this rerun's spans and LLM usage to the browser session
+metrics.bind_session(st.session_state['session_id'])
+
+@st.cache_resource
+def start_metrics_server(port: int):
+    """Binds the Prometheus endpoint once per process; returns the error if the port is unavailable."""
+    try:
+        metrics.start_metrics_server(port)
+    except OSError as e:
+        return f"Metrics server not started on port {port}: {e}"
+    return None
+
+if config.get("metrics", {}).get("prometheus_port"):
+    metrics_server_error = start_metrics_server(int(config["metrics"]["prometheus_port"]))
+    if metrics_server_error:
+        st.sidebar.warning(metrics_server_error)
+
+@st.cache_resource
+def backfill_embedding_index(index_dir: str):
+    """Indexes history the index has not seen yet, once per process; returns the error if any."""
+    try:
+        from core.embed_index import get_embedding_index, index_is_behind, backfill_index
+        index = get_embedding_index()
+        if index_is_behind(index, history_store):
+            backfill_index(index, history_store, os.environ["OPENAI_API_KEY"],
+                           model=embed_cfg.get("model", "text-embedding-3-large"),
+                           dimensions=embed_cfg.get("dimensions"))
+    except Exception as e:
+        return f"Could not backfill the similarity index: {e}"
+    return None
+
+if embed_cfg.get("enabled"):
+    backfill_error = backfill_embedding_index(embed_cfg.get("index_dir", "data/embeddings"))
+    if backfill_error:
+        st.sidebar.warning(backfill_error)
 
 # --- Inputs ---
 with st.form(key='main_form'):
@@ -64,20 +131,30 @@ if submit or not st.session_state.get('pipeline'):
         "audience": audience or None,
         "priority": None if priority == "None" else priority,
     }
-    # Run 4D pipeline
+    # Run 4D pipeline (memoized: unchanged inputs are served from the phase graph)
     try:
-        pipeline_out = run_4d_pipeline(
-            prompt,
-            task_type=task_type,
-            constraints=constraints,
-            openai_api_key=os.environ["OPENAI_API_KEY"]
-        )
+        pipeline_out = {
+            "deconstruct": phase_graph.evaluate("deconstruct", prompt=prompt, constraints=constraints),
+            "diagnose": phase_graph.evaluate("diagnose", prompt=prompt, constraints=constraints),
+        }
         st.session_state['pipeline'] = pipeline_out
         st.session_state['constraints'] = constraints
         st.session_state['last_prompt'] = prompt
     except Exception as e:
         st.error(f"Failed to analyze prompt: {str(e)}")
         st.stop()
+    # Look up near-duplicate past prompts (best effort: never blocks the analysis)
+    st.session_state['similar'] = []
+    if submit and embed_cfg.get("enabled"):
+        try:
+            from core.embed_index import get_embedding_index, find_similar_sessions
+            st.session_state['similar'] = find_similar_sessions(
+                get_embedding_index(), prompt, os.environ["OPENAI_API_KEY"],
+                k=embed_cfg.get("top_k", 3), model=embed_cfg.get("model", "text-embedding-3-large"),
+                dimensions=embed_cfg.get("dimensions")
+            )
+        except Exception as e:
+            st.warning(f"Similar-prompt lookup failed: {str(e)}")
 
 # --- Panels ---
 if 'pipeline' in st.session_state:
@@ -98,27 +175,126 @@ if 'pipeline' in st.session_state:
 
     with st.expander("3. Develop", expanded=True):
         # On button, call LLM to build candidates
+        def render_candidate(idx, c):
+            st.markdown(f"**Candidate {chr(64+idx)}** *(Strategy: {c['technique']}, Est. Tokens: {c['token_estimate']})*")
+            st.code(c['prompt'], language='markdown')
+            st.markdown(f"*Rationale:* {c['rationale']}")
+            if c.get('judge_mean') is not None:
+                st.caption(f"Tournament score {c['judge_mean']} over {c['judge_rounds']} round(s)")
+
+        # Offer stored candidates from a near-duplicate past session instead of a new LLM call
+        similar = [m for m in st.session_state.get('similar', []) if m['score'] >= embed_cfg.get("reuse_threshold", 0.92)]
+        if similar:
+            match = history_store.get(similar[0]['session_id'])
+            if match.get('candidates'):
+                st.info(f"Similar past prompt (similarity {similar[0]['score']:.2f}, {match.get('timestamp', '')}): "
+                        f"{match.get('prompt', '')[:80]}...")
+                if st.button("Reuse stored candidates"):
+                    st.session_state['candidates'] = match['candidates']
+
         if st.button("Generate Suggestions"):
-            try:
-                candidates = build_candidates(
-                    out['deconstruct'],
-                    task_type=task_type,
-                    constraints=st.session_state['constraints'],
-                    openai_api_key=os.environ["OPENAI_API_KEY"]
-                )
-                print(f"Generated {len(candidates)} candidates \n ", candidates)
-                st.session_state['candidates'] = candidates
-            except Exception as e:
-                st.error(f"Failed to generate candidates: {str(e)}")
-        if 'candidates' in st.session_state:
+            if pool_cfg.get("enabled"):
+                # Large pool: heuristic pre-filter, then a budgeted judge tournament
+                try:
+                    with st.spinner(f"Generating {pool_cfg.get('size', 20)} candidates and judging a shortlist..."):
+                        if service is not None:
+                            candidates, stats = service.generate_pool(
+                                out['deconstruct'],
+                                task_type=task_type,
+                                constraints=st.session_state['constraints'],
+                                pool=pool_cfg,
+                                use_cache=not bypass_cache,
+                                session_id=st.session_state['session_id']
+                            )
+                        else:
+                            from core.selection import select_candidates
+                            pool = build_candidate_pool(
+                                out['deconstruct'],
+                                task_type=task_type,
+                                constraints=st.session_state['constraints'],
+                                openai_api_key=os.environ["OPENAI_API_KEY"],
+                                pool_size=pool_cfg.get("size", 20),
+                                per_call=pool_cfg.get("per_call", 4),
+                                use_cache=not bypass_cache
+                            )
+                            candidates, stats = select_candidates(
+                                pool, "gpt-4o", os.environ["OPENAI_API_KEY"],
+                                prefilter_keep=pool_cfg.get("prefilter_keep", 8),
+                                max_prompt_tokens=pool_cfg.get("max_prompt_tokens"),
+                                final_k=pool_cfg.get("final_k", 3),
+                                eta=pool_cfg.get("eta", 2),
+                                group_size=pool_cfg.get("judge_group_size", 4),
+                                max_judge_calls=pool_cfg.get("max_judge_calls"),
+                                max_judge_tokens=pool_cfg.get("max_judge_tokens"),
+                                use_cache=not bypass_cache
+                            )
+                    st.caption(f"Pool {stats['pool']} → shortlist {stats['prefiltered']} → {len(candidates)} "
+                               f"in {stats['rounds']} round(s), {stats['judge_calls']} judge call(s) "
+                               f"(~{stats['judge_tokens_est']} tokens)")
+                    for idx, c in enumerate(candidates, 1):
+                        render_candidate(idx, c)
+                    st.session_state['candidates'] = candidates
+                except Exception as e:
+                    st.error(f"Failed to generate candidates: {str(e)}")
+            elif service is not None:
+                # Shared backend (service.url): generation runs on the service's worker pool
+                try:
+                    with st.spinner("Generating candidates..."):
+                        candidates = service.generate(
+                            out['deconstruct'],
+                            task_type=task_type,
+                            constraints=st.session_state['constraints'],
+                            use_cache=not bypass_cache,
+                            session_id=st.session_state['session_id']
+                        )
+                    for idx, c in enumerate(candidates, 1):
+                        render_candidate(idx, c)
+                    st.session_state['candidates'] = candidates
+                except Exception as e:
+                    st.error(f"Failed to generate candidates: {str(e)}")
+            elif hedge.enabled():
+                # Hedged: one full response (no streaming) raced against a delayed duplicate
+                try:
+                    with st.spinner("Generating candidates..."):
+                        candidates = build_candidates(
+                            out['deconstruct'],
+                            task_type=task_type,
+                            constraints=st.session_state['constraints'],
+                            openai_api_key=os.environ["OPENAI_API_KEY"],
+                            use_cache=not bypass_cache
+                        )
+                    for idx, c in enumerate(candidates, 1):
+                        render_candidate(idx, c)
+                    st.session_state['candidates'] = candidates
+                except Exception as e:
+                    st.error(f"Failed to generate candidates: {str(e)}")
+            else:
+                # Stream: render each candidate as soon as its block is parsed
+                candidates = []
+                try:
+                    with st.spinner("Generating candidates..."):
+                        for c in stream_candidates(
+                            out['deconstruct'],
+                            task_type=task_type,
+                            constraints=st.session_state['constraints'],
+                            openai_api_key=os.environ["OPENAI_API_KEY"],
+                            use_cache=not bypass_cache
+                        ):
+                            candidates.append(c)
+                            render_candidate(len(candidates), c)
+                    st.session_state['candidates'] = candidates
+                except Exception as e:
+                    st.error(f"Failed to generate candidates: {str(e)}")
+        elif 'candidates' in st.session_state:
             for idx, c in enumerate(st.session_state['candidates'], 1):
-                st.markdown(f"**Candidate {chr(64+idx)}** *(Strategy: {c['technique']}, Est. Tokens: {c['token_estimate']})*")
-                st.code(c['prompt'], language='markdown')
-                st.markdown(f"*Rationale:* {c['rationale']}")
+                render_candidate(idx, c)
 
     with st.expander("4. Deliver", expanded=True):
         # Candidate selection, usage, risk notes
-        if 'candidates' in st.session_state:
+        if 'candidates' in st.session_state and not st.session_state['candidates']:
+            # e.g. a restored session that was saved before any candidates were generated
+            st.info("No candidates to deliver yet. Generate candidates in Develop first.")
+        elif 'candidates' in st.session_state:
             chosen = st.radio("Select best candidate", [f"Candidate {chr(65+i)}" for i in range(len(st.session_state['candidates']))], horizontal=True)
             chosen_idx = ord(chosen[-1]) - 65
             best = st.session_state['candidates'][chosen_idx]
@@ -126,14 +302,74 @@ if 'pipeline' in st.session_state:
             st.markdown(f"- Target AI: {task_type} scenario\n- Estimated cost: {best['token_estimate']} tokens\n- Apply as: input for LLM, API, or workflow.")
             st.markdown("**Risk Notes**: Avoid sharing sensitive/regulated data; always review LLM outputs for critical use cases.")
 
+            # Compression: shrink the chosen prompt to a token budget set by the Priority constraint
+            from core.compress import compress_prompt, judge_delta, target_tokens, REWRITE_MODEL
+            st.markdown("**Compress**")
+            ratios = {(None if k == "default" else k): v for k, v in (compress_cfg.get("priority_ratios") or {}).items()}
+            ccol1, ccol2 = st.columns(2)
+            with ccol1:
+                budget = st.number_input(
+                    "Target tokens", min_value=1, key=f"compress_target_{chosen_idx}",
+                    value=target_tokens(max(1, best['token_estimate']), st.session_state['constraints'], ratios or None))
+            with ccol2:
+                use_rewrite = st.checkbox("LLM rewrite if still over budget", key=f"compress_rewrite_{chosen_idx}",
+                                          value=st.session_state['constraints'].get('priority') == "Cost")
+            if st.button("Compress"):
+                try:
+                    with st.spinner("Compressing..."):
+                        result = compress_prompt(
+                            best['prompt'], target=int(budget), llm_rewrite=use_rewrite,
+                            openai_api_key=os.environ["OPENAI_API_KEY"],
+                            rewrite_model=compress_cfg.get("rewrite_model", REWRITE_MODEL),
+                            use_cache=not bypass_cache
+                        )
+                        judged = judge_delta(best['prompt'], result['prompt'], "gpt-4o", os.environ["OPENAI_API_KEY"],
+                                             use_cache=not bypass_cache) if compress_cfg.get("judge_delta", True) else None
+                    st.session_state['compressed'] = {"idx": chosen_idx, "source": best['prompt'],
+                                                      "result": result, "judge": judged}
+                except Exception as e:
+                    st.error(f"Failed to compress prompt: {str(e)}")
+            compressed = st.session_state.get('compressed')
+            if compressed and compressed['idx'] == chosen_idx and compressed['source'] == best['prompt']:
+                r = compressed['result']
+                st.code(r['prompt'], language='markdown')
+                st.caption(f"Tokens: {r['original_tokens']} → {r['tokens']} (saved {r['saved_tokens']}, {r['saved_pct']}%) | "
+                           f"target {r['target_tokens']} {'met' if r['met_target'] else 'not met'} | "
+                           f"passes: {', '.join(f'{n} {t}' for n, t in r['passes'])}")
+                if compressed['judge'] and compressed['judge']['delta']:
+                    st.caption("Judge score delta (compressed − original): " +
+                               ", ".join(f"{k} {v:+d}" for k, v in compressed['judge']['delta'].items()))
+                if st.button("Use compressed prompt"):
+                    st.session_state['candidates'][chosen_idx] = dict(
+                        best, prompt=r['prompt'], token_estimate=r['tokens'], uncompressed_prompt=best['prompt'])
+                    st.session_state.pop('compressed')
+                    st.rerun()
+
             # Save/export section
             if st.button("Evaluate"):
-                evals = evaluate_candidates(
-                    st.session_state['candidates'],
-                    judge_model="gpt-4o",
-                    openai_api_key=os.environ["OPENAI_API_KEY"]
-                )
-                heuristics = [calc_heuristics(c['prompt']) for c in st.session_state['candidates']]
+                if service is not None:
+                    res = service.evaluate(st.session_state['candidates'], judge_model="gpt-4o",
+                                           use_cache=not bypass_cache, session_id=st.session_state['session_id'])
+                    evals = res["evaluations"]
+                elif config.get("judge_mode", "batched") == "batched":
+                    evals = evaluate_candidates_batched(
+                        st.session_state['candidates'],
+                        judge_model="gpt-4o",
+                        openai_api_key=os.environ["OPENAI_API_KEY"],
+                        max_retries=config.get("judge_max_retries", 1),
+                        use_cache=not bypass_cache
+                    )
+                else:
+                    evals = evaluate_candidates_concurrent(
+                        st.session_state['candidates'],
+                        judge_model="gpt-4o",
+                        openai_api_key=os.environ["OPENAI_API_KEY"],
+                        max_concurrency=config.get("judge_concurrency", 4),
+                        timeout=config.get("judge_timeout", 60),
+                        use_cache=not bypass_cache
+                    )
+                heuristics = phase_graph.evaluate(
+                    "heuristics", candidate_prompts=[c['prompt'] for c in st.session_state['candidates']])
                 for i, (ev, h) in enumerate(zip(evals, heuristics), 1):
                     st.markdown(f"**Candidate {chr(64+i)}**")
                     st.json({"LLM Judge": ev, "Heuristics": h})
@@ -148,43 +384,134 @@ if 'pipeline' in st.session_state:
                     constraints=st.session_state['constraints'],
                     task_type=task_type
                 )
-                md_path, json_path = export_prompt(session_meta, EXPORTS_DIR)
-                st.success(f"Exported to {md_path} and {json_path}")
-                save_session(session_meta, HISTORY_PATH)
-                # reload history
-                st.session_state['history'] = load_history(HISTORY_PATH)
+                if service is not None:
+                    # The service writes the exports and the history record on its side
+                    try:
+                        res = service.export(session_meta, session_id=st.session_state['session_id'])
+                        session_meta = res["session"]
+                        st.success(f"Exported to {res['markdown_path']} and {res['json_path']} (service)")
+                    except Exception as e:
+                        st.error(f"Export failed: {str(e)}")
+                        session_meta = None
+                else:
+                    md_path, json_path = export_prompt(session_meta, EXPORTS_DIR)
+                    st.success(f"Exported to {md_path} and {json_path}")
+                    # Indexed append: no need to reload the history
+                    with metrics.span("save_session"):
+                        history_store.append(session_meta)
+                if session_meta and embed_cfg.get("enabled"):
+                    try:
+                        from core.embed_index import get_embedding_index, index_sessions
+                        index_sessions(get_embedding_index(), [session_meta], os.environ["OPENAI_API_KEY"],
+                                       model=embed_cfg.get("model", "text-embedding-3-large"),
+                                       dimensions=embed_cfg.get("dimensions"))
+                    except Exception as e:
+                        st.warning(f"Could not index session for similarity search: {str(e)}")
+
+            if metrics.enabled():
+                st.markdown("**Session latency & cost**")
+                breakdown = metrics.session_breakdown(st.session_state['session_id'])
+                st.table([{"Phase": k, "Calls": v["count"], "Seconds": v["seconds"]} for k, v in breakdown["phases"].items()])
+                llm_usage = breakdown["llm"]
+                st.caption(f"LLM calls: {llm_usage['calls']} | Tokens in/out: {llm_usage['prompt_tokens']}/{llm_usage['completion_tokens']} "
+                           f"| Est. cost: ${llm_usage['cost_usd']:.4f}")
 
 # --- A/B Compare Section ---
 with st.expander("A/B Compare", expanded=False):
-    if 'candidates' in st.session_state:
-        # Current session only for v1 (historical in advanced)
-        a = st.selectbox("Prompt A", options=[f"Candidate {chr(65+i)}" for i in range(len(st.session_state['candidates']))])
-        b = st.selectbox("Prompt B", options=[f"Candidate {chr(65+i)}" for i in range(len(st.session_state['candidates'])) if f"Candidate {chr(65+i)}" != a])
-        idx_a, idx_b = ord(a[-1]) - 65, ord(b[-1]) - 65
-        diff = inline_diff(st.session_state['candidates'][idx_a]['prompt'], st.session_state['candidates'][idx_b]['prompt'])
-        st.markdown(f"**A/B Diff between {a} and {b}:**")
-        st.code(diff, language="diff")
+    source = st.radio("Compare candidates from", ["Current session", "History"], horizontal=True)
+    if source == "Current session":
+        pool = [{"label": f"Candidate {chr(65+i)}", "prompt": c['prompt'], "strategy": c.get('strategy', '')}
+                for i, c in enumerate(st.session_state.get('candidates', []))]
     else:
+        ab_tag = st.text_input("Sessions tagged", value="", key="ab_tag").strip() or None
+        summaries = history_store.list_summaries(limit=AB_HISTORY_SESSIONS, tag=ab_tag)
+        by_id = {h['session_id']: h for h in summaries}
+        picked = st.multiselect(
+            "Sessions", options=list(by_id),
+            default=list(by_id) if ab_tag else list(by_id)[:2],
+            format_func=lambda sid: f"{by_id[sid]['timestamp']} | {by_id[sid]['tags']} | {by_id[sid]['prompt'][:40]}"
+        )
+        # Full records only for the picked sessions
+        from core.compare import session_candidates
+        pool = session_candidates([history_store.get(sid) for sid in picked])
+    if len(pool) >= 2:
+        from core.compare import render_word_diff, redundant_pairs, REDUNDANT_THRESHOLD
+        labels = [c['label'] for c in pool]
+        col_a, col_b = st.columns(2)
+        with col_a:
+            idx_a = st.selectbox("Prompt A", options=range(len(pool)), format_func=lambda i: labels[i])
+        with col_b:
+            idx_b = st.selectbox("Prompt B", options=[i for i in range(len(pool)) if i != idx_a],
+                                 format_func=lambda i: labels[i])
+        prompt_a, prompt_b = pool[idx_a]['prompt'], pool[idx_b]['prompt']
+        st.markdown(f"**A/B Diff between {labels[idx_a]} and {labels[idx_b]}:**")
+        if st.radio("Diff granularity", ["Words", "Lines"], horizontal=True) == "Words":
+            wd = phase_graph.evaluate("word_diff", prompt_a=prompt_a, prompt_b=prompt_b)
+            st.caption(f"Similarity {wd['ratio']:.0%} | {wd['deleted']} words removed, {wd['inserted']} added")
+            st.markdown(render_word_diff(wd))
+        else:
+            st.code(phase_graph.evaluate("ab_diff", prompt_a=prompt_a, prompt_b=prompt_b), language="diff")
+
+        st.markdown(f"**Pairwise similarity ({len(pool)} candidates)**")
+        sim = phase_graph.evaluate("similarity", candidate_prompts=[c['prompt'] for c in pool])
+        st.dataframe({"Candidate": labels, **{l: [round(float(x), 2) for x in sim[:, j]] for j, l in enumerate(labels)}},
+                     hide_index=True)
+        redundant = redundant_pairs(labels, sim, compare_cfg.get("redundant_threshold", REDUNDANT_THRESHOLD))
+        if redundant:
+            st.warning("Possibly redundant strategies: " + "; ".join(f"{x} ~ {y} ({s:.2f})" for x, y, s in redundant))
+    elif source == "Current session":
         st.info("Generate suggestions to enable A/B compare.")
+    else:
+        st.info("Pick sessions with at least two candidates between them.")
 
 # --- History & Restore ---
 with st.expander("History", expanded=False):
-    history = st.session_state['history']
+    fcol1, fcol2, fcol3 = st.columns(3)
+    with fcol1:
+        tag_filter = st.text_input("Filter by tag", value="").strip() or None
+    with fcol2:
+        since = st.text_input("From (YYYY-MM-DD)", value="").strip() or None
+    with fcol3:
+        until = st.text_input("To (YYYY-MM-DD)", value="").strip() or None
+    # Summaries come from a process-wide view shared by all browser sessions
+    total = history_store.count_cached(tag=tag_filter, since=since, until=until)
+    pages = max((total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE, 1)
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+    history = history_store.list_summaries(offset=(page - 1) * HISTORY_PAGE_SIZE, limit=HISTORY_PAGE_SIZE,
+                                           tag=tag_filter, since=since, until=until)
+    ecol1, ecol2 = st.columns([1, 3])
+    with ecol1:
+        bulk_format = st.selectbox("Bulk export format", ["jsonl.gz", "csv.gz", "jsonl", "csv"])
+    with ecol2:
+        st.write("")
+        if st.button(f"Export {total} filtered sessions (plus archived)"):
+            out_path = os.path.join(EXPORTS_DIR, f"history_{datetime.datetime.now():%Y%m%d_%H%M%S}.{bulk_format}")
+            from core.archive import export_sessions, select_sessions
+            with st.spinner("Exporting history..."):
+                n = export_sessions(select_sessions(history_store, tag=tag_filter, since=since, until=until,
+                                                    archive_dir=history_store.archive_dir), out_path)
+            st.success(f"Exported {n} sessions to {out_path}")
     if history:
-        for h in reversed(history):
-            tag = h.get('tags', "No tag")
-            ts = h.get('timestamp', "")
+        for h in history:
+            tag = h['tags'] or "No tag"
+            ts = h['timestamp']
             st.markdown(f"**{ts}** | **{tag}**")
-            st.markdown(f"- **Prompt:** {h.get('prompt','')[:60]}...")
-            if st.button(f"Restore session {ts}", key=ts):
-                st.session_state['pipeline'] = {
-                    'deconstruct': h['deconstruct'],
-                    'diagnose': h['diagnose']
-                }
-                st.session_state['candidates'] = h['candidates']
-                st.session_state['constraints'] = h.get('constraints', {})
-                st.session_state['last_prompt'] = h.get('prompt', "")
-                st.success(f"Restored session from {ts}")
+            st.markdown(f"- **Prompt:** {h['prompt'][:60]}...")
+            if st.button(f"Restore session {ts}", key=h['session_id'] or ts):
+                # Only now is the full record read
+                full = history_store.get(h['session_id'])
+                if not full or 'deconstruct' not in full:
+                    # Removed or archived since the list was built, or a truncated record
+                    st.error(f"Session {h['session_id'] or ts} could not be loaded from the history.")
+                else:
+                    st.session_state['pipeline'] = {
+                        'deconstruct': full['deconstruct'],
+                        'diagnose': full.get('diagnose') or {"issues": []}
+                    }
+                    st.session_state['candidates'] = full.get('candidates') or []
+                    st.session_state['constraints'] = full.get('constraints', {})
+                    st.session_state['last_prompt'] = full.get('prompt', "")
+                    st.success(f"Restored session from {ts}")
     else:
         st.info("No history found.")
 
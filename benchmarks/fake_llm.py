@@ -0,0 +1,131 @@
+import re
+import json
+import zlib
+import time
+import random
+import asyncio
+import contextlib
+from typing import Iterator, Optional
+
+# --- Deterministic stand-in for llama_index's OpenAI LLM ---
+# Implements the subset of the LLM interface the app uses (complete /
+# acomplete / stream_complete) with configurable latency and jitter, so the
+# pipeline can be measured without network access or API spend.
+
+STRATEGIES = [
+    "Multi-perspective framing with explicit tone and audience.",
+    "Role assignment plus layered context.",
+    "Constraint-driven (word limit/style) + creativity boost.",
+]
+
+def fake_generation_text(n_candidates: int = 3, prompt_words: int = 60, variant: str = "") -> str:
+    body = " ".join(["Write a concise, engaging product-launch email for small businesses."] * max(1, prompt_words // 10))
+    blocks = []
+    for i in range(n_candidates):
+        label = chr(65 + i % 26)
+        blocks.append(
+            f"Candidate {label}:\n"
+            f"Strategy: {STRATEGIES[i % len(STRATEGIES)]}\n"
+            f"Prompt: \"{body} Variant {variant}{i}.\"\n"
+            f"Rationale: Keeps the audience and constraints explicit for variant {i}.\n"
+        )
+    return "\n".join(blocks)
+
+def _fake_scores(text: str) -> dict:
+    # Scores derived from the prompt text: deterministic across runs
+    h = sum(map(ord, text)) if text else 0
+    keys = ["Clarity", "Completeness", "Constraint coverage", "Testability", "Safety"]
+    return {k: 1 + (h >> (3 * i)) % 5 for i, k in enumerate(keys)}
+
+def fake_judge_text(prompt: str) -> str:
+    return json.dumps(_fake_scores(prompt))
+
+def fake_batch_judge_text(prompt: str) -> str:
+    # One entry per "### <label>" block of the batched judge prompt
+    blocks = re.findall(r'^### (\S+)\n(.*?)(?=^### |\Z)', prompt, re.M | re.S)
+    return json.dumps({label: _fake_scores(body) for label, body in blocks})
+
+class FakeResponse:
+    def __init__(self, text: str, delta: Optional[str] = None):
+        self.text = text
+        self.delta = delta
+        self.raw = None
+
+class FakeLLM:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, n_candidates: int = 3,
+                 seed: int = 0, chunk_size: int = 16, tail_prob: float = 0.0, tail_latency: float = 0.0, **kwargs):
+        self.latency = latency
+        self.jitter = jitter
+        # Heavy tail: with probability tail_prob a call takes tail_latency longer
+        self.tail_prob = tail_prob
+        self.tail_latency = tail_latency
+        self.n_candidates = n_candidates
+        self.chunk_size = chunk_size
+        self.model = kwargs.get("model", "fake")
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _delay(self) -> float:
+        tail = self.tail_latency if self._rng.random() < self.tail_prob else 0.0
+        return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)) + tail
+
+    def _text(self, prompt: str) -> str:
+        if "prompt evaluator" in prompt:
+            return fake_batch_judge_text(prompt) if "\n### " in prompt else fake_judge_text(prompt)
+        m = re.search(r'Produce (\d+) optimized prompt candidates', prompt)
+        # Distinct generation prompts (e.g. pool slices) get distinct candidates
+        variant = f"{zlib.crc32(prompt.encode('utf-8')) % 1000}-"
+        return fake_generation_text(int(m.group(1)) if m else self.n_candidates, variant=variant)
+
+    def complete(self, prompt: str, **kwargs) -> FakeResponse:
+        self.calls += 1
+        time.sleep(self._delay())
+        return FakeResponse(self._text(prompt))
+
+    async def acomplete(self, prompt: str, **kwargs) -> FakeResponse:
+        self.calls += 1
+        await asyncio.sleep(self._delay())
+        return FakeResponse(self._text(prompt))
+
+    def stream_complete(self, prompt: str, **kwargs) -> Iterator[FakeResponse]:
+        self.calls += 1
+        text = self._text(prompt)
+        n_chunks = max(1, len(text) // self.chunk_size)
+        per_chunk = self._delay() / n_chunks
+        acc = ""
+        for i in range(0, len(text), self.chunk_size):
+            time.sleep(per_chunk)
+            delta = text[i:i + self.chunk_size]
+            acc += delta
+            yield FakeResponse(acc, delta)
+
+@contextlib.contextmanager
+def use_fake_llm(latency: float = 0.05, jitter: float = 0.0, n_candidates: int = 3, seed: int = 0,
+                 tail_prob: float = 0.0, tail_latency: float = 0.0):
+    """
+    Makes the core.llm client pool hand out FakeLLM instances and disables the
+    response cache and rate limiter for the duration of the block.
+    """
+    import core.llm
+    from core import ratelimit
+    from core.cache import get_response_cache
+
+    rng = random.Random(seed)
+
+    def factory(model, api_key, params):
+        return FakeLLM(latency=latency, jitter=jitter, n_candidates=n_candidates,
+                       seed=rng.randrange(1 << 30), tail_prob=tail_prob, tail_latency=tail_latency, model=model)
+
+    cache = get_response_cache()
+    saved = (core.llm._new_llm, cache.enabled)
+    saved_limits = dict(ratelimit._settings())
+    core.llm.clear_llm_pool()
+    core.llm._new_llm = factory
+    cache.enabled = False
+    ratelimit.configure(**dict(saved_limits, enabled=False))
+    try:
+        yield factory
+    finally:
+        core.llm._new_llm, cache.enabled = saved
+        ratelimit.configure(**saved_limits)
+        core.llm.clear_llm_pool()
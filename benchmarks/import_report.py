@@ -0,0 +1,96 @@
+"""
+Import-time report for cold starts.
+
+    python -m benchmarks.import_report [--budget-ms 800] [--json]
+
+Imports what app.py needs before its first render in a fresh interpreter
+(python -X importtime), then each deferred module on top of that. Reports
+cumulative milliseconds per module and the slowest transitive imports. It
+exits non-zero if the startup set exceeds --budget-ms or pulls in a module
+that is meant to load lazily (llama_index, numpy, openai, tiktoken), so regressions fail CI.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py imports at module top
+STARTUP_MODULES = ["streamlit", "config.settings", "core.pipeline", "core.eval", "core.graph", "core.utils",
+                   "core.cache", "core.history", "core.metrics", "core.hedge", "core.client", "core.warmup"]
+# Imported on first use (Generate / Evaluate / Compress / Compare / similarity lookup)
+DEFERRED_MODULES = ["core.selection", "core.compress", "core.compare", "core.embed_index",
+                    "llama_index.llms.openai", "llama_index.embeddings.openai"]
+# Top-level packages that must not load before the first render
+LAZY_PACKAGES = ["llama_index", "numpy", "openai", "tiktoken"]
+
+def _importtime(statements: str) -> List[Dict]:
+    """Runs statements in a fresh interpreter; returns [{module, self_ms, cumulative_ms, depth}]."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statements],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+                     "self_ms": int(self_us) / 1000.0, "cumulative_ms": int(cum_us) / 1000.0})
+    return rows
+
+def _top_level(rows: List[Dict], modules: List[str]) -> Dict[str, float]:
+    # A module appears once, under whichever import pulled it in first
+    found = {r["module"]: r["cumulative_ms"] for r in rows}
+    return {m: round(found.get(m, 0.0), 1) for m in modules}
+
+def import_report(top: int = 10) -> Dict:
+    preamble = "import sys; sys.path.insert(0, '.'); "
+    startup = _importtime(preamble + "; ".join(f"import {m}" for m in STARTUP_MODULES))
+    loaded = {r["module"] for r in startup}
+    deferred = {}
+    for m in DEFERRED_MODULES:
+        rows = _importtime(preamble + "; ".join(f"import {s}" for s in STARTUP_MODULES) + f"; import {m}")
+        # Cost of m on top of an already-started app
+        deferred[m] = round(sum(r["self_ms"] for r in rows if r["module"] not in loaded), 1)
+    return {
+        "startup_total_ms": round(sum(r["self_ms"] for r in startup), 1),
+        "startup_modules_ms": _top_level(startup, STARTUP_MODULES),
+        "deferred_extra_ms": deferred,
+        "lazy_packages_loaded_at_startup": [p for p in LAZY_PACKAGES if p in loaded],
+        "slowest_self_ms": [{"module": r["module"], "self_ms": round(r["self_ms"], 1)}
+                            for r in sorted(startup, key=lambda r: r["self_ms"], reverse=True)[:top]],
+    }
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Report import time of the app's startup path.")
+    ap.add_argument("--budget-ms", type=float, default=None, help="Fail if startup imports take longer")
+    ap.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = ap.parse_args(argv)
+    report = import_report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Startup imports: {report['startup_total_ms']} ms")
+        for m, ms in report["startup_modules_ms"].items():
+            print(f"  {m:<32} {ms:>8.1f} ms")
+        print("Deferred (first use):")
+        for m, ms in report["deferred_extra_ms"].items():
+            print(f"  {m:<32} {ms:>8.1f} ms")
+        print("Slowest single modules at startup:")
+        for r in report["slowest_self_ms"]:
+            print(f"  {r['module']:<32} {r['self_ms']:>8.1f} ms")
+    failures = []
+    if report["lazy_packages_loaded_at_startup"]:
+        failures.append(f"loaded at startup but meant to be lazy: {report['lazy_packages_loaded_at_startup']}")
+    if args.budget_ms is not None and report["startup_total_ms"] > args.budget_ms:
+        failures.append(f"startup imports {report['startup_total_ms']} ms > budget {args.budget_ms} ms")
+    for f in failures:
+        print(f"FAIL: {f}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
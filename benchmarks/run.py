@@ -0,0 +1,219 @@
+"""
+Performance benchmarks with a local fake LLM (no network, no API spend).
+
+    python -m benchmarks.run --out bench.json
+
+Every result is written as machine-readable JSON so runs can be compared
+across versions (see the "meta" block for the git revision).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import statistics
+import contextlib
+import subprocess
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.fake_llm import use_fake_llm, fake_generation_text
+from benchmarks.import_report import import_report
+from core.pipeline import run_4d_pipeline, build_candidates, build_candidate_pool, extract_candidates
+from core.selection import select_candidates
+from core import hedge, metrics
+from core.eval import evaluate_candidates_concurrent, evaluate_candidates_batched, calc_heuristics, calc_heuristics_batch
+from core.utils import load_history
+
+SAMPLE_PROMPT = ("Write a product-launch email for our new SaaS app for small businesses. "
+                 "Include a persuasive CTA and keep it under 120 words.")
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_s": round(statistics.fmean(samples), 6),
+        "p50_s": round(samples[len(samples) // 2], 6),
+        "p95_s": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 6),
+        "min_s": round(samples[0], 6),
+        "max_s": round(samples[-1], 6),
+    }
+
+def _time(fn: Callable, repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+@contextlib.contextmanager
+def _metrics_disabled():
+    # Spans would otherwise land in the app's own trace file (metrics.trace_path) and
+    # add their overhead to the timings; settings.yaml is re-read afterwards
+    metrics.configure(enabled=False)
+    try:
+        yield
+    finally:
+        metrics._configure_from_settings()
+
+def bench_end_to_end(repeat: int, latency: float, jitter: float) -> Dict:
+    constraints = {"word_limit": 120, "tone": None, "style": None, "audience": None, "priority": None}
+    phases = {"analyze": [], "generate": [], "evaluate": [], "evaluate_batched": [], "heuristics": [], "total": []}
+    with use_fake_llm(latency=latency, jitter=jitter):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = run_4d_pipeline(SAMPLE_PROMPT, "Creative", constraints, "fake-key")
+            t1 = time.perf_counter()
+            candidates = build_candidates(out["deconstruct"], "Creative", constraints, "fake-key", use_cache=False)
+            t2 = time.perf_counter()
+            evaluate_candidates_concurrent(candidates, "gpt-4o", "fake-key", use_cache=False)
+            t3 = time.perf_counter()
+            evaluate_candidates_batched(candidates, "gpt-4o", "fake-key", use_cache=False)
+            t4 = time.perf_counter()
+            [calc_heuristics(c["prompt"]) for c in candidates]
+            t5 = time.perf_counter()
+            for k, v in zip(phases, [t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t5 - t0]):
+                phases[k].append(v)
+    return {"llm_latency_s": latency, "llm_jitter_s": jitter,
+            "phases": {k: _summary(v) for k, v in phases.items()}}
+
+def bench_extract_candidates(sizes: List[int], repeat: int) -> Dict:
+    results = {}
+    for n in sizes:
+        text = fake_generation_text(n_candidates=n, prompt_words=120)
+        samples = _time(lambda: extract_candidates(text), repeat)
+        best = min(samples)
+        results[str(n)] = {
+            "bytes": len(text.encode("utf-8")),
+            **_summary(samples),
+            "candidates_per_s": round(n / best, 1),
+            "mb_per_s": round(len(text.encode("utf-8")) / best / 1e6, 3),
+        }
+    return results
+
+def bench_candidate_pool(sizes: List[int], latency: float) -> Dict:
+    """Judge calls and wall time to pick 3 of N with pre-filter + successive halving."""
+    out = run_4d_pipeline(SAMPLE_PROMPT, "Creative", {}, "fake-key")
+    results = {}
+    with use_fake_llm(latency=latency):
+        for n in sizes:
+            t0 = time.perf_counter()
+            pool = build_candidate_pool(out["deconstruct"], "Creative", {}, "fake-key", pool_size=n,
+                                        per_call=4, use_cache=False)
+            t1 = time.perf_counter()
+            _, stats = select_candidates(pool, "gpt-4o", "fake-key", prefilter_keep=8, use_cache=False)
+            t2 = time.perf_counter()
+            results[str(n)] = {"generate_s": round(t1 - t0, 6), "select_s": round(t2 - t1, 6), **stats}
+    return results
+
+def bench_hedging(n_calls: int, latency: float, tail_prob: float = 0.1, tail_latency: float = 1.0) -> Dict:
+    """build_candidates latency on a heavy-tailed fake LLM, without and with hedging."""
+    out = run_4d_pipeline(SAMPLE_PROMPT, "Creative", {}, "fake-key")
+    saved_cfg = dict(hedge.hedging_settings())
+    results = {}
+    try:
+        for mode in ("off", "on"):
+            hedge.configure(**dict(saved_cfg, enabled=mode == "on", fallback_model=None,
+                                   min_samples=10, default_delay=latency * 3, min_delay=0.0))
+            hedge.latency_tracker = hedge.LatencyTracker()
+            hedge.hedge_stats = hedge.HedgeStats()
+            with use_fake_llm(latency=latency, jitter=latency / 4, tail_prob=tail_prob,
+                              tail_latency=tail_latency):
+                samples = _time(lambda: build_candidates(out["deconstruct"], "Creative", {}, "fake-key",
+                                                         use_cache=False), n_calls)
+            results[mode] = {**_summary(samples), **({"hedge": hedge.hedge_stats.snapshot()} if mode == "on" else {})}
+    finally:
+        hedge.configure(**saved_cfg)
+    return {"llm_latency_s": latency, "tail_prob": tail_prob, "tail_latency_s": tail_latency, **results}
+
+def _synthetic_session(i: int) -> Dict:
+    return {
+        "session_id": f"bench{i:09d}",
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_700_000_000 + i * 60)),
+        "prompt": SAMPLE_PROMPT,
+        "deconstruct": {"intent": SAMPLE_PROMPT, "entities": ["write", "include"], "context": "",
+                        "output_specs": "", "constraints": {}, "missing": []},
+        "diagnose": {"issues": ["No context provided."]},
+        "candidates": [{"candidate": l, "prompt": SAMPLE_PROMPT * 3, "rationale": "r", "strategy": "s",
+                        "technique": "s", "token_estimate": 90} for l in "ABC"],
+        "chosen_idx": 0,
+        "constraints": {},
+        "task_type": "Creative",
+        "tags": f"Tag {i % 50}",
+    }
+
+def bench_load_history(sizes: List[int], repeat: int) -> Dict:
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="po_bench_")
+    try:
+        for n in sizes:
+            path = os.path.join(tmp, f"history_{n}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for i in range(n):
+                    f.write(json.dumps(_synthetic_session(i)) + "\n")
+            samples = _time(lambda: list(load_history(path)), repeat)
+            results[str(n)] = {"bytes": os.path.getsize(path), **_summary(samples),
+                               "sessions_per_s": round(n / min(samples), 1)}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+def bench_heuristics(n_prompts: int, repeat: int) -> Dict:
+    prompts = [c["prompt"] for c in extract_candidates(fake_generation_text(n_candidates=26, prompt_words=200))]
+    prompts = (prompts * (n_prompts // len(prompts) + 1))[:n_prompts]
+    single = _time(lambda: [calc_heuristics(p) for p in prompts], repeat)
+    batch = _time(lambda: calc_heuristics_batch(prompts), repeat)
+    return {
+        "n_prompts": n_prompts,
+        "per_prompt": {**_summary(single), "prompts_per_s": round(n_prompts / min(single), 1)},
+        "batch": {**_summary(batch), "prompts_per_s": round(n_prompts / min(batch), 1)},
+    }
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_all(repeat: int = 5, latency: float = 0.05, jitter: float = 0.02, quick: bool = False) -> Dict:
+    history_sizes = [100, 1000] if quick else [100, 1000, 10000, 50000]
+    with _metrics_disabled():
+        return {
+            "meta": {
+                "revision": _git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "repeat": repeat,
+            },
+            "end_to_end": bench_end_to_end(repeat, latency, jitter),
+            "hedging": bench_hedging(20 if quick else 100, latency),
+            "candidate_pool": bench_candidate_pool([8, 20] if quick else [8, 20, 26], latency),
+            "extract_candidates": bench_extract_candidates([3, 26] if quick else [3, 26, 200], repeat),
+            "load_history": bench_load_history(history_sizes, repeat),
+            "heuristics": bench_heuristics(200 if quick else 2000, repeat),
+            "cold_start": import_report(),
+        }
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Benchmark the prompt optimizer with a fake LLM backend.")
+    ap.add_argument("--out", default=None, help="Write JSON results to this file (default: stdout)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.05, help="Fake LLM latency per call (s)")
+    ap.add_argument("--jitter", type=float, default=0.02, help="Uniform +/- jitter on latency (s)")
+    ap.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    args = ap.parse_args(argv)
+    results = run_all(args.repeat, args.latency, args.jitter, args.quick)
+    payload = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == "__main__":
+    main()
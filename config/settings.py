@@ -1,15 +1,50 @@
 import yaml
 import os
+import threading
 
-def get_config():
-    with open("config/settings.yaml", "r") as f:
+CONFIG_PATH = "config/settings.yaml"
+ENV_PATH = ".env"
+
+# Parsed files are cached per process and re-read only when their mtime
+# changes, so Streamlit reruns and worker threads don't re-parse them on
+# every call. Returned values are shared: treat them as read-only.
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+def _cached_parse(path, parse):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    with _parsed_lock:
+        hit = _parsed.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+    value = parse(path) if mtime is not None else None
+    with _parsed_lock:
+        _parsed[path] = (mtime, value)
+    return value
+
+def _load_yaml(path):
+    with open(path, "r") as f:
         return yaml.safe_load(f)
 
+def _load_env_key(path):
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("OPENAI_API_KEY"):
+                return line.strip().split("=", 1)[1]
+    return None
+
+def get_config():
+    if not os.path.exists(CONFIG_PATH):
+        # Same error as before caching
+        return _load_yaml(CONFIG_PATH)
+    return _cached_parse(CONFIG_PATH, _load_yaml)
+
 def get_openai_api_key():
     # Looks for .env or system env var
-    if os.path.exists(".env"):
-        with open(".env", "r") as f:
-            for line in f:
-                if line.startswith("OPENAI_API_KEY"):
-                    return line.strip().split("=", 1)[1]
+    key = _cached_parse(ENV_PATH, _load_env_key)
+    if key is not None:
+        return key
     return os.environ.get("OPENAI_API_KEY", "")
@@ -0,0 +1,280 @@
+"""
+Bulk history export and compressed history archives.
+
+    python -m core.archive export sessions.csv.gz --since 2026-01-01
+    python -m core.archive rotate --keep-days 90
+
+Exports stream one session at a time to JSONL or CSV, optionally gzip (.gz)
+or zstd (.zst, needs the `zstandard` package) compressed. Rotation moves
+sessions older than the retention window out of the active history into
+per-month segments (data/archive/history-YYYY-MM[.N].jsonl.gz), which are
+only opened when a lookup or export needs that month.
+"""
+import os
+import io
+import csv
+import glob
+import gzip
+import json
+import datetime
+import argparse
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_ARCHIVE_DIR = "data/archive"
+SEGMENT_PREFIX = "history-"
+COMPRESSION_SUFFIXES = {"gz": ".gz", "zst": ".zst", "none": ""}
+CSV_FIELDS = ["session_id", "timestamp", "task_type", "tags", "prompt", "chosen_strategy",
+              "chosen_prompt", "chosen_tokens", "n_candidates", "constraints"]
+
+# --- Compressed text files ---
+def open_text(path: str, mode: str = "r"):
+    """Opens a text file, (de)compressing by extension: .gz, .zst or plain."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("zstd archives need the 'zstandard' package (pip install zstandard)") from e
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def _strip_compression(path: str) -> str:
+    for suffix in (".gz", ".zst"):
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+# --- Time-partitioned segments ---
+def partition_key(session: dict) -> str:
+    """Month of the session ("YYYY-MM"), the archive partition it belongs to."""
+    ts = session.get("timestamp") or ""
+    return ts[:7] if len(ts) >= 7 else "unknown"
+
+def _segment_partition(path: str) -> str:
+    return os.path.basename(path)[len(SEGMENT_PREFIX):].split(".", 1)[0]
+
+def list_segments(archive_dir: str, partition: Optional[str] = None) -> List[str]:
+    """Segment files, oldest partition first, parts in write order."""
+    pattern = f"{SEGMENT_PREFIX}{partition or '*'}.*jsonl*"
+    paths = glob.glob(os.path.join(archive_dir, pattern))
+
+    def order(p):
+        rest = os.path.basename(p)[len(SEGMENT_PREFIX):].split(".")
+        part = int(rest[1]) if len(rest) > 1 and rest[1].isdigit() else 0
+        return rest[0], part
+    return sorted(paths, key=order)
+
+def iter_segment(path: str) -> Iterator[Dict]:
+    with open_text(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_archived(archive_dir: str, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+    """Archived sessions, oldest first; segments outside [since, until] are never opened."""
+    for path in list_segments(archive_dir):
+        month = _segment_partition(path)
+        if month != "unknown" and ((since and month < since[:7]) or (until and month > until[:7])):
+            continue
+        yield from iter_segment(path)
+
+def find_archived(archive_dir: str, session_id: str) -> dict:
+    """Looks a session up in the archive; ids are timestamps, so only one month is read."""
+    month = f"{session_id[:4]}-{session_id[4:6]}" if session_id[:6].isdigit() else None
+    for path in list_segments(archive_dir, month) or (list_segments(archive_dir) if month else []):
+        for s in iter_segment(path):
+            if str(s.get("session_id", "")) == session_id:
+                return s
+    return {}
+
+class SegmentWriter:
+    """
+    Writes sessions into per-month segment files. Each rotation writes new
+    part files rather than appending, so every segment is a single
+    compressed stream.
+    """
+    def __init__(self, archive_dir: str = DEFAULT_ARCHIVE_DIR, compression: str = "gz"):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}' (expected one of {list(COMPRESSION_SUFFIXES)})")
+        self.archive_dir = archive_dir
+        self.suffix = ".jsonl" + COMPRESSION_SUFFIXES[compression]
+        self._files: Dict[str, Any] = {}
+        self.paths: List[str] = []  # segments created by this writer
+        self.counts: Dict[str, int] = {}
+
+    def _segment(self, month: str):
+        f = self._files.get(month)
+        if f is None:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            part = len(list_segments(self.archive_dir, month))
+            name = f"{SEGMENT_PREFIX}{month}{f'.{part}' if part else ''}{self.suffix}"
+            path = os.path.join(self.archive_dir, name)
+            self.paths.append(path)
+            f = self._files[month] = open_text(path, "w")
+        return f
+
+    def write(self, session: dict):
+        month = partition_key(session)
+        self._segment(month).write(json.dumps(session, ensure_ascii=False) + "\n")
+        self.counts[month] = self.counts.get(month, 0) + 1
+
+    def close(self):
+        """Finishes every compressed stream and fsyncs the segments; safe to call twice."""
+        files, self._files = self._files, {}
+        errors = []
+        for f in files.values():
+            try:
+                f.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        for path in self.paths:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        if self.paths:
+            dir_fd = os.open(self.archive_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            except OSError:
+                pass  # not supported for directories on every platform
+            finally:
+                os.close(dir_fd)
+
+    def abort(self):
+        """Drops this writer's segments, e.g. when the source rows could not be removed safely."""
+        files, self._files = self._files, {}
+        for f in files.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.paths = []
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def iter_history(history_path: str, archive_dir: Optional[str] = None) -> Iterator[Dict]:
+    """Archived sessions (if archive_dir is given) then the active JSONL, one record at a time."""
+    if archive_dir:
+        yield from iter_archived(archive_dir)
+    if os.path.exists(history_path):
+        yield from iter_segment(history_path)
+
+def rotate_history(store, keep_days: int, archive_dir: str = DEFAULT_ARCHIVE_DIR,
+                   compression: str = "gz") -> Dict[str, int]:
+    """
+    Moves sessions older than keep_days out of the store into archive
+    segments; returns counts per month. The store closes the writer before
+    deleting anything (see HistoryStore.archive).
+    """
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=keep_days)).strftime("%Y-%m-%d")
+    writer = SegmentWriter(archive_dir, compression)
+    store.archive(cutoff, writer)
+    return writer.counts
+
+# --- Bulk export ---
+def _csv_row(session: dict) -> Dict[str, Any]:
+    candidates = session.get("candidates") or []
+    idx = session.get("chosen_idx") or 0
+    chosen = candidates[idx] if 0 <= idx < len(candidates) else {}
+    return {
+        "session_id": session.get("session_id", ""),
+        "timestamp": session.get("timestamp", ""),
+        "task_type": session.get("task_type", ""),
+        "tags": session.get("tags", ""),
+        "prompt": session.get("prompt", ""),
+        "chosen_strategy": chosen.get("strategy", ""),
+        "chosen_prompt": chosen.get("prompt", ""),
+        "chosen_tokens": chosen.get("token_estimate", ""),
+        "n_candidates": len(candidates),
+        "constraints": json.dumps(session.get("constraints") or {}, ensure_ascii=False),
+    }
+
+def export_sessions(sessions: Iterable[dict], path: str, fmt: Optional[str] = None) -> int:
+    """
+    Streams sessions to `path` as JSONL (full records) or CSV (one summary
+    row per session). The format defaults to the extension under any .gz/.zst.
+    """
+    fmt = fmt or ("csv" if _strip_compression(path).lower().endswith(".csv") else "jsonl")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    n = 0
+    with open_text(path, "w") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for s in sessions:
+                writer.writerow(_csv_row(s))
+                n += 1
+        else:
+            for s in sessions:
+                f.write(json.dumps(s, ensure_ascii=False) + "\n")
+                n += 1
+    return n
+
+def select_sessions(store, session_ids: Optional[Iterable[str]] = None, tag: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None,
+                    archive_dir: Optional[str] = None) -> Iterator[Dict]:
+    """Given ids, or all sessions matching the filters (archived ones first when archive_dir is set)."""
+    from core.history import _matches
+    if session_ids is not None:
+        for sid in session_ids:
+            s = store.get(sid)
+            if s:
+                yield s
+        return
+    sources = [iter_archived(archive_dir, since, until)] if archive_dir else []
+    for source in sources + [store.iter_sessions()]:
+        for s in source:
+            if _matches(s.get("timestamp", "") or "", str(s.get("tags", "") or ""), tag, since, until):
+                yield s
+
+def main(argv: Optional[List[str]] = None):
+    from core.history import get_history_store, history_settings
+    cfg = history_settings()
+    archive_dir = cfg.get("archive_dir", DEFAULT_ARCHIVE_DIR)
+    ap = argparse.ArgumentParser(description="Export or archive the session history.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="Stream sessions to .jsonl/.csv, optionally .gz/.zst compressed")
+    ex.add_argument("output")
+    ex.add_argument("--ids", nargs="*", help="Only these session ids")
+    ex.add_argument("--tag")
+    ex.add_argument("--since", help="YYYY-MM-DD")
+    ex.add_argument("--until", help="YYYY-MM-DD")
+    ex.add_argument("--no-archive", action="store_true", help="Skip archived segments")
+    ro = sub.add_parser("rotate", help="Move old sessions into compressed monthly segments")
+    ro.add_argument("--keep-days", type=int, default=cfg.get("retention_days") or 90)
+    ro.add_argument("--compression", choices=list(COMPRESSION_SUFFIXES),
+                    default=cfg.get("archive_compression", "gz"))
+    args = ap.parse_args(argv)
+    store = get_history_store()
+    if args.command == "export":
+        sessions = select_sessions(store, args.ids, args.tag, args.since, args.until,
+                                   None if args.no_archive else archive_dir)
+        print(f"Exported {export_sessions(sessions, args.output)} sessions to {args.output}")
+    else:
+        counts = rotate_history(store, args.keep_days, archive_dir, args.compression)
+        print(f"Archived {sum(counts.values())} sessions into {archive_dir}: {counts}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Headless batch mode: runs the 4D pipeline over a dataset of prompts.
+
+    python -m core.batch prompts.jsonl -o results.jsonl --concurrency 8
+
+Input is JSONL or CSV with a `prompt` column and optional `id`, `task_type`
+and `constraints` (a JSON object, or the individual word_limit / tone /
+style / audience / priority columns). Results are appended to the output
+JSONL as each row finishes; re-running the same command resumes by skipping
+ids that already have a successful result in the output file. Failed rows are
+retried, and a failure already recorded with the same error is not written again.
+"""
+import os
+import csv
+import json
+import argparse
+import multiprocessing
+import concurrent.futures
+from typing import Dict, Iterator, List, Optional, Set
+from core.pipeline import run_4d_pipeline, build_candidates
+from core.eval import evaluate_candidates_batched, evaluate_candidates_concurrent, calc_heuristics_batch
+from core.ratelimit import request_priority, BATCH
+from config.settings import get_config, get_openai_api_key
+
+CONSTRAINT_KEYS = ["word_limit", "tone", "style", "audience", "priority"]
+
+def read_rows(path: str) -> Iterator[Dict]:
+    """
+    Yields normalized input rows ({id, prompt, task_type, constraints}) lazily.
+    A line that cannot be parsed or normalized yields {id, error} instead, so
+    one bad row is reported in the output rather than aborting the run.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            records = csv.DictReader(f)
+        else:
+            records = (line for line in f if line.strip())
+        for i, r in enumerate(records):
+            try:
+                if isinstance(r, str):
+                    r = json.loads(r)
+                    if not isinstance(r, dict):
+                        raise ValueError(f"expected a JSON object, got {type(r).__name__}")
+                yield _normalize_row(r, i)
+            except (ValueError, TypeError, AttributeError, OverflowError) as e:
+                row_id = r.get('id') if isinstance(r, dict) else None
+                yield {"id": str(row_id or i), "error": f"Invalid input row: {type(e).__name__}: {e}"}
+
+def _normalize_row(r: Dict, index: int) -> Dict:
+    constraints = r.get('constraints') or {}
+    if isinstance(constraints, str):
+        constraints = json.loads(constraints) if constraints.strip() else {}
+    if not isinstance(constraints, dict):
+        raise ValueError("constraints must be a JSON object")
+    constraints = dict(constraints)
+    for k in CONSTRAINT_KEYS:
+        if r.get(k) not in (None, ""):
+            constraints[k] = r[k]
+    if constraints.get('word_limit') not in (None, ""):
+        # CSV exports and spreadsheets often write whole numbers as "120.0"
+        constraints['word_limit'] = int(float(constraints['word_limit'])) or None
+    return {
+        "id": str(r.get('id') or index),
+        "prompt": r.get('prompt', ''),
+        "task_type": r.get('task_type') or "Complex",
+        "constraints": {k: (constraints.get(k) or None) for k in CONSTRAINT_KEYS},
+    }
+
+def _output_records(output_path: str) -> Iterator[Dict]:
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if isinstance(rec, dict) and rec.get('id') is not None:
+                yield rec
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids with a successful result in an existing output file (the checkpoint)."""
+    return {str(rec['id']) for rec in _output_records(output_path) if not rec.get('error')}
+
+def recorded_errors(output_path: str) -> Dict[str, Set[str]]:
+    """Error messages already written to an existing output file, by id."""
+    errors: Dict[str, Set[str]] = {}
+    for rec in _output_records(output_path):
+        if rec.get('error'):
+            errors.setdefault(str(rec['id']), set()).add(rec['error'])
+    return errors
+
+def process_row(
+    row: Dict,
+    openai_api_key: str,
+    judge_model: str = "gpt-4o",
+    judge_concurrency: int = 4,
+    evaluate: bool = True,
+    use_cache: bool = True,
+    heuristics_pool: Optional[concurrent.futures.Executor] = None,
+    judge_mode: str = "batched"
+) -> Dict:
+    # Batch rows queue behind interactive app calls at the shared rate limiter
+    with request_priority(BATCH):
+        return _process_row(row, openai_api_key, judge_model, judge_concurrency, evaluate, use_cache,
+                            heuristics_pool, judge_mode)
+
+def _judge(candidates, judge_model, openai_api_key, judge_mode, judge_concurrency, use_cache) -> List[dict]:
+    if judge_mode == "batched":
+        # One judge call scores every candidate of the row
+        return evaluate_candidates_batched(candidates, judge_model, openai_api_key, use_cache=use_cache)
+    return evaluate_candidates_concurrent(candidates, judge_model, openai_api_key,
+                                          max_concurrency=judge_concurrency, use_cache=use_cache)
+
+def _process_row(row, openai_api_key, judge_model, judge_concurrency, evaluate, use_cache, heuristics_pool,
+                 judge_mode="batched") -> Dict:
+    out = dict(row)
+    try:
+        pipeline_out = run_4d_pipeline(row['prompt'], row['task_type'], row['constraints'], openai_api_key)
+        candidates = build_candidates(pipeline_out['deconstruct'], row['task_type'], row['constraints'],
+                                      openai_api_key, use_cache=use_cache)
+        prompts = [c['prompt'] for c in candidates]
+        # CPU-side scoring runs in the process pool while the judge calls are in flight
+        # One task per row: the batch analyzer amortizes pickling and setup over all candidates
+        heuristics_f = heuristics_pool.submit(calc_heuristics_batch, prompts) if heuristics_pool else None
+        evals = _judge(candidates, judge_model, openai_api_key, judge_mode, judge_concurrency,
+                       use_cache) if evaluate else []
+        out.update(pipeline_out)
+        out['candidates'] = candidates
+        out['heuristics'] = heuristics_f.result() if heuristics_f else calc_heuristics_batch(prompts)
+        out['evaluations'] = evals
+        out['best_idx'] = max(range(len(evals)), key=lambda i: evals[i].get('Overall', -1)) if evals else None
+    except Exception as e:
+        out['error'] = f"{type(e).__name__}: {e}"
+    return out
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    judge_concurrency: int = 4,
+    heuristic_workers: Optional[int] = None,
+    judge_model: str = "gpt-4o",
+    evaluate: bool = True,
+    use_cache: bool = True,
+    openai_api_key: Optional[str] = None,
+    judge_mode: Optional[str] = None
+) -> Dict[str, int]:
+    """Processes every pending row; returns counts of done / failed / skipped rows."""
+    openai_api_key = openai_api_key or get_openai_api_key()
+    judge_mode = judge_mode or (get_config() or {}).get("judge_mode", "batched")
+    done = completed_ids(output_path)
+    errors = recorded_errors(output_path)
+    stats = {"done": 0, "failed": 0, "skipped": 0}
+    pending = iter(read_rows(input_path))
+    window = max(1, concurrency) * 2  # bounded read-ahead: the input is never fully in memory
+
+    # Workers start lazily from the LLM threads; forking a threaded process can copy a held lock
+    # into the child and hang it, so heuristics workers are spawned fresh instead
+    with concurrent.futures.ProcessPoolExecutor(max_workers=heuristic_workers,
+                                                mp_context=multiprocessing.get_context("spawn")) as heuristics_pool, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as llm_pool, \
+            open(output_path, 'a', encoding='utf-8') as out_f:
+        in_flight = set()
+
+        def write(rec: Dict):
+            stats['failed' if rec.get('error') else 'done'] += 1
+            if rec.get('error'):
+                seen = errors.setdefault(rec['id'], set())
+                if rec['error'] in seen:
+                    return  # same failure as a previous run: keep one record of it
+                seen.add(rec['error'])
+            out_f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+            out_f.flush()
+
+        def submit_next() -> bool:
+            for row in pending:
+                if row['id'] in done:
+                    stats['skipped'] += 1
+                    continue
+                if row.get('error'):
+                    write(row)  # unreadable input row: nothing to run
+                    continue
+                in_flight.add(llm_pool.submit(process_row, row, openai_api_key, judge_model,
+                                              judge_concurrency, evaluate, use_cache, heuristics_pool, judge_mode))
+                return True
+            return False
+
+        while len(in_flight) < window and submit_next():
+            pass
+        while in_flight:
+            finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in finished:
+                in_flight.discard(fut)
+                write(fut.result())
+                submit_next()
+    return stats
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Run the 4D prompt optimizer over a JSONL/CSV dataset.")
+    ap.add_argument("input", help="Input .jsonl or .csv file")
+    ap.add_argument("-o", "--output", required=True, help="Output .jsonl file (also the resume checkpoint)")
+    ap.add_argument("--concurrency", type=int, default=4, help="Rows with LLM calls in flight")
+    ap.add_argument("--judge-concurrency", type=int, default=4, help="Concurrent judge calls per row")
+    ap.add_argument("--heuristic-workers", type=int, default=None, help="Processes for heuristics (default: CPU count)")
+    ap.add_argument("--judge-model", default="gpt-4o")
+    ap.add_argument("--judge-mode", choices=["batched", "per_candidate"], default=None,
+                    help="One judge call per row, or one per candidate (default: settings.yaml judge_mode)")
+    ap.add_argument("--no-eval", action="store_true", help="Skip LLM-judge scoring")
+    ap.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    args = ap.parse_args(argv)
+    stats = run_batch(
+        args.input, args.output,
+        concurrency=args.concurrency,
+        judge_concurrency=args.judge_concurrency,
+        heuristic_workers=args.heuristic_workers,
+        judge_model=args.judge_model,
+        evaluate=not args.no_eval,
+        use_cache=not args.no_cache,
+        judge_mode=args.judge_mode
+    )
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
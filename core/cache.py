@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+# --- Persistent LLM response cache ---
+# Entries are keyed by a SHA-256 of (model, params, prompt), so identical
+# deterministic requests (re-clicks, restored sessions) skip the API call.
+
+DEFAULT_CACHE_PATH = "data/llm_cache.sqlite"
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_entries: int = 2000,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        enabled: bool = True
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @staticmethod
+    def make_key(model: str, params: Dict[str, Any], prompt: str) -> str:
+        payload = json.dumps({"model": model, "params": params, "prompt": prompt},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, len(value.encode("utf-8")))
+            )
+            self._evict(db)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection):
+        # Least-recently-used entries go first once either limit is exceeded
+        if self.max_entries:
+            count = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+        if self.max_bytes:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                row = db.execute("SELECT key, size FROM responses ORDER BY accessed ASC LIMIT 1").fetchone()
+                if row is None:
+                    break
+                db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+                total -= row[1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache configured from the `cache` section of settings.yaml."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                from config.settings import get_config
+                cfg = (get_config() or {}).get("cache", {}) or {}
+            except Exception:
+                cfg = {}
+            enabled = cfg.get("enabled", True) and os.environ.get("PROMPT_OPTIMIZER_CACHE", "").lower() not in ("0", "off", "false")
+            _cache = ResponseCache(
+                path=cfg.get("path", DEFAULT_CACHE_PATH),
+                max_entries=cfg.get("max_entries", 2000),
+                max_bytes=cfg.get("max_bytes"),
+                ttl_seconds=cfg.get("ttl_seconds", 7 * 24 * 3600),
+                enabled=bool(enabled)
+            )
+        return _cache
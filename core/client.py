@@ -0,0 +1,86 @@
+import json
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Client for the HTTP service (core/service.py) ---
+# Standard library only, so the Streamlit app and scripts can point at a
+# shared backend without extra dependencies. 503 (queue full) responses are
+# retried after the server's Retry-After.
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class ServiceClient:
+    def __init__(self, url: str, auth_token: Optional[str] = None, timeout: float = 130.0,
+                 max_busy_retries: int = 5):
+        self.url = url.rstrip("/")
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self.max_busy_retries = max_busy_retries
+
+    def _post(self, path: str, payload: dict, priority: Optional[str] = None,
+              session_id: Optional[str] = None) -> Dict[str, Any]:
+        headers = {"Content-Type": "application/json"}
+        if self.auth_token:
+            headers["Authorization"] = f"Bearer {self.auth_token}"
+        if priority:
+            headers["X-Priority"] = priority
+        if session_id:
+            headers["X-Session-Id"] = session_id
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        for attempt in range(self.max_busy_retries + 1):
+            req = urllib.request.Request(self.url + path, data=body, headers=headers, method="POST")
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return json.loads(resp.read().decode("utf-8"))
+            except urllib.error.HTTPError as e:
+                try:
+                    message = json.loads(e.read().decode("utf-8")).get("error", e.reason)
+                except ValueError:
+                    message = e.reason
+                if e.code == 503 and attempt < self.max_busy_retries:
+                    time.sleep(float(e.headers.get("Retry-After") or 1))
+                    continue
+                raise ServiceError(e.code, message) from e
+        raise AssertionError("unreachable")
+
+    def analyze(self, prompt: str, task_type: str, constraints: dict, **headers) -> Dict[str, Any]:
+        return self._post("/v1/analyze", {"prompt": prompt, "task_type": task_type,
+                                          "constraints": constraints}, **headers)
+
+    def generate(self, deconstruct: dict, task_type: str, constraints: dict, use_cache: bool = True,
+                 **headers) -> List[dict]:
+        return self._post("/v1/generate", {"deconstruct": deconstruct, "task_type": task_type,
+                                           "constraints": constraints, "use_cache": use_cache},
+                          **headers)["candidates"]
+
+    def generate_pool(self, deconstruct: dict, task_type: str, constraints: dict, pool: Optional[dict] = None,
+                      use_cache: bool = True, **headers) -> Tuple[List[dict], Dict[str, Any]]:
+        """Large-pool generation plus the judge tournament, run on the service; returns (candidates, stats)."""
+        res = self._post("/v1/generate_pool", {"deconstruct": deconstruct, "task_type": task_type,
+                                                "constraints": constraints, "pool": pool or {},
+                                                "use_cache": use_cache}, **headers)
+        return res["candidates"], res["stats"]
+
+    def evaluate(self, candidates: List[dict], judge_model: str = "gpt-4o", mode: Optional[str] = None,
+                 use_cache: bool = True, **headers) -> Dict[str, Any]:
+        """Returns {"evaluations": [...], "heuristics": [...]}."""
+        return self._post("/v1/evaluate", {"candidates": candidates, "judge_model": judge_model,
+                                           "mode": mode, "use_cache": use_cache}, **headers)
+
+    def export(self, session: dict, **headers) -> Dict[str, Any]:
+        """Writes the exports and the history record on the service; returns their paths and the stored session."""
+        return self._post("/v1/export", session, **headers)
+
+def get_service_client() -> Optional[ServiceClient]:
+    """A client for service.url from settings.yaml, or None to run the pipeline in-process."""
+    from config.settings import get_config
+    cfg = (get_config() or {}).get("service", {}) or {}
+    if not cfg.get("url"):
+        return None
+    return ServiceClient(cfg["url"], auth_token=cfg.get("auth_token"),
+                         timeout=float(cfg.get("request_timeout", 120)) + 10)
@@ -0,0 +1,113 @@
+import re
+import difflib
+from typing import Dict, List, Optional, Sequence, Tuple, TypedDict
+import numpy as np
+
+# --- A/B compare across sessions ---
+# Word-level diffs (prompts are often one paragraph, where a line diff shows
+# the whole thing as changed) and a lexical cosine-similarity matrix over many
+# candidates at once. Both are pure functions of their inputs; the app
+# memoizes them in the phase graph, keyed by content hash.
+
+_DIFF_TOKENS = re.compile(r"\s+|\w+|[^\w\s]")
+_WORDS = re.compile(r"\w+")
+REDUNDANT_THRESHOLD = 0.85
+
+class WordDiff(TypedDict):
+    segments: List[Tuple[str, str]]  # ("equal" | "insert" | "delete", text)
+    ratio: float  # difflib similarity of the two token sequences
+    inserted: int  # words only in B
+    deleted: int  # words only in A
+
+def word_diff(a: str, b: str) -> WordDiff:
+    """Diffs two prompts word by word; whitespace and punctuation are their own tokens."""
+    ta, tb = _DIFF_TOKENS.findall(a), _DIFF_TOKENS.findall(b)
+    sm = difflib.SequenceMatcher(None, ta, tb, autojunk=False)
+    segments: List[Tuple[str, str]] = []
+    inserted = deleted = 0
+
+    def add(op: str, tokens: List[str]):
+        if tokens:
+            if segments and segments[-1][0] == op:
+                segments[-1] = (op, segments[-1][1] + "".join(tokens))
+            else:
+                segments.append((op, "".join(tokens)))
+
+    for tag, i1, i2, j1, j2 in sm.get_opcodes():
+        if tag == "equal":
+            add("equal", ta[i1:i2])
+            continue
+        if tag in ("delete", "replace"):
+            add("delete", ta[i1:i2])
+            deleted += sum(1 for t in ta[i1:i2] if _WORDS.match(t))
+        if tag in ("insert", "replace"):
+            add("insert", tb[j1:j2])
+            inserted += sum(1 for t in tb[j1:j2] if _WORDS.match(t))
+    return WordDiff(segments=segments, ratio=round(sm.ratio(), 4), inserted=inserted, deleted=deleted)
+
+_MD_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|~<>:$])")
+
+def render_word_diff(diff: WordDiff) -> str:
+    """Streamlit markdown: deletions struck through in red, insertions in green."""
+    out = []
+    for op, text in diff["segments"]:
+        escaped = _MD_SPECIAL.sub(r"\\\1", text).replace("\n", "  \n")
+        if op == "equal" or not text.strip():
+            out.append(escaped)
+            continue
+        # Markup must hug the words; surrounding spaces and line breaks stay outside it
+        core = escaped.strip()
+        start = escaped.index(core)
+        mark = f":red[~~{core}~~]" if op == "delete" else f":green[**{core}**]"
+        out.append(escaped[:start] + mark + escaped[start + len(core):])
+    return "".join(out)
+
+def similarity_matrix(texts: Sequence[str]) -> np.ndarray:
+    """
+    Pairwise cosine similarity of word-count vectors, n x n float32. The
+    count matrix is built with one bincount and compared with one matrix
+    product, so cost is dominated by tokenizing each text once.
+    """
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    cols: List[int] = []
+    for r, text in enumerate(texts):
+        for w in _WORDS.findall(text.lower()):
+            rows.append(r)
+            cols.append(vocab.setdefault(w, len(vocab)))
+    n, v = len(texts), max(len(vocab), 1)
+    counts = np.bincount(np.asarray(rows, dtype=np.int64) * v + np.asarray(cols, dtype=np.int64),
+                         minlength=n * v).astype(np.float32).reshape(n, v)
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    unit = np.divide(counts, norms, out=np.zeros_like(counts), where=norms > 0)
+    return np.clip(unit @ unit.T, 0.0, 1.0)
+
+def redundant_pairs(labels: Sequence[str], matrix: np.ndarray,
+                    threshold: float = REDUNDANT_THRESHOLD) -> List[Tuple[str, str, float]]:
+    """Pairs at or above threshold, most similar first."""
+    i, j = np.triu_indices(len(labels), k=1)
+    sims = matrix[i, j]
+    keep = np.nonzero(sims >= threshold)[0]
+    order = keep[np.argsort(-sims[keep], kind="stable")]
+    return [(labels[i[k]], labels[j[k]], round(float(sims[k]), 3)) for k in order]
+
+def session_candidates(sessions: Sequence[dict], max_candidates: Optional[int] = None) -> List[Dict[str, str]]:
+    """Flattens sessions into uniquely labelled candidates: {label, session_id, strategy, prompt}."""
+    out, seen = [], set()
+    for s in sessions:
+        for i, c in enumerate(s.get("candidates") or []):
+            label = base = f"{s.get('timestamp', '')} {c.get('candidate') or chr(65 + i)}".strip()
+            n = 1
+            while label in seen:
+                n += 1
+                label = f"{base} ({n})"
+            seen.add(label)
+            out.append({
+                "label": label,
+                "session_id": str(s.get("session_id", "")),
+                "strategy": c.get("strategy", ""),
+                "prompt": c.get("prompt", ""),
+            })
+            if max_candidates and len(out) >= max_candidates:
+                return out
+    return out
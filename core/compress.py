@@ -0,0 +1,197 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+from core.utils import estimate_token_count, DEFAULT_TOKEN_MODEL
+from core.llm import complete_text, get_llm
+from core.eval import evaluate_candidates_batched, RUBRIC
+from core.metrics import span
+
+# --- Deliver: token-budget prompt compression ---
+# Deterministic passes run first, cheapest first: whitespace, markdown
+# emphasis, filler phrases, repeated sentences. If the prompt is still over
+# budget, an optional LLM rewrite is asked for the remaining cut. Tokens are
+# counted with the tokenizer of the model the prompt will run on.
+# Fenced code, inline code and quoted text are content, not phrasing: they
+# are masked before the passes run and put back verbatim afterwards.
+
+REWRITE_MODEL = "gpt-4o-mini"
+REWRITE_PARAMS = {"temperature": 0.0}
+# Fraction of the original token count to aim for, by the Priority constraint
+PRIORITY_RATIOS = {"Cost": 0.6, "Latency": 0.8, None: 0.9}
+
+class CompressionResult(TypedDict):
+    prompt: str
+    original_tokens: int
+    tokens: int
+    target_tokens: int
+    saved_tokens: int
+    saved_pct: float
+    met_target: bool
+    passes: List[Tuple[str, int]]  # (pass name, tokens after it)
+
+# (pattern, replacement); matched case-insensitively on word boundaries
+FILLER_PHRASES = [
+    (r"(?:could|would|can) you (?:please )?", ""),
+    (r"I would like you to ", ""),
+    (r"I want you to ", ""),
+    (r"please ", ""),
+    (r"kindly ", ""),
+    (r"make sure to ", ""),
+    (r"make sure that ", "ensure "),
+    (r"it is important (?:to note )?that ", ""),
+    (r"basically ", ""),
+    (r"actually ", ""),
+    (r"in order to\b", "to"),
+    (r"due to the fact that\b", "because"),
+    (r"at this point in time\b", "now"),
+    (r"in the event that\b", "if"),
+    (r"for the purpose of\b", "for"),
+    (r"with (?:regard|respect) to\b", "about"),
+    (r"a large number of\b", "many"),
+    (r"as well as\b", "and"),
+]
+_FILLER = [(re.compile(r"\b" + p + r"(?P<next>\w?)", re.IGNORECASE), r) for p, r in FILLER_PHRASES]
+_SENTENCE_START = re.compile(r"(?:^|[.!?:]\s+|\n\s*(?:[-*]\s+)?)$")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_EMPHASIS = re.compile(r"(\*\*|__)(\S(?:.*?\S)?)\1")
+_MIN_DEDUP_WORDS = 4  # short repeats ("Be concise.") can be deliberate
+# ``` fences (to the end if unclosed), `inline code`, "double" and “curly” quotes
+_PROTECTED = re.compile(r'```.*?(?:```|\Z)|`[^`\n]+`|"[^"\n]+"|“[^”\n]+”', re.DOTALL)
+_PLACEHOLDER = re.compile(r"\ue000(\d+)\ue001")  # private-use marks: never word characters
+
+def _protect(text: str) -> Tuple[str, List[str]]:
+    """Replaces protected spans with placeholders; returns the masked text and the spans."""
+    spans: List[str] = []
+
+    def _mask(m):
+        spans.append(m.group(0))
+        return f"\ue000{len(spans) - 1}\ue001"
+    return _PROTECTED.sub(_mask, text), spans
+
+def _restore(text: str, spans: List[str]) -> str:
+    return _PLACEHOLDER.sub(lambda m: spans[int(m.group(1))], text) if spans else text
+
+def _whitespace(text: str) -> str:
+    # Runs inside a line collapse; leading indentation and line breaks are kept
+    lines = [re.sub(r"(?<=\S)[ \t]+", " ", l).rstrip() for l in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip("\n")
+
+def _emphasis(text: str) -> str:
+    return _EMPHASIS.sub(r"\2", text)
+
+def _filler(text: str) -> str:
+    for pattern, repl in _FILLER:
+        def _sub(m, repl=repl):
+            nxt = m.group("next")
+            # Removing a sentence opener ("Please write") leaves the next word to capitalize
+            if repl == "" and nxt and _SENTENCE_START.search(m.string[:m.start()]):
+                nxt = nxt.upper()
+            elif repl and m.group(0)[0].isupper():
+                repl = repl[0].upper() + repl[1:]
+            return repl + nxt
+        text = pattern.sub(_sub, text)
+    return text
+
+def _dedupe_sentences(text: str) -> str:
+    seen = set()
+    out = []
+    for line in text.split("\n"):
+        kept = []
+        for sentence in _SENTENCE_SPLIT.split(line):
+            norm = re.sub(r"\W+", " ", sentence.lower()).strip()
+            if len(norm.split()) >= _MIN_DEDUP_WORDS:
+                if norm in seen:
+                    continue
+                seen.add(norm)
+            kept.append(sentence)
+        if kept or not line.strip():
+            out.append(" ".join(kept))
+    return "\n".join(out)
+
+DETERMINISTIC_PASSES: List[Tuple[str, Callable[[str], str]]] = [
+    ("whitespace", _whitespace),
+    ("emphasis", _emphasis),
+    ("filler", _filler),
+    ("dedupe", _dedupe_sentences),
+    ("whitespace", _whitespace),
+]
+
+def target_tokens(original_tokens: int, constraints: Optional[dict] = None,
+                  ratios: Optional[Dict[Any, float]] = None) -> int:
+    """Token budget for a prompt from the Priority constraint (None when unset)."""
+    ratios = ratios or PRIORITY_RATIOS
+    priority = (constraints or {}).get("priority")
+    ratio = ratios.get(priority, ratios.get(None, 1.0))
+    return max(1, int(original_tokens * ratio))
+
+def _rewrite_prompt(prompt: str, target: int) -> str:
+    return (
+        "You are a prompt compression expert. Rewrite the prompt below in at most "
+        f"{target} tokens (about {max(1, int(target * 0.75))} words).\n"
+        "Keep every instruction, constraint, number, name, role and output-format requirement, "
+        "and copy code blocks and quoted text verbatim. "
+        "Remove filler, politeness and repetition. Return only the rewritten prompt.\n"
+        f"PROMPT:\n{prompt}"
+    )
+
+def _strip_wrapping(text: str) -> str:
+    text = text.strip()
+    text = re.sub(r"^```\w*\n(.*)\n```$", r"\1", text, flags=re.DOTALL).strip()
+    if len(text) > 1 and text[0] == text[-1] == '"':
+        text = text[1:-1].strip()
+    return text
+
+def compress_prompt(
+    prompt: str,
+    target: Optional[int] = None,
+    model: str = DEFAULT_TOKEN_MODEL,
+    llm_rewrite: bool = False,
+    openai_api_key: str = "",
+    rewrite_model: str = REWRITE_MODEL,
+    use_cache: bool = True,
+    llm=None
+) -> CompressionResult:
+    """
+    Shrinks `prompt` toward `target` tokens (measured with `model`'s
+    tokenizer). All deterministic passes always run, skipping code and
+    quoted text; the LLM rewrite only runs if they leave the prompt over
+    budget, and is kept only if shorter.
+    """
+    original = estimate_token_count(prompt, model)
+    target = target or original
+    masked, spans = _protect(prompt)
+    text, passes = prompt, []
+    with span("compress_prompt"):
+        for name, fn in DETERMINISTIC_PASSES:
+            masked = fn(masked)
+            text = _restore(masked, spans)
+            passes.append((name, estimate_token_count(text, model)))
+        tokens = passes[-1][1] if passes else original
+        if llm_rewrite and tokens > target:
+            params = dict(REWRITE_PARAMS, max_tokens=max(64, 2 * target))
+            llm = llm or get_llm(rewrite_model, openai_api_key, **params)
+            rewritten = _strip_wrapping(complete_text(llm, _rewrite_prompt(text, target), rewrite_model,
+                                                      params, use_cache=use_cache))
+            rewritten_tokens = estimate_token_count(rewritten, model)
+            if rewritten and rewritten_tokens < tokens:
+                text, tokens = rewritten, rewritten_tokens
+            passes.append(("llm_rewrite", tokens))
+    return CompressionResult(
+        prompt=text,
+        original_tokens=original,
+        tokens=tokens,
+        target_tokens=target,
+        saved_tokens=original - tokens,
+        saved_pct=round(100.0 * (original - tokens) / original, 1) if original else 0.0,
+        met_target=tokens <= target,
+        passes=passes,
+    )
+
+def judge_delta(original: str, compressed: str, judge_model: str, openai_api_key: str,
+                use_cache: bool = True, llm=None) -> Dict[str, Any]:
+    """Scores both versions in one batched judge call; delta is compressed minus original."""
+    before, after = evaluate_candidates_batched([{"prompt": original}, {"prompt": compressed}],
+                                                judge_model, openai_api_key, use_cache=use_cache, llm=llm)
+    if "Error" in before or "Error" in after:
+        return {"original": before, "compressed": after, "delta": {}}
+    keys = list(RUBRIC) + ["Overall"]
+    return {"original": before, "compressed": after, "delta": {k: after[k] - before[k] for k in keys}}
@@ -0,0 +1,189 @@
+import os
+import json
+import argparse
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from core.llm import get_embed_model, embed_texts
+
+# --- Embedding index over history for similar-prompt reuse ---
+# Vectors live in a flat float32 file (one L2-normalized row per entry) that is
+# memory-mapped for queries and appended to in place on save_session; a JSONL
+# sidecar maps row numbers to (session_id, kind). Each session contributes two
+# rows: its original prompt and its chosen candidate.
+
+DEFAULT_INDEX_DIR = "data/embeddings"
+DEFAULT_EMBED_MODEL = "text-embedding-3-large"
+
+class EmbeddingIndex:
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.rows_path = os.path.join(index_dir, "rows.jsonl")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self._lock = threading.Lock()
+        self._rows: List[Dict] = []
+        self._rows_size = 0
+        self._matrix: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self._dim = json.load(f)["dim"]
+
+    def _refresh(self):
+        # Pick up rows appended since the last look (by this or another process)
+        if os.path.exists(self.rows_path) and os.path.getsize(self.rows_path) > self._rows_size:
+            with open(self.rows_path, 'rb') as f:
+                f.seek(self._rows_size)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    self._rows.append(json.loads(line))
+                    self._rows_size += len(line)
+        n = len(self._rows)
+        if self._dim and n and (self._matrix is None or self._matrix.shape[0] != n):
+            # Never map past the rows whose metadata we have
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(n, self._dim))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def session_ids(self) -> set:
+        with self._lock:
+            self._refresh()
+            return {r["session_id"] for r in self._rows}
+
+    def add(self, vectors: List[List[float]], rows: List[Dict]):
+        """Appends vectors with their row metadata; the vector file is written first."""
+        if not vectors:
+            return
+        mat = np.asarray(vectors, dtype=np.float32)
+        mat /= np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            if self._dim is None:
+                self._dim = int(mat.shape[1])
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({"dim": self._dim}, f)
+            elif mat.shape[1] != self._dim:
+                raise ValueError(f"Embedding dim {mat.shape[1]} does not match index dim {self._dim}")
+            self._refresh()
+            with open(self.vectors_path, 'ab') as f:
+                # Drop vectors left without metadata by an interrupted append
+                f.truncate(len(self._rows) * self._dim * 4)
+                f.write(mat.tobytes())
+            with open(self.rows_path, 'a', encoding='utf-8') as f:
+                for r in rows:
+                    f.write(json.dumps(r, ensure_ascii=False) + '\n')
+
+    def query(self, vector: List[float], k: int = 5) -> List[Dict]:
+        """Top-k sessions by cosine similarity (best row per session)."""
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or not self._rows:
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            q /= max(float(np.linalg.norm(q)), 1e-12)
+            scores = self._matrix @ q
+            rows = self._rows
+        # Over-fetch: a session has up to two rows
+        top = min(len(scores), 2 * k)
+        idx = np.argpartition(-scores, top - 1)[:top]
+        best: Dict[str, Dict] = {}
+        for i in idx[np.argsort(-scores[idx])]:
+            sid = rows[i]["session_id"]
+            if sid not in best:
+                best[sid] = {"session_id": sid, "score": float(scores[i]), "kind": rows[i]["kind"]}
+        return list(best.values())[:k]
+
+def _session_texts(session: dict) -> List[tuple]:
+    texts = [("prompt", session.get("prompt", ""))]
+    candidates = session.get("candidates") or []
+    idx = session.get("chosen_idx")
+    if isinstance(idx, int) and 0 <= idx < len(candidates):
+        texts.append(("candidate", candidates[idx].get("prompt", "")))
+    return [(kind, t) for kind, t in texts if t and t.strip()]
+
+def index_sessions(index: EmbeddingIndex, sessions: List[dict], openai_api_key: str,
+                   model: str = DEFAULT_EMBED_MODEL, dimensions: Optional[int] = None) -> int:
+    """Embeds and appends sessions (one batched embedding request). Returns rows added."""
+    params = {"dimensions": dimensions} if dimensions else {}
+    rows, texts = [], []
+    for s in sessions:
+        for kind, text in _session_texts(s):
+            rows.append({"session_id": s.get("session_id", ""), "kind": kind})
+            texts.append(text)
+    if not texts:
+        return 0
+    vectors = embed_texts(get_embed_model(model, openai_api_key, **params), texts, model, params)
+    index.add(vectors, rows)
+    return len(rows)
+
+def backfill_index(index: EmbeddingIndex, store, openai_api_key: str, model: str = DEFAULT_EMBED_MODEL,
+                   dimensions: Optional[int] = None, batch_size: int = 64) -> int:
+    """Indexes history sessions that aren't in the index yet, streaming through the store."""
+    known = index.session_ids()
+    added, batch = 0, []
+    for s in store.iter_sessions():
+        if s.get("session_id") in known:
+            continue
+        batch.append(s)
+        if len(batch) >= batch_size:
+            added += index_sessions(index, batch, openai_api_key, model, dimensions)
+            batch = []
+    if batch:
+        added += index_sessions(index, batch, openai_api_key, model, dimensions)
+    return added
+
+def index_is_behind(index: EmbeddingIndex, store) -> bool:
+    """True when the history store holds sessions the index has never seen."""
+    return len(index.session_ids()) < store.count()
+
+def find_similar_sessions(index: EmbeddingIndex, prompt: str, openai_api_key: str, k: int = 3,
+                          model: str = DEFAULT_EMBED_MODEL, dimensions: Optional[int] = None) -> List[Dict]:
+    if not prompt.strip() or not len(index):
+        return []
+    params = {"dimensions": dimensions} if dimensions else {}
+    vector = embed_texts(get_embed_model(model, openai_api_key, **params), [prompt], model, params)[0]
+    return index.query(vector, k)
+
+_index: Optional[EmbeddingIndex] = None
+_index_lock = threading.Lock()
+
+def get_embedding_index() -> EmbeddingIndex:
+    """Process-wide index at embeddings.index_dir from settings.yaml."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                from config.settings import get_config
+                cfg = (get_config() or {}).get("embeddings", {}) or {}
+            except Exception:
+                cfg = {}
+            _index = EmbeddingIndex(cfg.get("index_dir", DEFAULT_INDEX_DIR))
+        return _index
+
+def main(argv: Optional[List[str]] = None):
+    from core.history import get_history_store
+    try:
+        from config.settings import get_config
+        cfg = (get_config() or {}).get("embeddings", {}) or {}
+    except Exception:
+        cfg = {}
+    ap = argparse.ArgumentParser(description="Maintain the similar-prompt embedding index.")
+    ap.add_argument("--backfill", action="store_true", help="Index history sessions missing from the index")
+    ap.add_argument("--batch-size", type=int, default=64)
+    args = ap.parse_args(argv)
+    index = get_embedding_index()
+    if not args.backfill:
+        print(f"{len(index)} rows in {index.index_dir}")
+        return
+    added = backfill_index(index, get_history_store(), os.environ["OPENAI_API_KEY"],
+                           model=cfg.get("model", DEFAULT_EMBED_MODEL), dimensions=cfg.get("dimensions"),
+                           batch_size=args.batch_size)
+    print(f"Indexed {added} rows into {index.index_dir}")
+
+if __name__ == "__main__":
+    main()
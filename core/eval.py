@@ -1,6 +1,9 @@
-from typing import List, Dict, Any
-from llama_index.core import Settings
-from llama_index.llms.openai import OpenAI
+import json
+import asyncio
+from typing import List, Dict, Any, Optional
+from core.llm import complete_text, acomplete_text, get_llm, run_sync
+from core.metrics import span
+from core.heuristics import HeuristicsAnalyzer, analyze_prompt, analyze_prompts, flesch_reading_ease
 import re
 
 RUBRIC = {
@@ -10,23 +13,169 @@ RUBRIC = {
     "Testability": 15,
     "Safety": 10
 }
+JUDGE_PARAMS = {"temperature": 0.2, "max_tokens": 256}
+BATCH_JUDGE_PARAMS = {"temperature": 0.2, "max_tokens": 2048}
+_heuristics = HeuristicsAnalyzer()
 
-def evaluate_candidates(candidates: List[dict], judge_model: str, openai_api_key: str) -> List[dict]:
-    # Set deterministic LLM config
-    Settings.llm = OpenAI(model=judge_model, api_key=openai_api_key, temperature=0.2, max_tokens=256)
+def evaluate_candidates(candidates: List[dict], judge_model: str, openai_api_key: str, use_cache: bool = True, llm=None) -> List[dict]:
+    # Deterministic, pooled judge LLM
+    llm = llm or get_llm(judge_model, openai_api_key, **JUDGE_PARAMS)
     results = []
-    for c in candidates:
-        system_prompt = _judge_prompt(c['prompt'])
-        res = Settings.llm.complete(system_prompt)
-        scores = _parse_llm_judge_response(res.text)
-        # Weighted overall
-        overall = int(
-            sum(scores.get(k,0)*w for k,w in RUBRIC.items())/sum(RUBRIC.values())
-        )
-        scores['Overall'] = overall
-        results.append(scores)
+    with span("evaluate_candidates", n=len(candidates)):
+        for c in candidates:
+            system_prompt = _judge_prompt(c['prompt'])
+            text = complete_text(llm, system_prompt, judge_model, JUDGE_PARAMS, use_cache=use_cache)
+            results.append(_score_judge_response(text))
     return results
 
+# --- Concurrent judging (usable outside Streamlit, e.g. batch jobs) ---
+async def evaluate_candidates_async(
+    candidates: List[dict],
+    judge_model: str,
+    openai_api_key: str,
+    max_concurrency: int = 4,
+    timeout: Optional[float] = 60.0,
+    use_cache: bool = True,
+    llm=None
+) -> List[dict]:
+    """
+    Scores all candidates with up to `max_concurrency` judge calls in flight.
+    Results are returned in candidate order; a call that times out or fails
+    yields {"Error": ...} instead of scores so one bad call doesn't sink the batch.
+    Pooled clients are bound to the shared LLM loop; when awaiting this from
+    your own event loop, pass an `llm` created there.
+    """
+    llm = llm or get_llm(judge_model, openai_api_key, **JUDGE_PARAMS)
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    async def _judge(c: dict) -> dict:
+        async with semaphore:
+            try:
+                text = await asyncio.wait_for(
+                    acomplete_text(llm, _judge_prompt(c['prompt']), judge_model, JUDGE_PARAMS, use_cache=use_cache),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                return {"Error": f"Judge call timed out after {timeout}s"}
+            except Exception as e:
+                return {"Error": str(e)}
+        return _score_judge_response(text)
+
+    with span("evaluate_candidates", n=len(candidates), concurrent=True):
+        return list(await asyncio.gather(*(_judge(c) for c in candidates)))
+
+def evaluate_candidates_concurrent(
+    candidates: List[dict],
+    judge_model: str,
+    openai_api_key: str,
+    max_concurrency: int = 4,
+    timeout: Optional[float] = 60.0,
+    use_cache: bool = True,
+    llm=None
+) -> List[dict]:
+    """Synchronous wrapper around evaluate_candidates_async (runs on the shared LLM event loop)."""
+    return run_sync(evaluate_candidates_async(candidates, judge_model, openai_api_key,
+                                              max_concurrency, timeout, use_cache, llm))
+
+# --- Batched judging: all candidates in one structured-output request ---
+def evaluate_candidates_batched(
+    candidates: List[dict],
+    judge_model: str,
+    openai_api_key: str,
+    max_retries: int = 1,
+    response_format: str = "json_schema",
+    use_cache: bool = True,
+    llm=None,
+    seed: Optional[int] = None
+) -> List[dict]:
+    """
+    Scores every candidate in a single judge request whose JSON response is
+    keyed by candidate label, so the rubric is sent once instead of N times.
+    Each entry is validated; only candidates with missing or invalid scores
+    are re-asked (up to `max_retries` times). Scores are never defaulted:
+    a candidate still unscored after the retries gets {"Error": ...}.
+    `response_format` is "json_schema" (strict structured output) or
+    "json_object" for models without schema support. A `seed` is sent to the
+    API (and so keys the cache), which lets callers draw repeat judgments.
+    """
+    llm = llm or get_llm(judge_model, openai_api_key, **BATCH_JUDGE_PARAMS)
+    labels = [f"C{i+1}" for i in range(len(candidates))]
+    results: Dict[str, Dict[str, int]] = {}
+    pending = list(labels)
+    call_kwargs = {} if seed is None else {"seed": seed}
+    with span("evaluate_candidates", n=len(candidates), batched=True):
+        for attempt in range(max(0, max_retries) + 1):
+            if not pending:
+                break
+            subset = {l: candidates[labels.index(l)]['prompt'] for l in pending}
+            complete = lambda t, asked=tuple(pending): len(_parse_batch_judge_response(t, list(asked))) == len(asked)
+            # A retry must reach the model: the same request could otherwise be answered from the cache.
+            # Only a reply that scores every asked label is cached.
+            text = complete_text(llm, _batch_judge_prompt(subset), judge_model, BATCH_JUDGE_PARAMS,
+                                 use_cache=use_cache and attempt == 0, cache_if=complete,
+                                 response_format=_judge_response_format(pending, response_format), **call_kwargs)
+            results.update(_parse_batch_judge_response(text, pending))
+            pending = [l for l in pending if l not in results]
+    return [_with_overall(results[l]) if l in results else {"Error": "Judge returned no valid scores"}
+            for l in labels]
+
+def _batch_judge_prompt(prompts: Dict[str, str]) -> str:
+    body = "\n".join(f"### {label}\n{p}\n" for label, p in prompts.items())
+    return (
+        "You are a rigorous prompt evaluator. For each prompt below, score 1-5 each for:\n"
+        "Clarity, Completeness, Constraint coverage, Testability, Safety.\n"
+        "Return one JSON object keyed by prompt label, e.g. {\"C1\": {\"Clarity\": X, ...}, ...}.\n"
+        f"{body}"
+        "Now, judge every label:"
+    )
+
+def _judge_response_format(labels: List[str], kind: str) -> dict:
+    if kind != "json_schema":
+        return {"type": "json_object"}
+    score = {"type": "object", "properties": {k: {"type": "integer", "enum": [1, 2, 3, 4, 5]} for k in RUBRIC},
+             "required": list(RUBRIC), "additionalProperties": False}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "candidate_scores",
+            "strict": True,
+            "schema": {"type": "object", "properties": {l: score for l in labels},
+                       "required": list(labels), "additionalProperties": False},
+        },
+    }
+
+def _parse_batch_judge_response(resp: str, labels: List[str]) -> Dict[str, Dict[str, int]]:
+    """Valid entries only: every rubric key present with an integer score in 1..5."""
+    m = re.search(r'{.*}', resp, re.DOTALL)
+    try:
+        j = json.loads(m.group(0)) if m else {}
+    except ValueError:
+        return {}
+    out = {}
+    for label in labels:
+        entry = j.get(label) if isinstance(j, dict) else None
+        if not isinstance(entry, dict):
+            continue
+        try:
+            scores = {k: int(entry[k]) for k in RUBRIC}
+        except (KeyError, TypeError, ValueError):
+            continue
+        if all(1 <= v <= 5 for v in scores.values()):
+            out[label] = scores
+    return out
+
+def _score_judge_response(resp: str) -> Dict[str, int]:
+    return _with_overall(_parse_llm_judge_response(resp))
+
+def _with_overall(scores: Dict[str, int]) -> Dict[str, int]:
+    scores = dict(scores)
+    # Weighted overall
+    overall = int(
+        sum(scores.get(k,0)*w for k,w in RUBRIC.items())/sum(RUBRIC.values())
+    )
+    scores['Overall'] = overall
+    return scores
+
 def _judge_prompt(prompt: str) -> str:
     return (
         "You are a rigorous prompt evaluator. For the following prompt, score 1-5 each for:\n"
@@ -55,37 +204,18 @@ def _parse_llm_judge_response(resp: str) -> Dict[str, int]:
     return {k: out.get(k, 3) for k in RUBRIC}
 
 def calc_heuristics(prompt: str) -> Dict[str, Any]:
-    # Length, Flesch, keywords, booleans
-    toks = len(prompt.split())
-    flesch = flesch_reading_ease(prompt)
-    has_role = "You are " in prompt
-    has_constraints = "must" in prompt or "limit" in prompt
-    pii = _screen_pii(prompt)
-    spec_coverage = _spec_coverage(prompt)
-    return dict(
-        Length=toks,
-        Flesch=flesch,
-        HasRole=has_role,
-        HasConstraints=has_constraints,
-        SpecCoverage=spec_coverage,
-        PII_Flag=pii
-    )
+    # Length, Flesch, keywords, booleans (single pass; see core.heuristics)
+    with span("calc_heuristics"):
+        return analyze_prompt(prompt)
 
-def flesch_reading_ease(text: str) -> float:
-    import re
-    # Flesch Reading Ease: 206.835 - 1.015*(words/sentences) - 84.6*(syllables/words)
-    sentences = max(text.count('.'), 1)
-    words = max(len(text.split()), 1)
-    syllables = sum(len(re.findall(r'[aeiouy]+', w.lower())) for w in text.split())
-    return round(206.835 - 1.015*(words/sentences) - 84.6*(syllables/words), 1)
+def calc_heuristics_batch(prompts: List[str]) -> List[Dict[str, Any]]:
+    with span("calc_heuristics", n=len(prompts)):
+        return analyze_prompts(prompts)
 
 def _screen_pii(prompt: str) -> bool:
     # Naive: detect name, address, phone, SSN, patient, etc.
-    pii_terms = ["ssn", "passport", "address", "phone", "email", "patient", "dob", "mrn", "social security", "confidential"]
-    return any(t in prompt.lower() for t in pii_terms)
+    return _heuristics.screen_pii(prompt)
 
 def _spec_coverage(prompt: str) -> float:
     # Dummy: checks for keywords "audience", "format", "length", "role"
-    required = ["audience", "format", "length", "role"]
-    found = sum(1 for k in required if k in prompt.lower())
-    return round(100.0 * found / len(required), 1)
+    return _heuristics.spec_coverage(prompt)
@@ -0,0 +1,122 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from core.pipeline import PromptAnalyzer
+from core.eval import calc_heuristics_batch
+from core.utils import inline_diff
+from core.metrics import span
+
+# --- Memoized phase graph for Streamlit reruns ---
+# Each node declares its raw inputs and the nodes it depends on. A node's key
+# is a hash of its own inputs plus its dependencies' keys, so a rerun only
+# recomputes nodes whose inputs actually changed. Memoized values are shared
+# process-wide across sessions and must be treated as read-only.
+
+def content_hash(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _Node:
+    __slots__ = ("name", "fn", "inputs", "deps")
+
+    def __init__(self, name: str, fn: Callable, inputs: Sequence[str], deps: Sequence[str]):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.deps = tuple(deps)
+
+class PhaseGraph:
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._nodes: Dict[str, _Node] = {}
+        self._memo: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, fn: Callable, inputs: Sequence[str] = (), deps: Sequence[str] = ()):
+        """fn is called with the node's inputs and dependency values as keyword arguments."""
+        for d in deps:
+            if d not in self._nodes:
+                raise KeyError(f"Unknown dependency '{d}' for node '{name}'")
+        self._nodes[name] = _Node(name, fn, inputs, deps)
+        return self
+
+    def key(self, name: str, values: Dict[str, Any], _keys: Optional[Dict[str, str]] = None) -> str:
+        keys = {} if _keys is None else _keys
+        if name not in keys:
+            node = self._nodes[name]
+            parts = [name, [content_hash(values[i]) for i in node.inputs],
+                     [self.key(d, values, keys) for d in node.deps]]
+            keys[name] = content_hash(parts)
+        return keys[name]
+
+    def evaluate(self, name: str, **values) -> Any:
+        return self._evaluate(name, values, {})
+
+    def _evaluate(self, name: str, values: Dict[str, Any], keys: Dict[str, str]) -> Any:
+        node = self._nodes[name]
+        k = self.key(name, values, keys)
+        with self._lock:
+            if k in self._memo:
+                self._memo.move_to_end(k)
+                self.hits += 1
+                return self._memo[k]
+        kwargs = {i: values[i] for i in node.inputs}
+        kwargs.update({d: self._evaluate(d, values, keys) for d in node.deps})
+        result = node.fn(**kwargs)
+        with self._lock:
+            self.misses += 1
+            self._memo[k] = result
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._memo)}
+
+# --- The app's phase graph ---
+def _deconstruct(prompt: str, constraints: dict) -> dict:
+    with span("deconstruct"):
+        return PromptAnalyzer(prompt).deconstruct(constraints)
+
+def _diagnose(prompt: str, deconstruct: dict) -> dict:
+    with span("diagnose"):
+        return PromptAnalyzer(prompt).diagnose(deconstruct)
+
+def _heuristics(candidate_prompts: List[str]) -> List[dict]:
+    return calc_heuristics_batch(candidate_prompts)
+
+def _ab_diff(prompt_a: str, prompt_b: str) -> str:
+    return inline_diff(prompt_a, prompt_b)
+
+def _word_diff(prompt_a: str, prompt_b: str) -> dict:
+    from core.compare import word_diff
+    return word_diff(prompt_a, prompt_b)
+
+def _similarity(candidate_prompts: List[str]):
+    # Imported on first use: numpy isn't needed to render the app
+    from core.compare import similarity_matrix
+    return similarity_matrix(candidate_prompts)
+
+def build_app_graph(max_entries: int = 1024) -> PhaseGraph:
+    return (PhaseGraph(max_entries)
+            .add("deconstruct", _deconstruct, inputs=["prompt", "constraints"])
+            .add("diagnose", _diagnose, inputs=["prompt"], deps=["deconstruct"])
+            .add("heuristics", _heuristics, inputs=["candidate_prompts"])
+            .add("ab_diff", _ab_diff, inputs=["prompt_a", "prompt_b"])
+            .add("word_diff", _word_diff, inputs=["prompt_a", "prompt_b"])
+            .add("similarity", _similarity, inputs=["candidate_prompts"]))
+
+_graph: Optional[PhaseGraph] = None
+_graph_lock = threading.Lock()
+
+def get_app_graph() -> PhaseGraph:
+    """Process-wide graph shared by all Streamlit sessions."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_app_graph()
+        return _graph
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import threading
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from core import metrics
+
+# --- Hedged requests for tail latency ---
+# The primary request starts alone. If it hasn't produced an accepted result
+# after the model's recent p-quantile latency, a duplicate (optionally on a
+# fallback model) is fired and the first accepted response wins; the other
+# task is cancelled. Both run on the shared LLM loop and go through the
+# cache and rate limiter like any other call. Configured from the `hedging`
+# section of settings.yaml.
+
+LATENCY_WINDOW = 200
+
+class LatencyTracker:
+    """Recent completed-call latencies per model (a sliding window)."""
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples[model].append(seconds)
+
+    def quantile(self, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class HedgeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.rejected = 0  # responses that errored or failed the accept check
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, hedged: bool, winner: Optional[str], latency: float, rejected: int):
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += winner == "hedge"
+            self.rejected += rejected
+            self.latencies.append(latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """End-to-end latency of hedge-eligible calls; compare with primary_p95_s for the savings."""
+        with self._lock:
+            lat = sorted(self.latencies)
+            pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else None
+            return {
+                "calls": self.calls,
+                "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "rejected": self.rejected,
+                "p50_s": pick(0.5),
+                "p95_s": pick(0.95),
+            }
+
+latency_tracker = LatencyTracker()
+hedge_stats = HedgeStats()
+
+def hedge_report(model: str) -> Dict[str, Any]:
+    """hedge_stats plus the p95 of completed primary calls (censored: cancelled primaries aren't in it)."""
+    primary = latency_tracker.quantile(model, 0.95)
+    return dict(hedge_stats.snapshot(), primary_p95_s=round(primary, 3) if primary is not None else None)
+
+async def race(
+    primary: Callable[[], Awaitable[str]],
+    hedge: Callable[[], Awaitable[str]],
+    delay: float,
+    accept: Callable[[str], bool],
+    model: str = ""
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns the first accepted result and how it was won. If nothing is
+    accepted, the primary's result (or exception) is returned as-is.
+    race() doesn't feed latency_tracker: a task may be answered from the
+    cache, so callers record upstream latencies themselves (see
+    acomplete_text's on_latency).
+    """
+    started = time.perf_counter()
+    tasks = {asyncio.ensure_future(primary()): "primary"}
+    finished: Dict[str, Any] = {}
+    hedged_at: Optional[float] = None
+    rejected = 0
+    try:
+        while tasks:
+            timeout = None if hedged_at is not None else max(0.0, delay - (time.perf_counter() - started))
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than the threshold: fire the duplicate
+                hedged_at = time.perf_counter()
+                tasks[asyncio.ensure_future(hedge())] = "hedge"
+                continue
+            for task in done:
+                role = tasks.pop(task)
+                if task.exception() is not None:
+                    finished[role] = task.exception()
+                    rejected += 1
+                    continue
+                finished[role] = task.result()
+                if accept(finished[role]):
+                    total = time.perf_counter() - started
+                    info = {"winner": role, "hedged": hedged_at is not None, "latency_s": round(total, 4)}
+                    _record(info, rejected, model)
+                    return finished[role], info
+                rejected += 1
+            if hedged_at is None and not tasks:
+                # The primary came back unusable before the threshold: hedge right away
+                hedged_at = time.perf_counter()
+                tasks[asyncio.ensure_future(hedge())] = "hedge"
+    finally:
+        for task in tasks:
+            task.cancel()
+    info = {"winner": None, "hedged": hedged_at is not None, "latency_s": round(time.perf_counter() - started, 4)}
+    _record(info, rejected, model)
+    result = finished.get("primary", finished.get("hedge"))
+    if isinstance(result, BaseException):
+        raise result
+    return result, info
+
+def _record(info: Dict[str, Any], rejected: int, model: str):
+    hedge_stats.record(info["hedged"], info["winner"], info["latency_s"], rejected)
+    outcome = "failed" if info["winner"] is None else info["winner"] if info["hedged"] else "unhedged"
+    metrics.record_hedge(model, outcome, info["latency_s"])
+
+def hedge_delay(model: str, cfg: Dict[str, Any]) -> float:
+    """The p-quantile of recent latencies, or hedging.default_delay until there are enough samples."""
+    q = latency_tracker.quantile(model, cfg.get("quantile", 0.9), cfg.get("min_samples", 20))
+    delay = q if q is not None else cfg.get("default_delay", 10.0)
+    return max(cfg.get("min_delay", 1.0), delay)
+
+_config: Optional[Dict[str, Any]] = None
+
+def hedging_settings() -> Dict[str, Any]:
+    global _config
+    if _config is None:
+        try:
+            from config.settings import get_config
+            _config = (get_config() or {}).get("hedging", {}) or {}
+        except Exception:
+            _config = {}
+    return _config
+
+def enabled() -> bool:
+    return bool(hedging_settings().get("enabled", False))
+
+def configure(**settings):
+    global _config
+    _config = dict(settings)
@@ -0,0 +1,84 @@
+import re
+from typing import Any, Dict, Iterable, List, Sequence
+
+# --- Single-pass heuristics engine ---
+# Each prompt is split and lowercased exactly once; every metric is answered
+# from those shared views. Values are identical to the original per-metric
+# implementations in core.eval.
+
+PII_TERMS = ["ssn", "passport", "address", "phone", "email", "patient", "dob", "mrn", "social security", "confidential"]
+SPEC_TERMS = ["audience", "format", "length", "role"]
+ROLE_MARKERS = ["You are "]
+CONSTRAINT_MARKERS = ["must", "limit"]
+
+_VOWEL_RUNS = re.compile(r'[aeiouy]+')
+
+class KeywordMatcher:
+    """
+    Matches a fixed keyword list against a text view in one call.
+    Keywords are deduplicated and fixed at construction. Each check is a
+    C-level substring search over the shared view. For lists this short,
+    CPython runs that faster than a Python-level automaton or a regex
+    alternation.
+    """
+    def __init__(self, keywords: Sequence[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+
+    def found(self, text: str) -> List[str]:
+        return [k for k in self.keywords if k in text]
+
+    def any(self, text: str) -> bool:
+        return any(k in text for k in self.keywords)
+
+def _flesch(text: str, words: int, lower: str) -> float:
+    # Flesch Reading Ease: 206.835 - 1.015*(words/sentences) - 84.6*(syllables/words)
+    sentences = max(text.count('.'), 1)
+    words = max(words, 1)
+    # Vowel runs never cross whitespace, so counting on the whole text equals the per-word sum
+    syllables = len(_VOWEL_RUNS.findall(lower))
+    return round(206.835 - 1.015*(words/sentences) - 84.6*(syllables/words), 1)
+
+class HeuristicsAnalyzer:
+    def __init__(
+        self,
+        pii_terms: Sequence[str] = PII_TERMS,
+        spec_terms: Sequence[str] = SPEC_TERMS
+    ):
+        self._pii = KeywordMatcher(pii_terms)
+        self._spec = KeywordMatcher(spec_terms)
+        self._n_spec = len(spec_terms)
+        self._role = KeywordMatcher(ROLE_MARKERS)
+        self._constraints = KeywordMatcher(CONSTRAINT_MARKERS)
+
+    def analyze(self, prompt: str) -> Dict[str, Any]:
+        toks = len(prompt.split())
+        lower = prompt.lower()
+        return dict(
+            Length=toks,
+            Flesch=_flesch(prompt, toks, lower),
+            HasRole=self._role.any(prompt),
+            HasConstraints=self._constraints.any(prompt),
+            SpecCoverage=round(100.0 * len(self._spec.found(lower)) / self._n_spec, 1),
+            PII_Flag=self._pii.any(lower)
+        )
+
+    def analyze_batch(self, prompts: Iterable[str]) -> List[Dict[str, Any]]:
+        return [self.analyze(p) for p in prompts]
+
+    def screen_pii(self, prompt: str) -> bool:
+        return self._pii.any(prompt.lower())
+
+    def spec_coverage(self, prompt: str) -> float:
+        return round(100.0 * len(self._spec.found(prompt.lower())) / self._n_spec, 1)
+
+_default = HeuristicsAnalyzer()
+
+def analyze_prompt(prompt: str) -> Dict[str, Any]:
+    return _default.analyze(prompt)
+
+def analyze_prompts(prompts: Iterable[str]) -> List[Dict[str, Any]]:
+    """Batch entry point for scoring many prompts (regression runs, batch jobs)."""
+    return _default.analyze_batch(prompts)
+
+def flesch_reading_ease(text: str) -> float:
+    return _flesch(text, len(text.split()), text.lower())
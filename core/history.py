@@ -0,0 +1,510 @@
+import os
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypedDict
+
+# --- Session history backends ---
+# Both backends support O(1) lookup by session_id, newest-first pagination,
+# tag/date filters and appends without reloading the whole history.
+# `tag` filters are case-insensitive substring matches on the session tag;
+# `since`/`until` are ISO date or datetime prefixes (inclusive).
+# Sessions rotated out by `archive` live in compressed monthly segments under
+# archive_dir (see core/archive.py); `get` falls back to them.
+# The History panel reads compact summaries through a process-wide view that
+# all browser sessions share; it is invalidated when the underlying data
+# changes (SQLite data_version / JSONL file stat), not on every rerun.
+
+DEFAULT_SQLITE_PATH = "data/history.sqlite"
+DEFAULT_JSONL_PATH = "data/history.jsonl"
+SUMMARY_PROMPT_CHARS = 80
+VIEW_CACHE_SIZE = 256
+
+class SessionSummary(TypedDict):
+    session_id: str
+    timestamp: str
+    tags: str
+    prompt: str  # first SUMMARY_PROMPT_CHARS characters
+
+def _summary(session_id: str, timestamp: str, tags: str, prompt: str) -> SessionSummary:
+    return SessionSummary(session_id=session_id, timestamp=timestamp, tags=tags,
+                          prompt=(prompt or "")[:SUMMARY_PROMPT_CHARS])
+
+class HistoryStore(ABC):
+    archive_dir: Optional[str] = None
+
+    def __init__(self):
+        self._view: Dict[tuple, Any] = {}
+        self._view_version: Any = None
+        self._view_lock = threading.Lock()
+
+    @abstractmethod
+    def data_version(self) -> Any:
+        """Changes whenever sessions are added or removed, by this process or another."""
+
+    def _cached(self, key: tuple, compute: Callable[[], Any]) -> Any:
+        version = self.data_version()
+        with self._view_lock:
+            if version != self._view_version:
+                self._view.clear()
+                self._view_version = version
+            if key in self._view:
+                return self._view[key]
+        value = compute()
+        with self._view_lock:
+            if version == self._view_version:
+                if len(self._view) >= VIEW_CACHE_SIZE:
+                    self._view.pop(next(iter(self._view)))
+                self._view[key] = value
+        return value
+
+    @abstractmethod
+    def _summaries(self, offset: int, limit: int, tag, since, until) -> List[SessionSummary]:
+        ...
+
+    def list_summaries(self, offset: int = 0, limit: int = 20, tag: Optional[str] = None,
+                       since: Optional[str] = None, until: Optional[str] = None) -> List[SessionSummary]:
+        """Newest-first page of compact summaries, shared across callers until the history changes."""
+        return self._cached(("summaries", offset, limit, tag, since, until),
+                            lambda: self._summaries(offset, limit, tag, since, until))
+
+    def count_cached(self, tag: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> int:
+        return self._cached(("count", tag, since, until), lambda: self.count(tag, since, until))
+
+    @abstractmethod
+    def append(self, session: dict):
+        ...
+
+    @abstractmethod
+    def archive(self, cutoff: str, writer) -> int:
+        """
+        Moves sessions with timestamp < cutoff to writer (an archive.SegmentWriter).
+        The writer is closed (flushed and fsynced) before anything is removed
+        from the store; if writing or closing fails, the partial segments are
+        discarded and the store is left untouched.
+        """
+
+    def _get_archived(self, session_id: str) -> dict:
+        if not self.archive_dir:
+            return {}
+        from core.archive import find_archived
+        return find_archived(self.archive_dir, session_id)
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def list_sessions(self, offset: int = 0, limit: int = 20, tag: Optional[str] = None,
+                      since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Newest-first page of full session records."""
+
+    @abstractmethod
+    def count(self, tag: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        ...
+
+    @abstractmethod
+    def iter_sessions(self) -> Iterator[Dict]:
+        """All active (not archived) sessions, oldest first, one record at a time."""
+
+    def import_jsonl(self, path: str) -> int:
+        n = 0
+        if not os.path.exists(path):
+            return n
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self.append(json.loads(line))
+                    n += 1
+        return n
+
+    def export_jsonl(self, path: str) -> int:
+        n = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for s in self.iter_sessions():
+                f.write(json.dumps(s, ensure_ascii=False) + '\n')
+                n += 1
+        return n
+
+def _close_segments(writer):
+    """Makes the archived copies durable; on failure removes them and re-raises."""
+    try:
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+def _archive_jsonl(path: str, cutoff: str, writer=None) -> int:
+    """
+    Rewrites a JSONL history keeping sessions from cutoff on; older ones go to
+    writer if given. The original file is only replaced after the writer's
+    segments are durable.
+    """
+    if not os.path.exists(path):
+        if writer is not None:
+            _close_segments(writer)
+        return 0
+    moved = 0
+    tmp = path + ".tmp"
+    try:
+        with open(path, 'r', encoding='utf-8') as src, open(tmp, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                s = json.loads(line)
+                if (s.get('timestamp', '') or '') < cutoff:
+                    if writer is not None:
+                        writer.write(s)
+                    moved += 1
+                else:
+                    dst.write(line if line.endswith('\n') else line + '\n')
+            dst.flush()
+            os.fsync(dst.fileno())
+        if writer is not None:
+            _close_segments(writer)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+    return moved
+
+def _matches(timestamp: str, tags: str, tag: Optional[str], since: Optional[str], until: Optional[str]) -> bool:
+    if tag and tag.lower() not in (tags or "").lower():
+        return False
+    if since and timestamp < since:
+        return False
+    if until and timestamp[:len(until)] > until:
+        return False
+    return True
+
+class SqliteHistoryStore(HistoryStore):
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, mirror_jsonl: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self._writes = 0
+        # Optional JSONL file kept in sync on append, for tools that read history.jsonl
+        self.mirror_jsonl = mirror_jsonl
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT UNIQUE NOT NULL, "
+            "timestamp TEXT NOT NULL DEFAULT '', tags TEXT NOT NULL DEFAULT '', data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_ts ON sessions(timestamp, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def _insert(self, session: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, timestamp, tags, data) VALUES (?, ?, ?, ?)",
+            (str(session.get('session_id', '')), session.get('timestamp', '') or '',
+             str(session.get('tags', '') or ''), json.dumps(session, ensure_ascii=False))
+        )
+
+    def append(self, session: dict):
+        with self._lock:
+            self._insert(session)
+            self._conn.commit()
+            self._writes += 1
+        if self.mirror_jsonl:
+            with open(self.mirror_jsonl, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(session, ensure_ascii=False) + '\n')
+
+    def import_jsonl(self, path: str) -> int:
+        # Single transaction: much faster than committing per session
+        n = 0
+        if not os.path.exists(path):
+            return n
+        with self._lock, open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._insert(json.loads(line))
+                    n += 1
+            self._conn.commit()
+            self._writes += 1
+        return n
+
+    def migrate_jsonl(self, path: str) -> int:
+        """
+        One-time import of the JSONL history of an existing install. A marker in
+        the meta table records that it ran, so a store emptied later (e.g. by
+        archiving) is not refilled from a stale history.jsonl.
+        """
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'jsonl_migrated'").fetchone():
+                return 0
+        # A database that already holds sessions predates the marker: it was migrated
+        n = self.import_jsonl(path) if self.count() == 0 else 0
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('jsonl_migrated', ?)", (path,))
+            self._conn.commit()
+        return n
+
+    def get(self, session_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else self._get_archived(session_id)
+
+    def archive(self, cutoff: str, writer) -> int:
+        archived: List[int] = []
+        with self._lock:
+            try:
+                last_id = 0
+                while True:
+                    rows = self._conn.execute(
+                        "SELECT id, data FROM sessions WHERE timestamp < ? AND id > ? ORDER BY id LIMIT 500",
+                        (cutoff, last_id)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    for rid, data in rows:
+                        writer.write(json.loads(data))
+                        archived.append(rid)
+                    last_id = rows[-1][0]
+            except BaseException:
+                writer.abort()
+                raise
+            # Only delete what is now safely on disk in the archive
+            _close_segments(writer)
+            if not archived:
+                return 0
+            self._conn.executemany("DELETE FROM sessions WHERE id = ?", [(rid,) for rid in archived])
+            self._conn.commit()
+            self._writes += 1
+            self._conn.execute("VACUUM")
+            if self.mirror_jsonl:
+                # Already archived from the database; just drop them from the mirror
+                _archive_jsonl(self.mirror_jsonl, cutoff)
+        return len(archived)
+
+    def data_version(self):
+        # data_version only moves for commits on other connections; _writes covers our own
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def _summaries(self, offset, limit, tag, since, until) -> List[SessionSummary]:
+        where, args = self._where(tag, since, until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT session_id, timestamp, tags, substr(json_extract(data, '$.prompt'), 1, ?) "
+                f"FROM sessions{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                [SUMMARY_PROMPT_CHARS] + args + [limit, offset]
+            ).fetchall()
+        return [_summary(*r) for r in rows]
+
+    @staticmethod
+    def _where(tag, since, until):
+        clauses, args = [], []
+        if tag:
+            clauses.append("instr(lower(tags), lower(?)) > 0")
+            args.append(tag)
+        if since:
+            clauses.append("timestamp >= ?")
+            args.append(since)
+        if until:
+            clauses.append("substr(timestamp, 1, ?) <= ?")
+            args.extend([len(until), until])
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def list_sessions(self, offset=0, limit=20, tag=None, since=None, until=None) -> List[Dict]:
+        where, args = self._where(tag, since, until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM sessions{where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def count(self, tag=None, since=None, until=None) -> int:
+        where, args = self._where(tag, since, until)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM sessions{where}", args).fetchone()[0]
+
+    def iter_sessions(self) -> Iterator[Dict]:
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM sessions WHERE id > ? ORDER BY id LIMIT 500", (last_id,)
+                ).fetchall()
+            if not rows:
+                return
+            for rid, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+class JsonlHistoryStore(HistoryStore):
+    """
+    Append-only JSONL file with an in-memory byte-offset index.
+    The file is scanned once per process; later appends (from this or other
+    processes) are picked up by reading only the bytes past the last offset.
+    """
+    def __init__(self, path: str = DEFAULT_JSONL_PATH):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._size = 0
+        self._stat: Optional[tuple] = None  # (st_ino, st_mtime_ns, st_size) the index is known to match
+        self._offsets: Dict[str, int] = {}
+        self._entries: List[tuple] = []  # (timestamp, tags, session_id, offset, prompt preview), file order
+
+    def _reset(self):
+        self._size = 0
+        self._stat = None
+        self._offsets.clear()
+        self._entries.clear()
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return
+        if self._stat is not None and (st.st_ino != self._stat[0] or st.st_size <= self._size):
+            # Replaced by a rotation or rewritten in place (possibly in another process):
+            # re-index from scratch. Growth on the same inode is an append.
+            self._reset()
+        self._stat = stat
+        if st.st_size <= self._size:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._size)
+            pos = self._size
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partially written line: pick it up next time
+                if line.strip():
+                    s = json.loads(line)
+                    sid = str(s.get('session_id', ''))
+                    self._offsets[sid] = pos
+                    self._entries.append((s.get('timestamp', '') or '', str(s.get('tags', '') or ''), sid, pos,
+                                          (s.get('prompt') or '')[:SUMMARY_PROMPT_CHARS]))
+                pos += len(line)
+            self._size = pos
+
+    def _read_at(self, offset: int) -> dict:
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def append(self, session: dict):
+        with self._lock:
+            self._refresh()
+            line = (json.dumps(session, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+                f.flush()
+                st = os.fstat(f.fileno())
+            if offset != self._size:
+                # Someone else appended concurrently: re-index from our last position
+                self._refresh()
+            else:
+                sid = str(session.get('session_id', ''))
+                self._offsets[sid] = offset
+                self._entries.append((session.get('timestamp', '') or '', str(session.get('tags', '') or ''), sid, offset,
+                                      (session.get('prompt') or '')[:SUMMARY_PROMPT_CHARS]))
+                self._size = offset + len(line)
+                # Unknown if another writer slipped in after us: the next refresh reads on from _size
+                self._stat = (st.st_ino, st.st_mtime_ns, st.st_size) if st.st_size == self._size else None
+
+    def get(self, session_id: str) -> dict:
+        with self._lock:
+            self._refresh()
+            offset = self._offsets.get(session_id)
+            if offset is not None:
+                return self._read_at(offset)
+        return self._get_archived(session_id)
+
+    def archive(self, cutoff: str, writer) -> int:
+        with self._lock:
+            moved = _archive_jsonl(self.path, cutoff, writer)
+            self._reset()
+        return moved
+
+    def _filtered(self, tag, since, until) -> List[tuple]:
+        self._refresh()
+        # Latest record wins for duplicated session ids
+        entries = [e for e in self._entries
+                   if self._offsets.get(e[2]) == e[3] and _matches(e[0], e[1], tag, since, until)]
+        entries.sort(key=lambda e: e[0])  # stable: keeps file order within a timestamp
+        return entries
+
+    def _page(self, offset, limit, tag, since, until) -> List[tuple]:
+        entries = self._filtered(tag, since, until)
+        end = len(entries) - offset
+        return entries[max(end - limit, 0):max(end, 0)][::-1]
+
+    def list_sessions(self, offset=0, limit=20, tag=None, since=None, until=None) -> List[Dict]:
+        with self._lock:
+            return [self._read_at(e[3]) for e in self._page(offset, limit, tag, since, until)]
+
+    def data_version(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def _summaries(self, offset, limit, tag, since, until) -> List[SessionSummary]:
+        # Served from the in-memory index: no record is read from disk
+        with self._lock:
+            return [_summary(e[2], e[0], e[1], e[4]) for e in self._page(offset, limit, tag, since, until)]
+
+    def count(self, tag=None, since=None, until=None) -> int:
+        with self._lock:
+            return len(self._filtered(tag, since, until))
+
+    def iter_sessions(self) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def open_history_store(cfg: Optional[dict] = None) -> HistoryStore:
+    """Builds the backend described by the `history` section of settings.yaml."""
+    cfg = cfg or {}
+    jsonl_path = cfg.get("jsonl_path", DEFAULT_JSONL_PATH)
+    if cfg.get("backend", "sqlite") == "jsonl":
+        store = JsonlHistoryStore(jsonl_path)
+    else:
+        store = SqliteHistoryStore(
+            cfg.get("path", DEFAULT_SQLITE_PATH),
+            mirror_jsonl=jsonl_path if cfg.get("mirror_jsonl", True) else None
+        )
+        store.migrate_jsonl(jsonl_path)
+    store.archive_dir = cfg.get("archive_dir")
+    if store.archive_dir and cfg.get("retention_days"):
+        from core.archive import rotate_history
+        rotate_history(store, cfg["retention_days"], store.archive_dir, cfg.get("archive_compression", "gz"))
+    return store
+
+def history_settings() -> dict:
+    try:
+        from config.settings import get_config
+        return (get_config() or {}).get("history", {}) or {}
+    except Exception:
+        return {}
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """Process-wide history store configured from settings.yaml."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_history_store(history_settings())
+        return _store
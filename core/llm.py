@@ -0,0 +1,275 @@
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import contextvars
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from core.cache import get_response_cache
+from core import metrics, ratelimit
+
+T = TypeVar("T")
+
+# --- Process-wide LLM client pool ---
+# One LLM instance per (model, api key, params), shared by all sessions and
+# threads. Instances are passed explicitly to callers instead of through the
+# global llama_index Settings, so concurrent sessions can't see each other's
+# config. All sync clients share one keep-alive HTTP connection pool; async
+# calls run on one long-lived event loop so their connections are reused too.
+
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20
+
+_llms: Dict[tuple, Any] = {}
+_llms_lock = threading.Lock()
+_http_client = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _shared_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+        _http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+    return _http_client
+
+def _client_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # The rate limiter owns retries; the OpenAI client's own retries would stack on top
+    return dict({"max_retries": 0}, **params) if ratelimit.enabled() else params
+
+def _new_llm(model: str, api_key: str, params: Dict[str, Any]):
+    from llama_index.llms.openai import OpenAI
+    params = _client_params(params)
+    try:
+        return OpenAI(model=model, api_key=api_key, http_client=_shared_http_client(), **params)
+    except (TypeError, ValueError):
+        # Older llama-index-llms-openai without http_client: the instance still keeps its own connection pool
+        return OpenAI(model=model, api_key=api_key, **params)
+
+def get_llm(model: str, api_key: str, **params):
+    """Pooled LLM for (model, api_key, params); built on first use."""
+    key = (model, hashlib.sha256(api_key.encode("utf-8")).hexdigest(), json.dumps(params, sort_keys=True))
+    llm = _llms.get(key)
+    if llm is None:
+        with _llms_lock:
+            llm = _llms.get(key)
+            if llm is None:
+                llm = _llms[key] = _new_llm(model, api_key, params)
+    return llm
+
+def _new_embed_model(model: str, api_key: str, params: Dict[str, Any]):
+    from llama_index.embeddings.openai import OpenAIEmbedding
+    params = _client_params(params)
+    try:
+        return OpenAIEmbedding(model=model, api_key=api_key, http_client=_shared_http_client(), **params)
+    except (TypeError, ValueError):
+        return OpenAIEmbedding(model=model, api_key=api_key, **params)
+
+def get_embed_model(model: str, api_key: str, **params):
+    """Pooled embedding model, shared like get_llm()."""
+    key = ("embed", model, hashlib.sha256(api_key.encode("utf-8")).hexdigest(), json.dumps(params, sort_keys=True))
+    embed_model = _llms.get(key)
+    if embed_model is None:
+        with _llms_lock:
+            embed_model = _llms.get(key)
+            if embed_model is None:
+                embed_model = _llms[key] = _new_embed_model(model, api_key, params)
+    return embed_model
+
+def clear_llm_pool():
+    with _llms_lock:
+        _llms.clear()
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _loop
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Runs a coroutine on the shared LLM event loop and waits for its result.
+    The caller's context variables (e.g. the metrics session) carry over.
+    """
+    loop = _event_loop()
+    ctx = contextvars.copy_context()
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def _done(task: asyncio.Task):
+        if task.cancelled():
+            result.cancel()
+        elif task.exception() is not None:
+            result.set_exception(task.exception())
+        else:
+            result.set_result(task.result())
+
+    def _start():
+        # The task copies the current context at creation: create it inside ctx
+        ctx.run(loop.create_task, coro).add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start)
+    return result.result()
+
+# --- Usage accounting ---
+def _usage(res, prompt: str, text: str, model: str) -> Tuple[int, int]:
+    """Prompt/completion tokens from the API response, else tiktoken estimates."""
+    raw = getattr(res, "raw", None)
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if isinstance(usage, dict):
+        pt, ct = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    else:
+        pt, ct = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    if pt is None or ct is None:
+        from core.utils import estimate_token_counts
+        pt, ct = estimate_token_counts([prompt, text], model)
+    return int(pt), int(ct)
+
+def _record(res, prompt: str, text: str, model: str, started: float):
+    if metrics.enabled():
+        pt, ct = _usage(res, prompt, text, model)
+        metrics.record_llm_call(model, pt, ct, time.perf_counter() - started)
+
+# --- Rate limiting (see core.ratelimit) ---
+def _reserve(prompt: str, model: str, params: Dict[str, Any]) -> int:
+    """Tokens to reserve up front: tiktoken prompt estimate plus the completion cap."""
+    from core.utils import estimate_token_count
+    return estimate_token_count(prompt, model) + int(params.get("max_tokens") or 0)
+
+def _settle(limiter, reserved: int, res, prompt: str, text: str, model: str):
+    if limiter is not None:
+        pt, ct = _usage(res, prompt, text, model)
+        limiter.settle(reserved, pt + ct)
+
+def _open_stream(llm, prompt: str):
+    # Errors surface on the first chunk, so that's the part worth retrying
+    it = iter(llm.stream_complete(prompt))
+    return it, next(it, None)
+
+# --- LLM call helpers shared by core.pipeline and core.eval ---
+
+def complete_text(llm, prompt: str, model: str, params: Dict[str, Any], use_cache: bool = True,
+                  cache_if: Optional[Callable[[str], bool]] = None, **call_kwargs) -> str:
+    """
+    Runs llm.complete(prompt, **call_kwargs) through the response cache.
+    use_cache=False bypasses the lookup but still stores the fresh response.
+    Per-call kwargs (e.g. response_format) are part of the cache key. With
+    cache_if, only responses it accepts are stored, so an unusable reply is
+    not served again for the cache TTL.
+    """
+    cache = get_response_cache()
+    key = cache.make_key(model, dict(params, **call_kwargs), prompt)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.record_llm_call(model, 0, 0, cached=True)
+            return cached
+    started = time.perf_counter()
+    if ratelimit.enabled():
+        limiter, reserved = ratelimit.get_rate_limiter(model), _reserve(prompt, model, params)
+        res = limiter.call(lambda: llm.complete(prompt, **call_kwargs), reserved)
+    else:
+        limiter, reserved = None, 0
+        res = llm.complete(prompt, **call_kwargs)
+    text = res.text
+    _record(res, prompt, text, model, started)
+    _settle(limiter, reserved, res, prompt, text, model)
+    if cache_if is None or cache_if(text):
+        cache.set(key, text)
+    return text
+
+async def acomplete_text(llm, prompt: str, model: str, params: Dict[str, Any], use_cache: bool = True,
+                         on_latency: Optional[Callable[[float], None]] = None, **call_kwargs) -> str:
+    """on_latency gets the seconds of the upstream call that answered (not cache hits or rate-limit waits)."""
+    cache = get_response_cache()
+    key = cache.make_key(model, dict(params, **call_kwargs), prompt)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.record_llm_call(model, 0, 0, cached=True)
+            return cached
+    started = time.perf_counter()
+
+    async def call():
+        t0 = time.perf_counter()
+        res = await llm.acomplete(prompt, **call_kwargs)
+        if on_latency is not None:
+            on_latency(time.perf_counter() - t0)
+        return res
+
+    if ratelimit.enabled():
+        limiter, reserved = ratelimit.get_rate_limiter(model), _reserve(prompt, model, params)
+        res = await limiter.acall(call, reserved)
+    else:
+        limiter, reserved = None, 0
+        res = await call()
+    text = res.text
+    _record(res, prompt, text, model, started)
+    _settle(limiter, reserved, res, prompt, text, model)
+    cache.set(key, text)
+    return text
+
+def stream_text(llm, prompt: str, model: str, params: Dict[str, Any], use_cache: bool = True) -> Iterator[str]:
+    """
+    Yields text deltas from llm.stream_complete(prompt). A cache hit is yielded
+    as a single chunk; a fully consumed stream is stored in the cache.
+    """
+    cache = get_response_cache()
+    key = cache.make_key(model, params, prompt)
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            metrics.record_llm_call(model, 0, 0, cached=True)
+            yield cached
+            return
+    started = time.perf_counter()
+    if ratelimit.enabled():
+        limiter, reserved = ratelimit.get_rate_limiter(model), _reserve(prompt, model, params)
+        it, chunk = limiter.call(lambda: _open_stream(llm, prompt), reserved)
+    else:
+        limiter, reserved = None, 0
+        it, chunk = _open_stream(llm, prompt)
+    parts = []
+    last = chunk
+    while chunk is not None:
+        delta = chunk.delta or ""
+        parts.append(delta)
+        yield delta
+        last, chunk = chunk, next(it, None)
+    text = "".join(parts)
+    _record(last, prompt, text, model, started)
+    _settle(limiter, reserved, last, prompt, text, model)
+    cache.set(key, text)
+
+def embed_texts(embed_model, texts: List[str], model: str, params: Dict[str, Any], use_cache: bool = True) -> List[List[float]]:
+    """Embeddings for texts; cached per text, misses fetched in one batch request."""
+    cache = get_response_cache()
+    keys = [cache.make_key("embed:" + model, params, t) for t in texts]
+    out: List[Optional[List[float]]] = [None] * len(texts)
+    if use_cache:
+        for i, k in enumerate(keys):
+            hit = cache.get(k)
+            if hit is not None:
+                out[i] = json.loads(hit)
+    missing = [i for i, v in enumerate(out) if v is None]
+    if missing:
+        from core.utils import estimate_token_counts
+        batch = [texts[i] for i in missing]
+        started = time.perf_counter()
+        if ratelimit.enabled():
+            n_tokens = sum(estimate_token_counts(batch, "gpt-4"))
+            vectors = ratelimit.get_rate_limiter(model).call(lambda: embed_model.get_text_embedding_batch(batch), n_tokens)
+        else:
+            vectors = embed_model.get_text_embedding_batch(batch)
+        if metrics.enabled():
+            n_tokens = sum(estimate_token_counts(batch, "gpt-4"))
+            metrics.record_llm_call(model, n_tokens, 0, time.perf_counter() - started)
+        for i, v in zip(missing, vectors):
+            out[i] = list(v)
+            cache.set(keys[i], json.dumps(out[i]))
+    return out
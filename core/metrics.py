@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+import contextvars
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional
+
+# --- Instrumentation: phase spans, LLM usage/cost, trace + Prometheus export ---
+# Configured from the `metrics` section of settings.yaml. When disabled,
+# span() returns a shared no-op context manager and record_llm_call() returns
+# immediately, so hooks can stay in hot paths. Trace records are buffered and
+# written under their own lock, never while holding the counters' lock.
+
+# USD per 1M tokens (input, output); override via metrics.prices in settings.yaml
+DEFAULT_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+MAX_TRACKED_SESSIONS = 1000
+DEFAULT_TRACE_MAX_BYTES = 10 * 1024 * 1024  # then traces.jsonl rolls over to traces.jsonl.1
+TRACE_FLUSH_LINES = 64  # buffered trace records are written once this many are pending...
+TRACE_FLUSH_SECONDS = 1.0  # ...or this long after the last write
+
+_NULL_SPAN = contextlib.nullcontext()
+_session_id: contextvars.ContextVar = contextvars.ContextVar("metrics_session_id", default=None)
+
+_enabled: Optional[bool] = None
+_trace_path: Optional[str] = None
+_trace_max_bytes: Optional[int] = DEFAULT_TRACE_MAX_BYTES
+_prices: Dict[str, tuple] = dict(DEFAULT_PRICES)
+_lock = threading.Lock()
+_trace_lock = threading.Lock()  # guards the trace file and buffer only
+_trace_file = None
+_trace_buffer: List[str] = []
+_trace_flushed = 0.0
+_phase_totals: Dict[str, list] = defaultdict(lambda: [0, 0.0])  # name -> [count, seconds]
+_llm_totals: Dict[tuple, list] = defaultdict(lambda: [0, 0, 0, 0.0])  # (model, cached) -> [calls, in, out, usd]
+_sessions: "OrderedDict[str, dict]" = OrderedDict()
+_queue_depth: Dict[tuple, int] = {}  # (model, priority) -> waiting calls
+_queue_wait: Dict[tuple, list] = defaultdict(lambda: [0, 0.0])  # (model, priority) -> [count, seconds]
+_retries: Dict[tuple, int] = defaultdict(int)  # (model, reason) -> retries
+_hedges: Dict[tuple, list] = defaultdict(lambda: [0, 0.0])  # (model, outcome) -> [count, seconds]
+_server = None
+
+def configure(enabled: bool = True, trace_path: Optional[str] = None, prices: Optional[Dict[str, Any]] = None,
+              trace_max_bytes: Optional[int] = DEFAULT_TRACE_MAX_BYTES):
+    """trace_max_bytes caps the trace file (one rolled-over .1 file is kept); None lets it grow."""
+    global _enabled, _trace_path, _trace_file, _trace_max_bytes
+    with _trace_lock:
+        if trace_path != _trace_path:
+            # Pending records belong to the old file
+            _flush_trace_locked()
+            if _trace_file is not None:
+                _trace_file.close()
+                _trace_file = None
+        _trace_path = trace_path
+        _trace_max_bytes = trace_max_bytes
+    with _lock:
+        _enabled = bool(enabled)
+        if prices:
+            _prices.update({m: tuple(p) for m, p in prices.items()})
+
+def _configure_from_settings():
+    try:
+        from config.settings import get_config
+        cfg = (get_config() or {}).get("metrics", {}) or {}
+    except Exception:
+        cfg = {}
+    configure(cfg.get("enabled", False), cfg.get("trace_path"), cfg.get("prices"),
+              cfg.get("trace_max_bytes", DEFAULT_TRACE_MAX_BYTES))
+
+def enabled() -> bool:
+    if _enabled is None:
+        _configure_from_settings()
+    return _enabled
+
+def bind_session(session_id: Optional[str]):
+    """Attributes subsequent spans and LLM calls in this context to session_id."""
+    _session_id.set(session_id)
+
+@contextlib.contextmanager
+def session_context(session_id: Optional[str]):
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+def _session(sid: str) -> dict:
+    s = _sessions.get(sid)
+    if s is None:
+        s = _sessions[sid] = {"phases": defaultdict(lambda: [0, 0.0]),
+                              "llm": {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}}
+        while len(_sessions) > MAX_TRACKED_SESSIONS:
+            _sessions.popitem(last=False)
+    else:
+        _sessions.move_to_end(sid)
+    return s
+
+def _write_trace(record: dict):
+    """Buffers one trace record; call without holding _lock."""
+    if not _trace_path:
+        return
+    line = json.dumps(record, ensure_ascii=False) + '\n'
+    with _trace_lock:
+        _trace_buffer.append(line)
+        if (len(_trace_buffer) >= TRACE_FLUSH_LINES
+                or time.monotonic() - _trace_flushed >= TRACE_FLUSH_SECONDS):
+            _flush_trace_locked()
+
+def flush_trace():
+    """Writes buffered trace records to the trace file (also run at exit)."""
+    with _trace_lock:
+        _flush_trace_locked()
+
+def _flush_trace_locked():
+    global _trace_file, _trace_flushed
+    _trace_flushed = time.monotonic()
+    if not _trace_buffer:
+        return
+    if not _trace_path:
+        _trace_buffer.clear()
+        return
+    if _trace_file is None:
+        _trace_file = open(_trace_path, 'a', encoding='utf-8')
+    _trace_file.write("".join(_trace_buffer))
+    _trace_buffer.clear()
+    _trace_file.flush()
+    if _trace_max_bytes and _trace_file.tell() >= _trace_max_bytes:
+        # Keep one previous file; the next record starts a fresh one
+        _trace_file.close()
+        _trace_file = None
+        try:
+            os.replace(_trace_path, _trace_path + ".1")
+        except OSError:
+            pass  # e.g. held open elsewhere on Windows: keep appending, retry on the next flush
+
+atexit.register(flush_trace)
+
+class _Span:
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        sid = _session_id.get()
+        with _lock:
+            total = _phase_totals[self.name]
+            total[0] += 1
+            total[1] += duration
+            if sid is not None:
+                phase = _session(sid)["phases"][self.name]
+                phase[0] += 1
+                phase[1] += duration
+        _write_trace({"type": "span", "ts": time.time(), "name": self.name, "duration_s": round(duration, 6),
+                      "session_id": sid, "error": exc_type.__name__ if exc_type else None, **self.attrs})
+        return False
+
+def span(name: str, **attrs):
+    """Times a block as phase `name`."""
+    if not (_enabled if _enabled is not None else enabled()):
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price = _prices.get(model)
+    if price is None:
+        # e.g. dated snapshots like "gpt-4o-2024-08-06": use the longest matching family
+        matches = [m for m in _prices if model.startswith(m)]
+        price = _prices[max(matches, key=len)] if matches else (0.0, 0.0)
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1e6
+
+def record_llm_call(model: str, prompt_tokens: int, completion_tokens: int,
+                    latency_s: float = 0.0, cached: bool = False):
+    if not (_enabled if _enabled is not None else enabled()):
+        return
+    cost = 0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens)
+    sid = _session_id.get()
+    with _lock:
+        t = _llm_totals[(model, cached)]
+        t[0] += 1
+        t[1] += prompt_tokens
+        t[2] += completion_tokens
+        t[3] += cost
+        if sid is not None:
+            s = _session(sid)["llm"]
+            s["calls"] += 1
+            s["prompt_tokens"] += prompt_tokens
+            s["completion_tokens"] += completion_tokens
+            s["cost_usd"] += cost
+    _write_trace({"type": "llm", "ts": time.time(), "model": model, "prompt_tokens": prompt_tokens,
+                  "completion_tokens": completion_tokens, "cost_usd": round(cost, 6),
+                  "latency_s": round(latency_s, 6), "cached": cached, "session_id": sid})
+
+# --- Rate limiter queue (see core.ratelimit) ---
+def record_queue_depth(model: str, priority: str, depth: int):
+    if not (_enabled if _enabled is not None else enabled()):
+        return
+    with _lock:
+        _queue_depth[(model, priority)] = depth
+
+def record_queue_wait(model: str, priority: str, seconds: float):
+    if not (_enabled if _enabled is not None else enabled()):
+        return
+    with _lock:
+        w = _queue_wait[(model, priority)]
+        w[0] += 1
+        w[1] += seconds
+
+def record_retry(model: str, reason: str):
+    if not (_enabled if _enabled is not None else enabled()):
+        return
+    with _lock:
+        _retries[(model, reason)] += 1
+    _write_trace({"type": "retry", "ts": time.time(), "model": model, "reason": reason,
+                  "session_id": _session_id.get()})
+
+def record_hedge(model: str, outcome: str, latency_s: float):
+    """outcome: "unhedged", "primary" / "hedge" (winner of a hedged race) or "failed"."""
+    if not (_enabled if _enabled is not None else enabled()):
+        return
+    with _lock:
+        h = _hedges[(model, outcome)]
+        h[0] += 1
+        h[1] += latency_s
+
+def session_breakdown(session_id: str) -> Dict[str, Any]:
+    """Per-phase latency and LLM token/cost totals for one session."""
+    with _lock:
+        s = _sessions.get(session_id)
+        if s is None:
+            return {"phases": {}, "llm": {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}}
+        return {
+            "phases": {k: {"count": v[0], "seconds": round(v[1], 4)} for k, v in s["phases"].items()},
+            "llm": dict(s["llm"], cost_usd=round(s["llm"]["cost_usd"], 6)),
+        }
+
+def render_prometheus() -> str:
+    """Current totals in the Prometheus text exposition format."""
+    lines = [
+        "# HELP prompt_optimizer_phase_seconds Time spent per pipeline phase.",
+        "# TYPE prompt_optimizer_phase_seconds summary",
+    ]
+    with _lock:
+        for name, (count, seconds) in sorted(_phase_totals.items()):
+            lines.append(f'prompt_optimizer_phase_seconds_sum{{phase="{name}"}} {seconds:.6f}')
+            lines.append(f'prompt_optimizer_phase_seconds_count{{phase="{name}"}} {count}')
+        llm = sorted(_llm_totals.items())
+        depth = sorted(_queue_depth.items())
+        waits = sorted(_queue_wait.items())
+        retries = sorted(_retries.items())
+        hedges = sorted(_hedges.items())
+    lines += ["# HELP prompt_optimizer_llm_calls_total LLM calls, including cache hits.",
+              "# TYPE prompt_optimizer_llm_calls_total counter"]
+    lines += [f'prompt_optimizer_llm_calls_total{{model="{m}",cached="{str(c).lower()}"}} {t[0]}' for (m, c), t in llm]
+    lines += ["# HELP prompt_optimizer_llm_tokens_total LLM tokens by direction.",
+              "# TYPE prompt_optimizer_llm_tokens_total counter"]
+    for (m, c), t in llm:
+        lines.append(f'prompt_optimizer_llm_tokens_total{{model="{m}",cached="{str(c).lower()}",kind="prompt"}} {t[1]}')
+        lines.append(f'prompt_optimizer_llm_tokens_total{{model="{m}",cached="{str(c).lower()}",kind="completion"}} {t[2]}')
+    lines += ["# HELP prompt_optimizer_llm_cost_usd_total Estimated LLM spend.",
+              "# TYPE prompt_optimizer_llm_cost_usd_total counter"]
+    lines += [f'prompt_optimizer_llm_cost_usd_total{{model="{m}"}} {t[3]:.6f}' for (m, c), t in llm if not c]
+    lines += ["# HELP prompt_optimizer_llm_queue_depth LLM calls waiting for rate-limit capacity.",
+              "# TYPE prompt_optimizer_llm_queue_depth gauge"]
+    lines += [f'prompt_optimizer_llm_queue_depth{{model="{m}",priority="{p}"}} {n}' for (m, p), n in depth]
+    lines += ["# HELP prompt_optimizer_llm_queue_wait_seconds Time LLM calls spent queued by the rate limiter.",
+              "# TYPE prompt_optimizer_llm_queue_wait_seconds summary"]
+    for (m, p), (count, seconds) in waits:
+        lines.append(f'prompt_optimizer_llm_queue_wait_seconds_sum{{model="{m}",priority="{p}"}} {seconds:.6f}')
+        lines.append(f'prompt_optimizer_llm_queue_wait_seconds_count{{model="{m}",priority="{p}"}} {count}')
+    lines += ["# HELP prompt_optimizer_llm_retries_total LLM calls retried after a retryable error.",
+              "# TYPE prompt_optimizer_llm_retries_total counter"]
+    lines += [f'prompt_optimizer_llm_retries_total{{model="{m}",reason="{r}"}} {n}' for (m, r), n in retries]
+    lines += ["# HELP prompt_optimizer_hedged_seconds Latency of hedge-eligible requests by outcome.",
+              "# TYPE prompt_optimizer_hedged_seconds summary"]
+    for (m, o), (count, seconds) in hedges:
+        lines.append(f'prompt_optimizer_hedged_seconds_sum{{model="{m}",outcome="{o}"}} {seconds:.6f}')
+        lines.append(f'prompt_optimizer_hedged_seconds_count{{model="{m}",outcome="{o}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serves render_prometheus() at http://host:port/metrics (once per process)."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -1,9 +1,12 @@
+import io
+import re
+import asyncio
 import datetime
-from typing import Any, Dict, List
-from core.utils import estimate_token_count
-from llama_index.core import Settings
-from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypedDict, Union
+from core.utils import estimate_token_counts, DEFAULT_TOKEN_MODEL
+from core.llm import complete_text, acomplete_text, stream_text, get_llm, run_sync
+from core.metrics import span
+from core import hedge as hedging
 
 # --- 4-D PHASES ---
 
@@ -13,115 +16,235 @@ def run_4d_pipeline(
     constraints: dict,
     openai_api_key: str
 ) -> Dict[str, Any]:
+    analyzer = PromptAnalyzer(prompt)
     # Deconstruct
-    deconstruct = {
-        "intent": _extract_intent(prompt),
-        "entities": _extract_entities(prompt),
-        "context": _extract_context(prompt),
-        "output_specs": _extract_output_specs(prompt),
-        "constraints": constraints,
-        "missing": _detect_missing(prompt, constraints)
-    }
+    with span("deconstruct"):
+        deconstruct = analyzer.deconstruct(constraints)
     # Diagnose
-    diagnose = {
-        "issues": _diagnose_issues(prompt, deconstruct)
-    }
+    with span("diagnose"):
+        diagnose = analyzer.diagnose(deconstruct)
     # Deliver placeholder (filled later)
     return {
         "deconstruct": deconstruct,
         "diagnose": diagnose,
     }
 
-# --- Deconstruct Subfunctions (Simple rule-based; LLM can be swapped in v1.1) ---
-def _extract_intent(prompt: str) -> str:
-    return prompt.split("\n")[0][:128].strip() if prompt else ""
-
-def _extract_entities(prompt: str) -> List[str]:
-    # Naive: noun-chunk split
-    import re
-    return list(set([w.lower() for w in re.findall(r'\b([A-Z][a-z]+)\b', prompt)]))
-
-def _extract_context(prompt: str) -> str:
-    for key in ["background", "context", "situation"]:
-        idx = prompt.lower().find(key)
-        if idx != -1:
-            return prompt[idx:idx+120]
-    return ""
-
-def _extract_output_specs(prompt: str) -> str:
-    for key in ["output", "deliverable", "result"]:
-        idx = prompt.lower().find(key)
-        if idx != -1:
-            return prompt[idx:idx+120]
-    return ""
-
-def _detect_missing(prompt: str, constraints: dict) -> List[str]:
-    miss = []
-    if "audience" not in prompt.lower() and not constraints.get("audience"):
-        miss.append("Target audience")
-    if not constraints.get("word_limit") and "word" not in prompt.lower():
-        miss.append("Word limit")
-    return miss
-
-def _diagnose_issues(prompt: str, deconstruct: dict) -> List[str]:
-    issues = []
-    if len(prompt) < 40:
-        issues.append("Prompt is too short for clarity.")
-    if not deconstruct["entities"]:
-        issues.append("No clear entities detected.")
-    if not deconstruct["context"]:
-        issues.append("No context provided.")
-    if "how" not in prompt.lower() and "what" not in prompt.lower():
-        issues.append("Prompt may lack a clear action or question.")
-    return issues
-import re
-def extract_candidates(content: str):
+def run_4d_pipeline_batch(
+    prompts: List[str],
+    task_types: Union[str, List[str]],
+    constraints: Union[dict, List[dict]],
+    openai_api_key: str = ""
+) -> List[Dict[str, Any]]:
     """
-    Extracts Candidate, Strategy, Prompt, and Rationale sections from the provided content.
-    Returns a list of dicts.
+    Runs Deconstruct/Diagnose over many prompts. `task_types` and `constraints`
+    may be a single value shared by all prompts or one entry per prompt.
+    """
+    n = len(prompts)
+    task_types = [task_types] * n if isinstance(task_types, str) else list(task_types)
+    constraints = [constraints] * n if isinstance(constraints, dict) else list(constraints)
+    return [run_4d_pipeline(p, t, c, openai_api_key) for p, t, c in zip(prompts, task_types, constraints)]
+
+# --- Deconstruct/Diagnose analyzer (Simple rule-based; LLM can be swapped in v1.1) ---
+# Same matches as r'\b([A-Z][a-z]+)\b', but leading with the capital lets the regex engine skip ahead
+_ENTITY_PATTERN = re.compile(r'[A-Z](?<=\b[A-Z])[a-z]+\b')
+CONTEXT_KEYS = ["background", "context", "situation"]
+OUTPUT_SPEC_KEYS = ["output", "deliverable", "result"]
+
+class PromptAnalyzer:
+    """
+    Answers every Deconstruct/Diagnose query from one lowercase view of the
+    prompt, built once, instead of re-lowering the prompt for each check.
+    """
+    __slots__ = ("prompt", "lower")
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.lower = prompt.lower()
+
+    def intent(self) -> str:
+        return self.prompt.split("\n", 1)[0][:128].strip() if self.prompt else ""
+
+    def entities(self) -> List[str]:
+        # Naive: noun-chunk split
+        return list(set([w.lower() for w in _ENTITY_PATTERN.findall(self.prompt)]))
+
+    def _snippet(self, keys: List[str]) -> str:
+        for key in keys:
+            idx = self.lower.find(key)
+            if idx != -1:
+                return self.prompt[idx:idx+120]
+        return ""
+
+    def context(self) -> str:
+        return self._snippet(CONTEXT_KEYS)
+
+    def output_specs(self) -> str:
+        return self._snippet(OUTPUT_SPEC_KEYS)
+
+    def missing(self, constraints: dict) -> List[str]:
+        miss = []
+        if "audience" not in self.lower and not constraints.get("audience"):
+            miss.append("Target audience")
+        if not constraints.get("word_limit") and "word" not in self.lower:
+            miss.append("Word limit")
+        return miss
+
+    def issues(self, deconstruct: dict) -> List[str]:
+        issues = []
+        if len(self.prompt) < 40:
+            issues.append("Prompt is too short for clarity.")
+        if not deconstruct["entities"]:
+            issues.append("No clear entities detected.")
+        if not deconstruct["context"]:
+            issues.append("No context provided.")
+        if "how" not in self.lower and "what" not in self.lower:
+            issues.append("Prompt may lack a clear action or question.")
+        return issues
+
+    def deconstruct(self, constraints: dict) -> Dict[str, Any]:
+        return {
+            "intent": self.intent(),
+            "entities": self.entities(),
+            "context": self.context(),
+            "output_specs": self.output_specs(),
+            "constraints": constraints,
+            "missing": self.missing(constraints)
+        }
+
+    def diagnose(self, deconstruct: dict) -> Dict[str, Any]:
+        return {
+            "issues": self.issues(deconstruct)
+        }
+
+# --- Candidate parsing: single-pass line scanner ---
+class Candidate(TypedDict):
+    candidate: str
+    strategy: str
+    technique: str
+    prompt: str
+    rationale: str
+    token_estimate: int
+
+# "Candidate A:", "**Candidate A:**", "**Candidate A**:", "### Candidate A:"
+_HEADER_LINE = re.compile(r'(?:#{1,6}\s*)?\**\s*Candidate\s+([A-Z]{1,2})\s*(?::\s*\**|\**\s*:)\s*(.*)')
+# "Strategy: ...", "**Prompt:** ...", "- Rationale: ..."
+_FIELD_LINE = re.compile(r'(?:[-*]\s+)?\**\s*(Strategy|Technique|Prompt|Rationale)\s*(?::\s*\**|\**\s*:)\s*(.*)')
+
+def _unquote(text: str) -> str:
+    # One pair of surrounding quotes, as LLMs often quote the prompt; an escaped closing quote is kept
+    text = text.strip()
+    if text.startswith('"'):
+        text = text[1:]
+    if text.endswith('"') and not text.endswith('\\"'):
+        text = text[:-1]
+    return text.strip()
+
+class CandidateScanner:
     """
-    # Pattern matches each Candidate block (A, B, C, etc.)
-    candidate_pattern = re.compile(
-        r"(Candidate [A-Z]:\s*Strategy:.*?)(?=Candidate [A-Z]:|$)", re.DOTALL)
-    strategy_pattern = re.compile(r"Strategy:\s*(.*?)(?:\n|$)", re.DOTALL)
-    prompt_pattern = re.compile(r"Prompt:\s*\"{0,1}(.*?)(?<!\\)\"{0,1}\s*(?:\n|$)", re.DOTALL)
-    rationale_pattern = re.compile(r"Rationale:\s*(.*?)(?=\n(?:Candidate [A-Z]:|$)|$)", re.DOTALL)
-
-    candidates = []
-    for match in candidate_pattern.finditer(content):
-        block = match.group(1)
-        # Extract candidate label (A, B, ...)
-        candidate_label_match = re.match(r"Candidate ([A-Z]):", block)
-        print(candidate_label_match)
-        candidate_label = candidate_label_match.group(1) if candidate_label_match else "?"
-        # Extract strategy, prompt, rationale
-        strategy = strategy_pattern.search(block)
-        prompt = prompt_pattern.search(block)
-        rationale = rationale_pattern.search(block)
-        candidates.append({
-            "candidate": candidate_label,
-            "strategy": strategy.group(1).strip() if strategy else "",
-            "technique": strategy.group(1).strip() if strategy else "",
-            "prompt": prompt.group(1).strip() if prompt else "",
-            "rationale": rationale.group(1).strip() if rationale else "",
-            "token_estimate": estimate_token_count(prompt.group(1).strip()) 
-        })
+    Line-at-a-time state machine over generation output. Only the candidate
+    being read is held in memory, so cost is linear in the output and memory
+    stays flat however many candidates it contains. Lines before a field
+    label (e.g. a bare prompt under "Strategy:") count as the prompt unless
+    an explicit "Prompt:" follows.
+    """
+    def __init__(self):
+        self._label: Optional[str] = None
+        self._field: Optional[str] = None
+        # Field -> segments (one per label line, e.g. two "Prompt:" lines) -> lines
+        self._parts: Dict[str, List[List[str]]] = {}
+
+    def feed_line(self, line: str) -> Optional[Candidate]:
+        """Returns the previous candidate when `line` starts a new one."""
+        line = line.strip()
+        header = _HEADER_LINE.fullmatch(line)
+        if header:
+            done = self._emit()
+            self._label, self._field, self._parts = header.group(1), None, {}
+            if header.group(2):
+                self._read(header.group(2))
+            return done
+        if self._label is not None:
+            self._read(line)
+        return None
+
+    def close(self) -> Optional[Candidate]:
+        done = self._emit()
+        self._label = None
+        return done
+
+    def _read(self, line: str):
+        field = _FIELD_LINE.fullmatch(line)
+        if field:
+            name = field.group(1).lower()
+            name = "strategy" if name == "technique" else name
+            # A repeated label continues the field; an explicit Prompt: still wins over implicit prompt text
+            self._parts.setdefault(name, []).append([field.group(2)] if field.group(2) else [])
+            # Strategy is one line; anything after it is prompt text
+            self._field = "prompt_implicit" if name == "strategy" else name
+        elif self._field is not None and not line.startswith("```"):
+            self._parts.setdefault(self._field, [[]])[-1].append(line)
+
+    def _text(self, name: str, unquote: bool = False) -> str:
+        segments = ["\n".join(lines).strip() for lines in self._parts.get(name, [])]
+        return "\n".join(_unquote(t) if unquote else t for t in segments if t)
+
+    def _emit(self) -> Optional[Candidate]:
+        if self._label is None:
+            return None
+        prompt = self._text("prompt" if "prompt" in self._parts else "prompt_implicit", unquote=True)
+        strategy = self._text("strategy")
+        if not (prompt or strategy):
+            return None
+        return Candidate(candidate=self._label, strategy=strategy, technique=strategy,
+                         prompt=prompt, rationale=self._text("rationale"), token_estimate=0)
+
+def iter_candidates(lines: Iterable[str]) -> Iterator[Candidate]:
+    """Yields candidates from an iterable of lines; token_estimate is left at 0."""
+    scanner = CandidateScanner()
+    for line in lines:
+        done = scanner.feed_line(line)
+        if done:
+            yield done
+    done = scanner.close()
+    if done:
+        yield done
+
+def _with_token_estimates(candidates: List[Candidate], model: str) -> List[Candidate]:
+    # One batched tokenizer call for all candidate prompts
+    for c, n in zip(candidates, estimate_token_counts([c["prompt"] for c in candidates], model)):
+        c["token_estimate"] = n
     return candidates
 
+def extract_candidates(content: str, model: str = DEFAULT_TOKEN_MODEL) -> List[Candidate]:
+    """
+    Extracts Candidate, Strategy, Prompt, and Rationale sections from the provided content.
+    Token estimates use the tokenizer of `model` (the generation model).
+    Returns a list of candidate records in output order.
+    """
+    with span("extract_candidates"):
+        return _with_token_estimates(list(iter_candidates(io.StringIO(content))), model)
+
 # --- Develop: Use LLM to create candidate prompts ---
+GEN_MODEL = "gpt-4o"
+GEN_PARAMS = {"temperature": 0.2, "max_tokens": 600}
+
 def build_candidates(
     deconstruct: dict,
     task_type: str,
     constraints: dict,
-    openai_api_key: str
-) -> List[dict]:
-    # Set up LlamaIndex LLM for generation
-    Settings.llm = OpenAI(model="gpt-4o", api_key=openai_api_key, temperature=0.2, max_tokens=600)
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large", api_key=openai_api_key)
-    system_role = "You are Lyra, a master-level AI prompt engineering specialist."
-    task_prompt = _strategy_prompt(deconstruct, task_type, constraints)
-    res = Settings.llm.complete(system_role + "\n" + task_prompt)
-    print(res.text)
+    openai_api_key: str,
+    use_cache: bool = True,
+    llm=None,
+    hedge: Optional[bool] = None
+) -> List[Candidate]:
+    # Pooled LlamaIndex LLM for generation (or the caller's own instance)
+    llm = llm or get_llm(GEN_MODEL, openai_api_key, **GEN_PARAMS)
+    prompt = _generation_prompt(deconstruct, task_type, constraints)
+    with span("build_candidates"):
+        if hedging.enabled() if hedge is None else hedge:
+            text = _hedged_generation(llm, prompt, openai_api_key, use_cache)
+        else:
+            text = complete_text(llm, prompt, GEN_MODEL, GEN_PARAMS, use_cache=use_cache)
     # LLM response must produce 3 prompts
     # import re
     # # Split into 3 sections by Candidate marker
@@ -137,10 +260,125 @@ def build_candidates(
     #         "token_estimate": estimate_token_count(matches[i]) if i < len(matches) else 0
     #     }
     #     candidates.append(c)
-    candidates = extract_candidates(res.text)
+    candidates = extract_candidates(text, model=GEN_MODEL)
     return candidates
 
-def _strategy_prompt(deconstruct, task_type, constraints):
+def _hedged_generation(llm, prompt: str, openai_api_key: str, use_cache: bool, n_expected: int = 3) -> str:
+    """
+    Races the generation against a delayed duplicate (see core.hedge). A
+    response only wins if it parses into `n_expected` candidates.
+    """
+    cfg = hedging.hedging_settings()
+    fallback = cfg.get("fallback_model") or GEN_MODEL
+    hedge_llm = get_llm(fallback, openai_api_key, **GEN_PARAMS)
+    record = hedging.latency_tracker.record
+    text, _ = run_sync(hedging.race(
+        lambda: acomplete_text(llm, prompt, GEN_MODEL, GEN_PARAMS, use_cache=use_cache,
+                               on_latency=lambda s: record(GEN_MODEL, s)),
+        lambda: acomplete_text(hedge_llm, prompt, fallback, GEN_PARAMS, use_cache=use_cache,
+                               on_latency=lambda s: record(fallback, s)),
+        delay=hedging.hedge_delay(GEN_MODEL, cfg),
+        accept=lambda t: len(list(iter_candidates(io.StringIO(t)))) >= n_expected,
+        model=GEN_MODEL
+    ))
+    return text
+
+# --- Develop (streaming): emit each candidate as soon as its block is complete ---
+class CandidateStreamParser:
+    """
+    Incremental parser for a streamed generation. Complete lines go straight
+    to a CandidateScanner; a candidate is emitted once the next header arrives
+    (or the stream ends), so each delta is scanned only once.
+    """
+    def __init__(self, model: str = GEN_MODEL):
+        self.model = model
+        self._scanner = CandidateScanner()
+        self._tail = ""
+
+    def feed(self, delta: str) -> List[Candidate]:
+        lines = (self._tail + delta).split("\n")
+        self._tail = lines.pop()
+        out = [c for c in map(self._scanner.feed_line, lines) if c]
+        return _with_token_estimates(out, self.model) if out else out
+
+    def close(self) -> List[Candidate]:
+        out = [c for c in (self._scanner.feed_line(self._tail), self._scanner.close()) if c]
+        self._tail = ""
+        return _with_token_estimates(out, self.model) if out else out
+
+def stream_candidates(
+    deconstruct: dict,
+    task_type: str,
+    constraints: dict,
+    openai_api_key: str,
+    use_cache: bool = True,
+    llm=None
+) -> Iterator[Candidate]:
+    """Streaming counterpart of build_candidates: yields candidates as they complete."""
+    llm = llm or get_llm(GEN_MODEL, openai_api_key, **GEN_PARAMS)
+    parser = CandidateStreamParser(GEN_MODEL)
+    with span("build_candidates", streaming=True):
+        for delta in stream_text(llm, _generation_prompt(deconstruct, task_type, constraints),
+                                 GEN_MODEL, GEN_PARAMS, use_cache=use_cache):
+            yield from parser.feed(delta)
+        yield from parser.close()
+
+def _generation_prompt(deconstruct, task_type, constraints):
+    system_role = "You are Lyra, a master-level AI prompt engineering specialist."
+    return system_role + "\n" + _strategy_prompt(deconstruct, task_type, constraints)
+
+# Strategies per task type, in the order candidates are labelled. The first
+# three are the original fixed set; the rest widen the pool for large-N runs.
+STRATEGIES = {
+    "Creative": [
+        "Multi-perspective framing with explicit tone and audience.",
+        "Role assignment plus layered context.",
+        "Constraint-driven (word limit/style) + creativity boost.",
+        "Example-led: one short sample of the desired voice.",
+        "Storytelling hook followed by explicit deliverable spec.",
+        "Audience persona with pain points and desired reaction.",
+        "Contrast framing: what to do and what to avoid.",
+    ],
+    "Technical": [
+        "Constraint-first with acceptance criteria and I/O schema hints.",
+        "Role + explicit input/output format specification.",
+        "Stepwise instruction with edge case handling.",
+        "Test-driven: list the checks the output must pass.",
+        "Interface contract with error handling requirements.",
+        "Minimal reproducible context plus explicit non-goals.",
+        "Review checklist covering correctness, performance and security.",
+    ],
+    "Educational": [
+        "Few-shot outline + rubric + explicit learner level.",
+        "Outcome verbs and Bloom's taxonomy mapping.",
+        "Scenario-based instructional prompt.",
+        "Socratic questioning sequence with checkpoints.",
+        "Misconception-first: address common errors explicitly.",
+        "Worked example followed by graded practice.",
+        "Assessment-aligned: objectives, activity, and evaluation.",
+    ],
+    "Complex": [
+        "Checklist format, explicit steps, and risk notes.",
+        "Assumptions/constraints up front, then deliverable.",
+        "Multi-role with input validation and post-conditions.",
+        "Decompose into sub-tasks with intermediate outputs.",
+        "Decision matrix with explicit criteria and weights.",
+        "Plan-then-execute with a verification pass.",
+        "Stakeholder views reconciled into one deliverable.",
+    ],
+}
+MAX_CANDIDATES = 26  # labels A-Z
+
+def candidate_label(i: int) -> str:
+    return chr(65 + i)
+
+def _strategy_prompt(deconstruct, task_type, constraints, n_candidates=3, offset=0):
+    """
+    Asks for `n_candidates` candidates using strategies[offset:offset+n]
+    of the task type's table (cycled when the pool outgrows the table).
+    """
+    labels = [candidate_label(i) for i in range(n_candidates)]
+    quoted = ", ".join(f'"Candidate {l}"' for l in labels)
     base = f"""
 Given the following intent: "{deconstruct['intent']}"
 Entities: {', '.join(deconstruct['entities'])}
@@ -149,75 +387,62 @@ Output specs: {deconstruct['output_specs']}
 Constraints: {constraints}
 Task type: {task_type}
 
-Produce 3 optimized prompt candidates as below:
-- Label each as "Candidate A", "Candidate B", "Candidate C" without highlighting and numbering.
+Produce {n_candidates} optimized prompt candidates as below:
+- Label each as {quoted} without highlighting and numbering.
 - For each, specify "Strategy", then show the prompt, then a short "Rationale".
 - Max 250 words per candidate.
 - Each must apply a different optimization approach based on the task type:
 """
-    strat = ""
-    if task_type == "Creative":
-        strat = """
-Candidate A:
-Strategy: Multi-perspective framing with explicit tone and audience.
-[Prompt goes here]
-Rationale: ...
-Candidate B:
-Strategy: Role assignment plus layered context.
-[Prompt goes here]
-Rationale: ...
-Candidate C:
-Strategy: Constraint-driven (word limit/style) + creativity boost.
-[Prompt goes here]
-Rationale: ...
-"""
-    elif task_type == "Technical":
-        strat = """
-Candidate A:
-Strategy: Constraint-first with acceptance criteria and I/O schema hints.
-[Prompt goes here]
-Rationale: ...
-Candidate B:
-Strategy: Role + explicit input/output format specification.
-[Prompt goes here]
-Rationale: ...
-Candidate C:
-Strategy: Stepwise instruction with edge case handling.
-[Prompt goes here]
-Rationale: ...
-"""
-    elif task_type == "Educational":
-        strat = """
-Candidate A:
-Strategy: Few-shot outline + rubric + explicit learner level.
-[Prompt goes here]
-Rationale: ...
-Candidate B:
-Strategy: Outcome verbs and Bloom's taxonomy mapping.
-[Prompt goes here]
-Rationale: ...
-Candidate C:
-Strategy: Scenario-based instructional prompt.
-[Prompt goes here]
-Rationale: ...
-"""
-    elif task_type == "Complex":
-        strat = """
-Candidate A:
-Strategy: Checklist format, explicit steps, and risk notes.
-[Prompt goes here]
-Rationale: ...
-Candidate B:
-Strategy: Assumptions/constraints up front, then deliverable.
-[Prompt goes here]
-Rationale: ...
-Candidate C:
-Strategy: Multi-role with input validation and post-conditions.
-[Prompt goes here]
-Rationale: ...
-"""
+    strategies = STRATEGIES.get(task_type)
+    if not strategies:
+        return base
+    strat = "\n"
+    for i, label in enumerate(labels):
+        strat += (f"Candidate {label}:\n"
+                  f"Strategy: {strategies[(offset + i) % len(strategies)]}\n"
+                  "[Prompt goes here]\n"
+                  "Rationale: ...\n")
     return base + strat
 
+# --- Develop (large N): generate a candidate pool over several parallel calls ---
+def build_candidate_pool(
+    deconstruct: dict,
+    task_type: str,
+    constraints: dict,
+    openai_api_key: str,
+    pool_size: int = 12,
+    per_call: int = 3,
+    use_cache: bool = True,
+    llm=None
+) -> List[Candidate]:
+    """
+    Generates `pool_size` candidates (at most MAX_CANDIDATES), `per_call` per
+    request, each request taking the next slice of the strategy table. Requests
+    run concurrently; candidates are relabelled A, B, ... in strategy order.
+    """
+    pool_size = max(1, min(pool_size, MAX_CANDIDATES))
+    per_call = max(1, min(per_call, pool_size))
+    # Room for per_call candidates of up to ~250 words each
+    params = dict(GEN_PARAMS, max_tokens=max(GEN_PARAMS["max_tokens"], 400 * per_call))
+    llm = llm or get_llm(GEN_MODEL, openai_api_key, **params)
+    system_role = "You are Lyra, a master-level AI prompt engineering specialist."
+    sizes = [min(per_call, pool_size - off) for off in range(0, pool_size, per_call)]
+
+    async def _one(offset: int, n: int) -> List[Candidate]:
+        prompt = system_role + "\n" + _strategy_prompt(deconstruct, task_type, constraints, n, offset)
+        text = await acomplete_text(llm, prompt, GEN_MODEL, params, use_cache=use_cache)
+        return extract_candidates(text, model=GEN_MODEL)[:n]
+
+    async def _all():
+        return await asyncio.gather(*[_one(i * per_call, n) for i, n in enumerate(sizes)])
+
+    with span("build_candidate_pool", pool_size=pool_size):
+        batches = run_sync(_all())
+    pool = [c for batch in batches for c in batch]
+    for i, c in enumerate(pool):
+        c["candidate"] = candidate_label(i)
+    return pool
+
 def get_session_snapshot(
     prompt: str,
     deconstruct: dict,
@@ -0,0 +1,293 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+import contextlib
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from core import metrics
+
+T = TypeVar("T")
+
+# --- Process-wide rate limiter and retry scheduler for OpenAI calls ---
+# Every uncached LLM/embedding call reserves one request and its estimated
+# tokens (prompt via tiktoken + max_tokens) from per-model token buckets
+# before it is sent. Waiters are served strictly by (priority, arrival), so
+# interactive Streamlit calls overtake queued batch work. Retryable errors
+# (429, 5xx, timeouts) are retried with full-jitter exponential backoff; a
+# Retry-After hint pauses the whole model queue, not just the failing call.
+# Configured from the `rate_limit` section of settings.yaml.
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 30000
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+                    "TimeoutError", "ConnectTimeout", "ReadTimeout", "RemoteProtocolError"}
+_POLL_S = 0.05  # re-check interval for waiters that are not at the head of the queue
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """LLM calls made in this context (including on the shared loop) use `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    return _priority.get()
+
+class TokenBucket:
+    """`rate_per_min` units per minute, bursting up to one minute's worth."""
+    def __init__(self, rate_per_min: float):
+        self.capacity = float(rate_per_min)
+        self.rate = rate_per_min / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A single request larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+class _Ticket:
+    __slots__ = ("priority", "tokens", "cancelled")
+
+    def __init__(self, priority: int, tokens: int):
+        self.priority = priority
+        self.tokens = tokens
+        self.cancelled = False
+
+class RateLimiter:
+    def __init__(self, name: str, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue: list = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self.retries = 0
+
+    # -- Queue --
+    def _enqueue(self, tokens: int, priority: int) -> _Ticket:
+        ticket = _Ticket(priority, tokens)
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), ticket))
+            self._report_depth()
+        return ticket
+
+    def _cancel(self, ticket: _Ticket):
+        with self._cond:
+            ticket.cancelled = True
+            self._prune()
+            self._report_depth()
+            self._cond.notify_all()
+
+    def _prune(self):
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+
+    def _report_depth(self):
+        depth = {p: 0 for p in PRIORITY_NAMES}
+        for p, _, t in self._queue:
+            if not t.cancelled:
+                depth[p] = depth.get(p, 0) + 1
+        for p, n in depth.items():
+            metrics.record_queue_depth(self.name, PRIORITY_NAMES.get(p, str(p)), n)
+
+    def _try_acquire(self, ticket: _Ticket) -> float:
+        """0 if the ticket got its request + tokens, else seconds to wait before trying again."""
+        with self._cond:
+            self._prune()
+            if not self._queue or self._queue[0][2] is not ticket:
+                return _POLL_S
+            now = time.monotonic()
+            wait = max(self._paused_until - now, self._requests.wait_time(1, now),
+                       self._tokens.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+            self._requests.take(1)
+            self._tokens.take(min(ticket.tokens, self._tokens.capacity))
+            heapq.heappop(self._queue)
+            self._report_depth()
+            self._cond.notify_all()
+            return 0.0
+
+    def acquire(self, tokens: int, priority: Optional[int] = None):
+        """Blocks until one request and `tokens` tokens are available to this caller."""
+        priority = current_priority() if priority is None else priority
+        ticket = self._enqueue(tokens, priority)
+        started = time.perf_counter()
+        try:
+            while True:
+                wait = self._try_acquire(ticket)
+                if wait == 0:
+                    break
+                with self._cond:
+                    self._cond.wait(min(wait, 1.0))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        metrics.record_queue_wait(self.name, PRIORITY_NAMES.get(priority, str(priority)),
+                                  time.perf_counter() - started)
+
+    async def acquire_async(self, tokens: int, priority: Optional[int] = None):
+        priority = current_priority() if priority is None else priority
+        ticket = self._enqueue(tokens, priority)
+        started = time.perf_counter()
+        try:
+            while True:
+                wait = self._try_acquire(ticket)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        metrics.record_queue_wait(self.name, PRIORITY_NAMES.get(priority, str(priority)),
+                                  time.perf_counter() - started)
+
+    def settle(self, reserved: int, used: int):
+        """Returns over-reserved tokens once the real usage is known."""
+        if used < reserved:
+            with self._cond:
+                self._tokens.give(reserved - used)
+                self._cond.notify_all()
+
+    # -- Retries --
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            # The server told us the key is throttled: hold everyone, not just this caller
+            with self._cond:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        self.retries += 1
+        metrics.record_retry(self.name, type(exc).__name__)
+        return delay
+
+    def call(self, fn: Callable[[], T], tokens: int, priority: Optional[int] = None) -> T:
+        """Runs fn() under the limiter, retrying retryable failures."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens, priority)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+        raise AssertionError("unreachable")
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: int, priority: Optional[int] = None) -> T:
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async(tokens, priority)
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            return {"queued": sum(1 for _, _, t in self._queue if not t.cancelled),
+                    "requests_available": round(self._requests.level, 1),
+                    "tokens_available": round(self._tokens.level, 1),
+                    "retries": self.retries}
+
+def _status(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_retryable(exc: BaseException) -> bool:
+    status = _status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return type(exc).__name__ in RETRYABLE_ERRORS or isinstance(exc, (TimeoutError, ConnectionError))
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_config: Optional[Dict[str, Any]] = None
+
+def _settings() -> Dict[str, Any]:
+    global _config
+    if _config is None:
+        try:
+            from config.settings import get_config
+            _config = (get_config() or {}).get("rate_limit", {}) or {}
+        except Exception:
+            _config = {}
+    return _config
+
+def enabled() -> bool:
+    return bool(_settings().get("enabled", False))
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Process-wide limiter per model; rate_limit.models.<model> overrides the defaults."""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                cfg = _settings()
+                limits = dict(cfg, **((cfg.get("models") or {}).get(model) or {}))
+                limiter = _limiters[model] = RateLimiter(
+                    model,
+                    rpm=limits.get("requests_per_minute", DEFAULT_RPM),
+                    tpm=limits.get("tokens_per_minute", DEFAULT_TPM),
+                    max_retries=limits.get("max_retries", 4),
+                    base_delay=limits.get("base_delay", 1.0),
+                    max_delay=limits.get("max_delay", 30.0),
+                )
+    return limiter
+
+def configure(**settings):
+    """Replaces the rate_limit settings (e.g. from a CLI); existing limiters are dropped."""
+    global _config
+    with _limiters_lock:
+        _config = dict(settings)
+        _limiters.clear()
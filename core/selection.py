@@ -0,0 +1,152 @@
+import math
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from core.eval import RUBRIC, evaluate_candidates_batched, calc_heuristics_batch, _batch_judge_prompt
+from core.utils import estimate_token_count
+from core.metrics import span
+
+# --- Large-N selection: cheap heuristic pre-filter, then successive halving ---
+# A big candidate pool is first cut down with calc_heuristics and a prompt
+# token budget (no LLM calls). The survivors are judged in batched groups
+# round by round; each round keeps the best 1/eta by mean judge score, so
+# judge cost grows with log(N) rounds instead of one call per candidate.
+
+JUDGE_OUTPUT_TOKENS = 60  # rough JSON size per candidate in a batched judge reply
+
+def heuristic_score(h: Dict[str, Any]) -> float:
+    """Orders candidates before any judge call; higher is better."""
+    readability = min(max(h["Flesch"], 0.0), 100.0) / 100.0
+    score = (0.4 * h["SpecCoverage"] / 100.0 + 0.2 * h["HasRole"]
+             + 0.2 * h["HasConstraints"] + 0.2 * readability)
+    return score - (0.5 if h["PII_Flag"] else 0.0)
+
+def prefilter_candidates(
+    candidates: List[dict],
+    keep: int,
+    max_prompt_tokens: Optional[int] = None
+) -> List[dict]:
+    """
+    Drops empty, duplicate and over-budget prompts, then keeps the `keep`
+    best by heuristic_score. Returned dicts are copies with "heuristics" and
+    "heuristic_score" added.
+    """
+    seen, viable = set(), []
+    for c in candidates:
+        norm = " ".join(c.get("prompt", "").lower().split())
+        if not norm or norm in seen:
+            continue
+        if max_prompt_tokens and c.get("token_estimate", 0) > max_prompt_tokens:
+            continue
+        seen.add(norm)
+        viable.append(dict(c))
+    for c, h in zip(viable, calc_heuristics_batch([c["prompt"] for c in viable])):
+        c["heuristics"] = h
+        c["heuristic_score"] = round(heuristic_score(h), 4)
+    viable.sort(key=lambda c: c["heuristic_score"], reverse=True)
+    return viable[:max(1, keep)]
+
+def _weighted(scores: Dict[str, int]) -> float:
+    return sum(scores[k] * w for k, w in RUBRIC.items()) / sum(RUBRIC.values())
+
+def _groups(ranked: List[int], group_size: int) -> List[List[int]]:
+    # Deal ranked candidates round-robin so every group spans the field
+    n_groups = math.ceil(len(ranked) / max(1, group_size))
+    return [ranked[g::n_groups] for g in range(n_groups)]
+
+def successive_halving(
+    candidates: List[dict],
+    judge_model: str,
+    openai_api_key: str,
+    final_k: int = 3,
+    eta: int = 2,
+    group_size: int = 4,
+    max_judge_calls: Optional[int] = None,
+    max_judge_tokens: Optional[int] = None,
+    use_cache: bool = True,
+    llm=None
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """
+    Judges candidates in rounds until at most `final_k` remain. A round sends
+    one batched judge request per group of `group_size` survivors, then keeps
+    the top max(final_k, ceil(n/eta)) by mean weighted score across rounds.
+    A round that would exceed `max_judge_calls` or `max_judge_tokens`
+    (estimated with tiktoken) is not started; the current ranking stands.
+    Returns (best candidates first, stats).
+    """
+    n = len(candidates)
+    samples: List[List[float]] = [[] for _ in range(n)]
+    last: List[Optional[dict]] = [None] * n
+    prior = [c.get("heuristic_score", 0.0) for c in candidates]
+
+    def rank(ids: List[int]) -> List[int]:
+        # Unjudged candidates sort below judged ones; heuristics break ties
+        return sorted(ids, key=lambda i: (bool(samples[i]), sum(samples[i]) / len(samples[i]) if samples[i] else 0.0,
+                                          prior[i]), reverse=True)
+
+    survivors = rank(list(range(n)))
+    calls = tokens = rounds = 0
+    exhausted = False
+    with span("successive_halving", n=n):
+        while len(survivors) > final_k:
+            groups = _groups(survivors, group_size)
+            prompts = [_batch_judge_prompt({f"C{j+1}": candidates[i]["prompt"] for j, i in enumerate(g)})
+                       for g in groups]
+            cost = sum(estimate_token_count(p, judge_model) + JUDGE_OUTPUT_TOKENS * len(g)
+                       for p, g in zip(prompts, groups))
+            if ((max_judge_calls is not None and calls + len(groups) > max_judge_calls)
+                    or (max_judge_tokens is not None and tokens + cost > max_judge_tokens)):
+                exhausted = True
+                break
+            # One request per group, in parallel; the seed makes each round a fresh judgment.
+            # No retries: the budget above counts exactly one request per group
+            with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, evaluate_candidates_batched,
+                                       [candidates[i] for i in g], judge_model, openai_api_key,
+                                       max_retries=0, use_cache=use_cache, llm=llm, seed=rounds)
+                           for g in groups]
+                for g, fut in zip(groups, futures):
+                    for i, scores in zip(g, fut.result()):
+                        if "Error" not in scores:
+                            samples[i].append(_weighted(scores))
+                            last[i] = scores
+            calls += len(groups)
+            tokens += cost
+            rounds += 1
+            survivors = rank(survivors)[:max(final_k, math.ceil(len(survivors) / max(2, eta)))]
+
+    ranked = []
+    for i in rank(survivors)[:final_k]:
+        c = dict(candidates[i])
+        c["judge"] = last[i]
+        c["judge_mean"] = round(sum(samples[i]) / len(samples[i]), 3) if samples[i] else None
+        c["judge_rounds"] = len(samples[i])
+        ranked.append(c)
+    stats = {"candidates": n, "rounds": rounds, "judge_calls": calls, "judge_tokens_est": tokens,
+             "budget_exhausted": exhausted}
+    return ranked, stats
+
+def select_candidates(
+    pool: List[dict],
+    judge_model: str,
+    openai_api_key: str,
+    prefilter_keep: int = 8,
+    max_prompt_tokens: Optional[int] = None,
+    final_k: int = 3,
+    eta: int = 2,
+    group_size: int = 4,
+    max_judge_calls: Optional[int] = None,
+    max_judge_tokens: Optional[int] = None,
+    use_cache: bool = True,
+    llm=None
+) -> Tuple[List[dict], Dict[str, Any]]:
+    """Pre-filter + successive halving over a generated pool (see build_candidate_pool)."""
+    shortlisted = prefilter_candidates(pool, prefilter_keep, max_prompt_tokens)
+    ranked, stats = successive_halving(shortlisted, judge_model, openai_api_key, final_k=final_k, eta=eta,
+                                       group_size=group_size, max_judge_calls=max_judge_calls,
+                                       max_judge_tokens=max_judge_tokens, use_cache=use_cache, llm=llm)
+    for i, c in enumerate(ranked):
+        c["pool_label"], c["candidate"] = c.get("candidate"), chr(65 + i)
+    # Per-candidate judging would have cost one call per pooled candidate
+    stats = {"pool": len(pool), "prefiltered": len(shortlisted), **stats, "linear_judge_calls": len(pool)}
+    return ranked, stats
@@ -0,0 +1,273 @@
+"""
+HTTP service mode: the 4D pipeline behind a small REST API.
+
+    python -m core.service --port 8600 --workers 8 --queue-size 64
+
+Endpoints (JSON in, JSON out):
+    POST /v1/analyze   {prompt, task_type, constraints}
+    POST /v1/generate  {prompt | deconstruct, task_type, constraints, use_cache}
+    POST /v1/generate_pool  {prompt | deconstruct, task_type, constraints, use_cache, pool}
+                       (pool: settings.yaml candidate_pool keys, defaulting to that section)
+    POST /v1/evaluate  {candidates, judge_model, mode: "batched" | "per_candidate", use_cache}
+                       (mode defaults to settings.yaml judge_mode)
+    POST /v1/export    {prompt, deconstruct, diagnose, candidates, chosen_idx, constraints, task_type,
+                        session_id?, timestamp?}
+    GET  /v1/stats, /healthz, /metrics
+
+Requests go through a bounded asyncio queue drained by a fixed pool of
+workers. When the queue is full the service answers 503 with Retry-After
+instead of accepting more work. Optional headers: `X-Priority: batch`
+(queue behind interactive callers at the rate limiter) and `X-Session-Id`
+(metrics attribution). Analyze, generate and evaluate keep no state, so
+several instances can serve them behind a load balancer. Export is the
+exception: it writes to this instance's exports dir and history store
+(settings.yaml `history`), which are local files. Sessions exported through
+one instance are not visible to the others; route /v1/export to a single
+instance if the history must stay in one place.
+"""
+import time
+import asyncio
+import argparse
+import contextvars
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional
+from aiohttp import web
+from core.pipeline import run_4d_pipeline, build_candidates, build_candidate_pool, get_session_snapshot
+from core.eval import evaluate_candidates_batched, evaluate_candidates_concurrent, calc_heuristics_batch
+from core.batch import CONSTRAINT_KEYS
+from core.utils import export_prompt
+from core.history import get_history_store
+from core.ratelimit import request_priority, INTERACTIVE, BATCH
+from core import metrics, warmup
+from config.settings import get_config, get_openai_api_key
+
+EXPORTS_DIR = "exports"
+DEFAULT_PORT = 8600
+
+class ServiceBusy(Exception):
+    pass
+
+class JobQueue:
+    """
+    Bounded FIFO of sync jobs run by `workers` worker tasks, each handing its
+    job to a thread of an equally sized pool. Jobs whose caller gave up
+    (timeout or disconnect) before a worker got to them are skipped.
+    """
+    def __init__(self, workers: int = 8, queue_size: int = 64):
+        self.workers = max(1, workers)
+        self.queue: Optional[asyncio.Queue] = None
+        self.queue_size = max(1, queue_size)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                              thread_name_prefix="service-worker")
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable[[], Any]) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            # The caller's context (priority, metrics session) travels with the job
+            self.queue.put_nowait((contextvars.copy_context(), fn, fut))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServiceBusy()
+        return fut
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            ctx, fn, fut = await self.queue.get()
+            try:
+                if fut.cancelled():
+                    continue
+                self.in_flight += 1
+                try:
+                    result = await loop.run_in_executor(self.executor, ctx.run, fn)
+                except Exception as e:
+                    self.failed += 1
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    self.completed += 1
+                    if not fut.done():
+                        fut.set_result(result)
+                finally:
+                    self.in_flight -= 1
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, int]:
+        return {"workers": self.workers, "queue_size": self.queue_size,
+                "queued": self.queue.qsize() if self.queue else 0, "in_flight": self.in_flight,
+                "completed": self.completed, "failed": self.failed, "rejected": self.rejected}
+
+JOBS = web.AppKey("jobs", JobQueue)
+
+# --- Endpoint logic (sync; runs on worker threads) ---
+def _constraints(payload: dict) -> dict:
+    c = payload.get("constraints") or {}
+    return {k: (c.get(k) or None) for k in CONSTRAINT_KEYS}
+
+def analyze(payload: dict, openai_api_key: str) -> dict:
+    return run_4d_pipeline(payload["prompt"], payload.get("task_type") or "Complex",
+                           _constraints(payload), openai_api_key)
+
+def generate(payload: dict, openai_api_key: str) -> dict:
+    deconstruct = payload.get("deconstruct") or analyze(payload, openai_api_key)["deconstruct"]
+    candidates = build_candidates(deconstruct, payload.get("task_type") or "Complex", _constraints(payload),
+                                  openai_api_key, use_cache=payload.get("use_cache", True))
+    return {"deconstruct": deconstruct, "candidates": candidates}
+
+def generate_pool(payload: dict, openai_api_key: str) -> dict:
+    from core.selection import select_candidates
+    pool_cfg = {**((get_config() or {}).get("candidate_pool", {}) or {}), **(payload.get("pool") or {})}
+    deconstruct = payload.get("deconstruct") or analyze(payload, openai_api_key)["deconstruct"]
+    use_cache = payload.get("use_cache", True)
+    pool = build_candidate_pool(deconstruct, payload.get("task_type") or "Complex", _constraints(payload),
+                                openai_api_key, pool_size=pool_cfg.get("size", 20),
+                                per_call=pool_cfg.get("per_call", 4), use_cache=use_cache)
+    candidates, stats = select_candidates(
+        pool, payload.get("judge_model") or "gpt-4o", openai_api_key,
+        prefilter_keep=pool_cfg.get("prefilter_keep", 8),
+        max_prompt_tokens=pool_cfg.get("max_prompt_tokens"),
+        final_k=pool_cfg.get("final_k", 3),
+        eta=pool_cfg.get("eta", 2),
+        group_size=pool_cfg.get("judge_group_size", 4),
+        max_judge_calls=pool_cfg.get("max_judge_calls"),
+        max_judge_tokens=pool_cfg.get("max_judge_tokens"),
+        use_cache=use_cache
+    )
+    return {"deconstruct": deconstruct, "candidates": candidates, "stats": stats}
+
+def evaluate(payload: dict, openai_api_key: str) -> dict:
+    config = get_config() or {}
+    candidates = payload["candidates"]
+    judge_model = payload.get("judge_model") or "gpt-4o"
+    use_cache = payload.get("use_cache", True)
+    if (payload.get("mode") or config.get("judge_mode", "batched")) == "batched":
+        evals = evaluate_candidates_batched(candidates, judge_model, openai_api_key,
+                                            max_retries=config.get("judge_max_retries", 1), use_cache=use_cache)
+    else:
+        evals = evaluate_candidates_concurrent(candidates, judge_model, openai_api_key,
+                                               max_concurrency=config.get("judge_concurrency", 4),
+                                               timeout=config.get("judge_timeout", 60), use_cache=use_cache)
+    return {"evaluations": evals, "heuristics": calc_heuristics_batch([c["prompt"] for c in candidates])}
+
+def export(payload: dict, openai_api_key: str) -> dict:
+    session = get_session_snapshot(
+        prompt=payload["prompt"],
+        deconstruct=payload["deconstruct"],
+        diagnose=payload.get("diagnose") or {"issues": []},
+        candidates=payload["candidates"],
+        chosen_idx=int(payload.get("chosen_idx", 0)),
+        constraints=_constraints(payload),
+        task_type=payload.get("task_type") or "Complex"
+    )
+    if payload.get("session_id"):
+        # Keep the caller's id so its session state and metrics line up with the stored record
+        session.update(session_id=str(payload["session_id"]), timestamp=payload.get("timestamp") or session["timestamp"])
+    md_path, json_path = export_prompt(session, EXPORTS_DIR)
+    with metrics.span("save_session"):
+        get_history_store().append(session)
+    return {"session_id": session["session_id"], "markdown_path": md_path, "json_path": json_path,
+            "session": session}
+
+ENDPOINTS = {"analyze": analyze, "generate": generate, "generate_pool": generate_pool,
+             "evaluate": evaluate, "export": export}
+
+# --- HTTP layer ---
+def create_app(workers: int = 8, queue_size: int = 64, request_timeout: float = 120.0,
+               auth_token: Optional[str] = None, openai_api_key: Optional[str] = None) -> web.Application:
+    jobs = JobQueue(workers, queue_size)
+    openai_api_key = openai_api_key or get_openai_api_key()
+    app = web.Application()
+
+    def _authorized(request: web.Request) -> bool:
+        return not auth_token or request.headers.get("Authorization") == f"Bearer {auth_token}"
+
+    def _handler(name: str, fn: Callable[[dict, str], dict]):
+        async def handle(request: web.Request) -> web.Response:
+            if not _authorized(request):
+                return web.json_response({"error": "Unauthorized"}, status=401)
+            try:
+                payload = await request.json()
+                if not isinstance(payload, dict):
+                    raise ValueError("Body must be a JSON object")
+            except ValueError as e:
+                return web.json_response({"error": f"Invalid JSON body: {e}"}, status=400)
+            priority = BATCH if request.headers.get("X-Priority", "").lower() == "batch" else INTERACTIVE
+            session_id = request.headers.get("X-Session-Id")
+
+            def job():
+                with request_priority(priority), metrics.session_context(session_id), metrics.span(f"service_{name}"):
+                    return fn(payload, openai_api_key)
+
+            started = time.perf_counter()
+            try:
+                fut = jobs.submit(job)
+            except ServiceBusy:
+                return web.json_response({"error": "Server busy, retry later"}, status=503, headers={"Retry-After": "1"})
+            try:
+                result = await asyncio.wait_for(fut, request_timeout)
+            except asyncio.TimeoutError:
+                return web.json_response({"error": f"Timed out after {request_timeout}s"}, status=504)
+            except (KeyError, TypeError, ValueError) as e:
+                return web.json_response({"error": f"Bad request: {type(e).__name__}: {e}"}, status=400)
+            except Exception as e:
+                return web.json_response({"error": f"{type(e).__name__}: {e}"}, status=500)
+            return web.json_response(result, headers={"X-Elapsed-S": f"{time.perf_counter() - started:.3f}"})
+        return handle
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(jobs.stats())
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True})
+
+    async def prometheus(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain")
+
+    async def on_startup(app: web.Application):
+        await jobs.start()
+        warmup.prewarm_from_settings(openai_api_key)
+
+    async def on_cleanup(app: web.Application):
+        await jobs.stop()
+
+    for name, fn in ENDPOINTS.items():
+        app.router.add_post(f"/v1/{name}", _handler(name, fn))
+    app.router.add_get("/v1/stats", stats)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", prometheus)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app[JOBS] = jobs
+    return app
+
+def main(argv: Optional[List[str]] = None):
+    cfg = (get_config() or {}).get("service", {}) or {}
+    ap = argparse.ArgumentParser(description="Serve the 4D prompt optimizer over HTTP.")
+    ap.add_argument("--host", default=cfg.get("host", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=cfg.get("port", DEFAULT_PORT))
+    ap.add_argument("--workers", type=int, default=cfg.get("workers", 8), help="Concurrent pipeline jobs")
+    ap.add_argument("--queue-size", type=int, default=cfg.get("queue_size", 64),
+                    help="Jobs waiting for a worker before requests get 503")
+    ap.add_argument("--request-timeout", type=float, default=cfg.get("request_timeout", 120.0))
+    args = ap.parse_args(argv)
+    app = create_app(args.workers, args.queue_size, args.request_timeout, auth_token=cfg.get("auth_token"))
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
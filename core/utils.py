@@ -1,50 +1,135 @@
 import os
 import json
+import time
 import difflib
-import tiktoken
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, List, Dict, Optional
+from core.heuristics import flesch_reading_ease
+from core.metrics import span
 
-def estimate_token_count(text: str) -> int:
+# --- Token counting ---
+DEFAULT_TOKEN_MODEL = "gpt-4o"
+FALLBACK_ENCODING = "cl100k_base"
+TOKEN_COUNT_CACHE_SIZE = 4096
+
+ENCODER_RETRY_S = 300.0  # after a failed load (e.g. BPE download offline), count by words for a while
+
+_encoders: Dict[str, Any] = {}
+_encoder_failures: Dict[str, float] = {}
+_encoders_lock = threading.Lock()
+_token_counts: "OrderedDict[tuple, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def get_encoder(model: str = DEFAULT_TOKEN_MODEL):
+    """Lazily built, process-wide tiktoken encoder per model name."""
+    enc = _encoders.get(model)
+    if enc is None:
+        with _encoders_lock:
+            enc = _encoders.get(model)
+            if enc is None:
+                if time.monotonic() < _encoder_failures.get(model, 0.0):
+                    raise RuntimeError(f"Tokenizer for {model} unavailable")
+                try:
+                    import tiktoken  # ~100 ms of imports: paid on the first count, not at startup
+                    try:
+                        enc = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        # Unknown/new model name: fall back to a general-purpose encoding
+                        enc = tiktoken.get_encoding(FALLBACK_ENCODING)
+                except Exception:
+                    # Don't retry a slow failing load on every count
+                    _encoder_failures[model] = time.monotonic() + ENCODER_RETRY_S
+                    raise
+                _encoders[model] = enc
+    return enc
+
+def _cached_count(text: str, model: str) -> Optional[int]:
+    with _token_counts_lock:
+        count = _token_counts.get((model, text))
+        if count is not None:
+            _token_counts.move_to_end((model, text))
+        return count
+
+def _store_count(text: str, model: str, count: int):
+    with _token_counts_lock:
+        _token_counts[(model, text)] = count
+        _token_counts.move_to_end((model, text))
+        while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+
+def _fallback_count(text: str) -> int:
+    return int(len(text.split()) * 1.5)
+
+def estimate_token_count(text: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+    count = _cached_count(text, model)
+    if count is not None:
+        return count
     try:
-        enc = tiktoken.encoding_for_model("gpt-4")
-        return len(enc.encode(text))
+        count = len(get_encoder(model).encode(text))
     except Exception:
-        return int(len(text.split()) * 1.5)
+        return _fallback_count(text)
+    _store_count(text, model, count)
+    return count
 
-def flesch_reading_ease(text: str) -> float:
-    import re
-    sentences = max(text.count('.'), 1)
-    words = max(len(text.split()), 1)
-    syllables = sum(len(re.findall(r'[aeiouy]+', w.lower())) for w in text.split())
-    return round(206.835 - 1.015*(words/sentences) - 84.6*(syllables/words), 1)
+def estimate_token_counts(texts: Iterable[str], model: str = DEFAULT_TOKEN_MODEL) -> List[int]:
+    """Token counts for many texts; uncached ones are encoded in one batch call."""
+    texts = list(texts)
+    counts: List[Optional[int]] = [_cached_count(t, model) for t in texts]
+    pending = list(dict.fromkeys(t for t, c in zip(texts, counts) if c is None))
+    if pending:
+        try:
+            encoded = get_encoder(model).encode_batch(pending)
+            fresh = {t: len(toks) for t, toks in zip(pending, encoded)}
+            for t, c in fresh.items():
+                _store_count(t, model, c)
+        except Exception:
+            # e.g. special tokens in the text: count one by one with the usual fallback
+            fresh = {t: estimate_token_count(t, model) for t in pending}
+        counts = [c if c is not None else fresh[t] for t, c in zip(texts, counts)]
+    return counts
 
 def inline_diff(a: str, b: str) -> str:
     d = difflib.unified_diff(a.splitlines(), b.splitlines(), lineterm='')
     return '\n'.join(list(d))
 
-def load_history(history_path: str) -> List[Dict]:
-    if not os.path.exists(history_path):
-        return []
-    with open(history_path, 'r', encoding='utf-8') as f:
-        return [json.loads(line) for line in f if line.strip()]
+def load_history(history_path: str, archive_dir: Optional[str] = None) -> Iterator[Dict]:
+    """Streams the history (archived segments first), one session at a time; list() it for random access."""
+    from core.archive import iter_history
+    yield from iter_history(history_path, archive_dir)
 
 def save_session(session: dict, history_path: str):
-    with open(history_path, 'a', encoding='utf-8') as f:
+    with span("save_session"), open(history_path, 'a', encoding='utf-8') as f:
         f.write(json.dumps(session, ensure_ascii=False) + '\n')
 
-def export_prompt(session: dict, exports_dir: str):
-    os.makedirs(exports_dir, exist_ok=True)
-    ts = session.get('timestamp', '').replace(':','').replace(' ','_')
-    md_path = os.path.join(exports_dir, f"{ts}_optimized.md")
-    json_path = os.path.join(exports_dir, f"{ts}_optimized.json")
-    # Write markdown (prompt + scores + metadata)
+def _export_markdown(session: dict) -> str:
     c = session['candidates'][session['chosen_idx']]
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write(f"# Optimized Prompt\n\n{c['prompt']}\n\n## Metadata\n")
-        json.dump(session, f, ensure_ascii=False, indent=2)
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(session, f, ensure_ascii=False, indent=2)
-    return md_path, json_path
+    meta = {
+        "Session": session.get('session_id', ''),
+        "Timestamp": session.get('timestamp', ''),
+        "Task type": session.get('task_type', ''),
+        "Strategy": c.get('strategy', ''),
+        "Token estimate": c.get('token_estimate', ''),
+        "Constraints": ", ".join(f"{k}={v}" for k, v in (session.get('constraints') or {}).items() if v),
+    }
+    lines = [f"# Optimized Prompt\n\n{c['prompt']}\n\n## Metadata\n"]
+    lines += [f"- **{k}:** {v}" for k, v in meta.items() if v not in ('', None)]
+    return "\n".join(lines) + "\n"
+
+def export_prompt(session: dict, exports_dir: str):
+    """Writes <timestamp>_<session_id>_optimized.md (prompt + metadata) and .json (full session)."""
+    with span("export_prompt"):
+        os.makedirs(exports_dir, exist_ok=True)
+        ts = session.get('timestamp', '').replace(':','').replace(' ','_')
+        # Session ids are unique (microsecond resolution); the timestamp alone collides within a second
+        stem = "_".join(p for p in (ts, str(session.get('session_id', ''))) if p)
+        md_path = os.path.join(exports_dir, f"{stem}_optimized.md")
+        json_path = os.path.join(exports_dir, f"{stem}_optimized.json")
+        with open(md_path, 'w', encoding='utf-8') as f:
+            f.write(_export_markdown(session))
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False, separators=(',', ':'))
+        return md_path, json_path
 
 def find_session_by_id(history: List[Dict], sid: str) -> dict:
     for s in history:
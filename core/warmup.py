@@ -0,0 +1,85 @@
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from core.metrics import span
+
+# --- Background prewarm for cold starts ---
+# The first Generate/Evaluate otherwise pays for importing llama_index and
+# the OpenAI client (seconds) plus loading the tiktoken encoding. prewarm()
+# does that work once per process on a daemon thread right after startup, so
+# it overlaps with the user typing. It builds the same pooled clients the
+# pipeline asks for later (same model and params, so same pool key). Failures
+# are recorded, not raised: the real call will retry and surface them.
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+_report: Dict[str, Any] = {"status": "idle", "steps": {}}
+
+def _steps(openai_api_key: str, judge_mode: str, embed_model: Optional[str],
+           embed_dimensions: Optional[int]) -> List[Tuple[str, Any]]:
+    def tokenizer():
+        from core.utils import get_encoder, DEFAULT_TOKEN_MODEL
+        get_encoder(DEFAULT_TOKEN_MODEL).encode("warm up")
+
+    def generation_client():
+        from core.llm import get_llm
+        from core.pipeline import GEN_MODEL, GEN_PARAMS
+        get_llm(GEN_MODEL, openai_api_key, **GEN_PARAMS)
+
+    def judge_client():
+        from core.llm import get_llm
+        from core.eval import JUDGE_PARAMS, BATCH_JUDGE_PARAMS
+        get_llm("gpt-4o", openai_api_key, **(BATCH_JUDGE_PARAMS if judge_mode == "batched" else JUDGE_PARAMS))
+
+    def embedding_client():
+        from core.llm import get_embed_model
+        get_embed_model(embed_model, openai_api_key, **({"dimensions": embed_dimensions} if embed_dimensions else {}))
+
+    steps = [("tokenizer", tokenizer), ("generation_client", generation_client), ("judge_client", judge_client)]
+    if embed_model:
+        steps.append(("embedding_client", embedding_client))
+    return steps
+
+def _run(steps: List[Tuple[str, Any]]):
+    started = time.perf_counter()
+    for name, fn in steps:
+        t0 = time.perf_counter()
+        try:
+            with span(f"prewarm_{name}"):
+                fn()
+            _report["steps"][name] = {"seconds": round(time.perf_counter() - t0, 3)}
+        except Exception as e:
+            _report["steps"][name] = {"seconds": round(time.perf_counter() - t0, 3), "error": f"{type(e).__name__}: {e}"}
+    _report.update(status="done", seconds=round(time.perf_counter() - started, 3))
+
+def prewarm(openai_api_key: str, judge_mode: str = "batched", embed_model: Optional[str] = None,
+            embed_dimensions: Optional[int] = None, background: bool = True) -> Optional[threading.Thread]:
+    """Starts the process-wide prewarm once; later calls are no-ops. Returns the thread (None if run inline)."""
+    global _thread
+    with _lock:
+        if _report["status"] != "idle":
+            return _thread
+        _report["status"] = "running"
+    steps = _steps(openai_api_key, judge_mode, embed_model, embed_dimensions)
+    if not background:
+        _run(steps)
+        return None
+    _thread = threading.Thread(target=_run, args=(steps,), name="prewarm", daemon=True)
+    _thread.start()
+    return _thread
+
+def prewarm_report() -> Dict[str, Any]:
+    """{"status": idle|running|done, "seconds": total, "steps": {name: {"seconds", "error"?}}}"""
+    return {**_report, "steps": dict(_report["steps"])}
+
+def prewarm_from_settings(openai_api_key: str, config: Optional[dict] = None) -> Optional[threading.Thread]:
+    """Prewarms as configured in the `startup` section of settings.yaml."""
+    if config is None:
+        from config.settings import get_config
+        config = get_config() or {}
+    startup = config.get("startup", {}) or {}
+    if not startup.get("prewarm", False):
+        return None
+    embed_cfg = config.get("embeddings", {}) or {}
+    embed_model = embed_cfg.get("model", "text-embedding-3-large") if embed_cfg.get("enabled") else None
+    return prewarm(openai_api_key, config.get("judge_mode", "batched"), embed_model, embed_cfg.get("dimensions"))
@@ -0,0 +1,65 @@
+import json
+import pytest
+from benchmarks.fake_llm import use_fake_llm
+from core.batch import read_rows, run_batch, completed_ids
+
+LINES = [
+    '{"id": "ok", "prompt": "Write a launch email", "word_limit": "120.0"}',
+    '{"id": "broken", "prompt": ',
+    '{"id": "bad-limit", "prompt": "Summarize", "constraints": {"word_limit": "about 100"}}',
+    '["not", "an", "object"]',
+    '{"prompt": "Draft a tweet", "constraints": "{\\"tone\\": \\"playful\\"}"}',
+    '{"id": "inf-limit", "prompt": "Summarize", "word_limit": "inf"}',
+]
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "in.jsonl"
+    path.write_text("\n".join(LINES) + "\n", encoding="utf-8")
+    return path
+
+def test_read_rows_reports_bad_lines(input_path):
+    rows = list(read_rows(str(input_path)))
+    assert [r["id"] for r in rows] == ["ok", "1", "bad-limit", "3", "4", "inf-limit"]
+    assert rows[0]["constraints"]["word_limit"] == 120
+    assert rows[4]["constraints"]["tone"] == "playful"
+    assert [bool(r.get("error")) for r in rows] == [False, True, True, True, False, True]
+    assert "OverflowError" in rows[5]["error"]
+    assert rows[1]["error"].startswith("Invalid input row: JSONDecodeError")
+
+def test_read_rows_csv(tmp_path):
+    path = tmp_path / "in.csv"
+    path.write_text("id,prompt,word_limit,tone\na,Write a poem,80.0,calm\nb,Write a haiku,lots,\n", encoding="utf-8")
+    rows = list(read_rows(str(path)))
+    assert rows[0]["constraints"]["word_limit"] == 80 and rows[0]["constraints"]["tone"] == "calm"
+    assert rows[1] == {"id": "b", "error": rows[1]["error"]} and "ValueError" in rows[1]["error"]
+
+def test_run_batch_writes_error_rows_and_continues(input_path, tmp_path):
+    output = tmp_path / "out.jsonl"
+    with use_fake_llm(latency=0.0, n_candidates=3):
+        stats = run_batch(str(input_path), str(output), concurrency=2, heuristic_workers=1,
+                          openai_api_key="fake-key", judge_mode="batched")
+    assert stats == {"done": 2, "failed": 4, "skipped": 0}
+    records = {r["id"]: r for r in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert set(records) == {"ok", "1", "bad-limit", "3", "4", "inf-limit"}
+    assert len(records["ok"]["evaluations"]) == len(records["ok"]["candidates"]) == 3
+    assert records["ok"]["best_idx"] is not None
+    # Error rows are not checkpointed: a re-run retries them and skips the rest
+    assert completed_ids(str(output)) == {"ok", "4"}
+
+def test_completed_ids_skips_malformed_lines(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"id": "a"}\n[1, 2]\n"text"\n{"prompt": "no id"}\n{"id": 7}\n{"id": "b", "error": "x"}\n{"id": "c"',
+                      encoding="utf-8")
+    assert completed_ids(str(output)) == {"a", "7"}
+
+def test_resume_does_not_duplicate_error_rows(input_path, tmp_path):
+    output = tmp_path / "out.jsonl"
+    with use_fake_llm(latency=0.0, n_candidates=3):
+        run_batch(str(input_path), str(output), concurrency=2, heuristic_workers=1,
+                  openai_api_key="fake-key", judge_mode="batched")
+        first = output.read_text(encoding="utf-8")
+        stats = run_batch(str(input_path), str(output), concurrency=2, heuristic_workers=1,
+                          openai_api_key="fake-key", judge_mode="batched")
+    assert stats == {"done": 0, "failed": 4, "skipped": 2}
+    assert output.read_text(encoding="utf-8") == first
@@ -0,0 +1,55 @@
+import pytest
+from core.cache import ResponseCache
+
+PARAMS = {"temperature": 0.2, "max_tokens": 600}
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(path=str(tmp_path / "cache.sqlite"), max_entries=3)
+
+def test_key_is_stable_and_ignores_param_order():
+    key = ResponseCache.make_key("gpt-4o", PARAMS, "Write an email")
+    assert key == ResponseCache.make_key("gpt-4o", {"max_tokens": 600, "temperature": 0.2}, "Write an email")
+    assert len(key) == 64 and set(key) <= set("0123456789abcdef")
+
+@pytest.mark.parametrize("model, params, prompt", [
+    ("gpt-4o-mini", PARAMS, "Write an email"),
+    ("gpt-4o", dict(PARAMS, temperature=0.7), "Write an email"),
+    ("gpt-4o", dict(PARAMS, response_format={"type": "json_object"}), "Write an email"),
+    ("gpt-4o", PARAMS, "Write an email "),
+])
+def test_key_changes_with_model_params_and_prompt(model, params, prompt):
+    assert ResponseCache.make_key(model, params, prompt) != ResponseCache.make_key("gpt-4o", PARAMS, "Write an email")
+
+def test_round_trip_and_stats(cache):
+    key = cache.make_key("gpt-4o", PARAMS, "p")
+    assert cache.get(key) is None
+    cache.set(key, "Candidate A: ü")
+    assert cache.get(key) == "Candidate A: ü"
+    assert cache.stats() == dict(cache.stats(), hits=1, misses=1, hit_rate=0.5)
+
+def test_expired_entries_are_misses(cache):
+    cache.ttl_seconds = -1
+    cache.set("k", "v")
+    assert cache.get("k") is None
+
+def test_least_recently_used_is_evicted(cache):
+    for k in ("a", "b", "c"):
+        cache.set(k, k)
+    cache.get("a")  # touch: "b" is now the oldest
+    cache.set("d", "d")
+    assert [cache.get(k) for k in "abcd"] == ["a", None, "c", "d"]
+    assert cache.evictions == 1
+
+def test_size_limit(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), max_entries=None, max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "123456")
+    assert cache.get("a") is None and cache.get("b") == "123456"
+
+def test_disabled_cache_stores_nothing(cache):
+    cache.enabled = False
+    cache.set("k", "v")
+    assert cache.get("k") is None
+    cache.enabled = True
+    assert cache.get("k") is None
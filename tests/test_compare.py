@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from core.compare import word_diff, render_word_diff, similarity_matrix, redundant_pairs, session_candidates
+
+def test_word_diff_segments_and_counts():
+    diff = word_diff("Write a short launch email.", "Write a warm launch email for customers.")
+    assert diff["segments"] == [("equal", "Write a "), ("delete", "short"), ("insert", "warm"),
+                                ("equal", " launch email"), ("insert", " for customers"), ("equal", ".")]
+    assert (diff["inserted"], diff["deleted"]) == (3, 1)
+    assert 0.0 < diff["ratio"] < 1.0
+
+def test_word_diff_of_identical_text():
+    diff = word_diff("Same text.", "Same text.")
+    assert diff == {"segments": [("equal", "Same text.")], "ratio": 1.0, "inserted": 0, "deleted": 0}
+    assert word_diff("", "") == {"segments": [], "ratio": 1.0, "inserted": 0, "deleted": 0}
+
+def test_render_escapes_markdown_and_marks_changes():
+    rendered = render_word_diff(word_diff("Use *bold* [links](x)", "Use _italic_ [links](x)\nnow"))
+    assert rendered.startswith("Use ")
+    assert ":red[~~\\*bold\\*~~]" in rendered and ":green[**\\_italic\\_**]" in rendered
+    assert "\\[links\\]\\(x\\)" in rendered
+    assert rendered.endswith("\\(x\\)  \n:green[**now**]")  # the line break stays outside the markup
+    assert render_word_diff(word_diff("a b c", "a x y c")) == "a :red[~~b~~]:green[**x y**] c"
+
+def test_similarity_matrix():
+    m = similarity_matrix(["Write a launch email", "write a LAUNCH email!", "Plan a trip", ""])
+    assert m.shape == (4, 4) and m.dtype == np.float32
+    assert m[0, 1] == pytest.approx(1.0) and m[0, 0] == pytest.approx(1.0)
+    assert 0.0 < m[0, 2] < 1.0
+    assert np.allclose(m, m.T)
+    # An empty text has no words: a zero row, not NaN
+    assert not m[3].any() and not np.isnan(m).any()
+    assert similarity_matrix([]).shape == (0, 0)
+
+def test_redundant_pairs_most_similar_first():
+    labels = ["A", "B", "C"]
+    matrix = np.array([[1.0, 0.9, 0.86], [0.9, 1.0, 0.2], [0.86, 0.2, 1.0]], dtype=np.float32)
+    assert redundant_pairs(labels, matrix) == [("A", "B", 0.9), ("A", "C", 0.86)]
+    assert redundant_pairs(labels, matrix, threshold=0.95) == []
+
+def test_session_candidates_labels_are_unique():
+    sessions = [{"session_id": 1, "timestamp": "t", "candidates": [{"candidate": "A", "prompt": "p1"}, {"prompt": "p2"}]},
+                {"session_id": 2, "timestamp": "t", "candidates": [{"candidate": "A", "prompt": "p3"}]}]
+    labels = [c["label"] for c in session_candidates(sessions)]
+    assert labels == ["t A", "t B", "t A (2)"]
+    assert len(session_candidates(sessions, max_candidates=2)) == 2
@@ -0,0 +1,62 @@
+import pytest
+from core.compress import compress_prompt, target_tokens, PRIORITY_RATIOS
+
+CODE = "```python\ndef total(xs):\n    if not xs:\n        return 0\n\n\n\n    return   sum(xs)\n```"
+
+def test_fenced_code_is_untouched():
+    prompt = f"Please   fix this function.\n\n{CODE}\nPlease explain the fix."
+    out = compress_prompt(prompt)["prompt"]
+    assert CODE in out
+    assert out.startswith("Fix this function.") and out.endswith("Explain the fix.")
+
+def test_quoted_text_is_untouched():
+    prompt = 'Reply with "Could you please send the invoice?" and kindly   nothing else. Use `make sure to`.'
+    out = compress_prompt(prompt)["prompt"]
+    assert '"Could you please send the invoice?"' in out and "`make sure to`" in out
+    assert "kindly" not in out and "  " not in out
+
+def test_indentation_kept_and_inline_runs_collapsed():
+    prompt = "Steps:\n  - Read  the\tinput.   \n      - Then   summarize it.\n\n\n\nDone."
+    assert compress_prompt(prompt)["prompt"] == "Steps:\n  - Read the input.\n      - Then summarize it.\n\nDone."
+
+def test_filler_emphasis_and_repeats_are_removed():
+    prompt = ("Could you please write a **short** summary in order to help the team. "
+              "Keep the summary under fifty words. Keep the summary under fifty words.")
+    result = compress_prompt(prompt)
+    assert result["prompt"] == "Write a short summary to help the team. Keep the summary under fifty words."
+    assert result["saved_tokens"] > 0 and result["tokens"] < result["original_tokens"]
+    assert [name for name, _ in result["passes"]] == ["whitespace", "emphasis", "filler", "dedupe", "whitespace"]
+
+@pytest.mark.parametrize("priority, expected", [("Cost", 60), ("Latency", 80), (None, 90), ("Unknown", 90)])
+def test_target_tokens_by_priority(priority, expected):
+    assert target_tokens(100, {"priority": priority}) == expected
+
+def test_target_tokens_custom_ratios_and_floor():
+    assert target_tokens(100, {"priority": "Cost"}, {"Cost": 0.5, None: 1.0}) == 50
+    assert target_tokens(100, {}, {"Cost": 0.5}) == 100
+    assert target_tokens(1, {"priority": "Cost"}, PRIORITY_RATIOS) == 1
+
+def test_met_target():
+    prompt = "Please basically summarize the report in order to brief the board."
+    loose = compress_prompt(prompt, target=1000)
+    assert loose["met_target"] and loose["target_tokens"] == 1000
+    tight = compress_prompt(prompt, target=1)
+    assert not tight["met_target"] and tight["tokens"] > 1
+    assert compress_prompt(prompt)["target_tokens"] == compress_prompt(prompt)["original_tokens"]
+
+class StubLLM:
+    def __init__(self, text):
+        self.text = text
+
+    def complete(self, prompt, **kwargs):
+        return type("Response", (), {"text": self.text, "raw": None})()
+
+def test_llm_rewrite_kept_only_if_shorter(tmp_path, monkeypatch):
+    import core.llm
+    from core.cache import ResponseCache
+    monkeypatch.setattr(core.llm, "get_response_cache", lambda: ResponseCache(path=str(tmp_path / "c.sqlite")))
+    prompt = "Summarize the quarterly report for the board, covering revenue, costs and risks in detail."
+    shorter = compress_prompt(prompt, target=3, llm_rewrite=True, llm=StubLLM('"Summarize report: revenue, costs, risks."'))
+    assert shorter["prompt"] == "Summarize report: revenue, costs, risks." and shorter["passes"][-1][0] == "llm_rewrite"
+    longer = compress_prompt(prompt, target=3, llm_rewrite=True, use_cache=False, llm=StubLLM(prompt + " Also add more."))
+    assert longer["prompt"] == prompt
@@ -0,0 +1,45 @@
+import pytest
+import core.embed_index
+from core.embed_index import EmbeddingIndex, backfill_index, index_is_behind, index_sessions, main
+from core.history import open_history_store
+
+def _session(i: int) -> dict:
+    return {"session_id": f"s{i}", "prompt": f"prompt {i}", "candidates": [{"prompt": f"optimized {i}"}],
+            "chosen_idx": 0}
+
+@pytest.fixture
+def embedded(monkeypatch):
+    texts = []
+
+    def embed_texts(embed_model, batch, model, params):
+        texts.extend(batch)
+        return [[float(len(t)), 1.0, 0.0] for t in batch]
+    monkeypatch.setattr(core.embed_index, "get_embed_model", lambda model, key, **params: None)
+    monkeypatch.setattr(core.embed_index, "embed_texts", embed_texts)
+    return texts
+
+@pytest.fixture
+def store(tmp_path):
+    s = open_history_store({"backend": "jsonl", "jsonl_path": str(tmp_path / "h.jsonl")})
+    for i in range(5):
+        s.append(_session(i))
+    return s
+
+def test_backfill_indexes_only_missing_sessions(tmp_path, store, embedded):
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    index_sessions(index, [_session(0)], "key")
+    assert index_is_behind(index, store)
+    assert backfill_index(index, store, "key", batch_size=2) == 8  # prompt + chosen candidate for s1..s4
+    assert index.session_ids() == {f"s{i}" for i in range(5)}
+    assert not index_is_behind(index, store)
+    assert embedded.count("prompt 0") == 1
+    assert backfill_index(index, store, "key") == 0
+
+def test_backfill_cli(tmp_path, store, embedded, monkeypatch, capsys):
+    index = EmbeddingIndex(str(tmp_path / "index"))
+    monkeypatch.setattr(core.embed_index, "get_embedding_index", lambda: index)
+    monkeypatch.setattr("core.history.get_history_store", lambda: store)
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    main(["--backfill"])
+    assert "Indexed 10 rows" in capsys.readouterr().out
+    assert len(index) == 10
@@ -0,0 +1,52 @@
+import json
+import pytest
+import core.llm
+from core.cache import ResponseCache
+from core.eval import RUBRIC, evaluate_candidates_batched
+
+CANDIDATES = [{"prompt": "Write a launch email."}, {"prompt": "Write a launch email in 80 words."}]
+SCORES = {k: 4 for k in RUBRIC}
+
+class StubLLM:
+    """Returns the queued replies in order and records each prompt."""
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def complete(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": self.replies.pop(0), "raw": None})()
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(core.llm, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(core.llm.ratelimit, "enabled", lambda: False)
+    return cache
+
+def _judge(llm, **kwargs):
+    return evaluate_candidates_batched(CANDIDATES, "gpt-4o", "fake-key", llm=llm, **kwargs)
+
+def test_invalid_reply_is_retried_upstream_and_not_cached(cache):
+    llm = StubLLM(["not json", json.dumps({"C1": SCORES, "C2": SCORES})])
+    results = _judge(llm)
+    assert len(llm.prompts) == 2
+    assert all("Error" not in r and r["Clarity"] == 4 for r in results)
+    # The next Evaluate gets the valid reply from the cache, not the bad one
+    again = StubLLM([])
+    assert _judge(again) == results and again.prompts == []
+
+def test_partial_reply_re_asks_only_missing_labels(cache):
+    llm = StubLLM([json.dumps({"C1": SCORES, "C2": {"Clarity": 9}}), json.dumps({"C2": SCORES})])
+    results = _judge(llm)
+    assert "### C2" in llm.prompts[1] and "### C1" not in llm.prompts[1]
+    assert [r["Clarity"] for r in results] == [4, 4]
+    # The incomplete first reply was not stored: the same request goes upstream again
+    fresh = StubLLM([json.dumps({"C1": SCORES, "C2": SCORES})])
+    assert [r["Clarity"] for r in _judge(fresh)] == [4, 4] and len(fresh.prompts) == 1
+
+def test_exhausted_retries_report_errors(cache):
+    llm = StubLLM(["{}", "{}"])
+    results = _judge(llm, max_retries=1)
+    assert len(llm.prompts) == 2
+    assert all(r == {"Error": "Judge returned no valid scores"} for r in results)
@@ -0,0 +1,70 @@
+import pytest
+from core.graph import PhaseGraph, build_app_graph
+
+def _counting_graph(max_entries=1024):
+    calls = []
+
+    def node(name):
+        def fn(**kwargs):
+            calls.append(name)
+            return {"node": name, **kwargs}
+        return fn
+    graph = (PhaseGraph(max_entries)
+             .add("deconstruct", node("deconstruct"), inputs=["prompt", "constraints"])
+             .add("diagnose", node("diagnose"), inputs=["prompt"], deps=["deconstruct"])
+             .add("heuristics", node("heuristics"), inputs=["candidate_prompts"]))
+    return graph, calls
+
+VALUES = {"prompt": "Write a launch email", "constraints": {"tone": "warm", "word_limit": 120}}
+
+def test_key_depends_on_inputs_and_dependencies_only():
+    graph, _ = _counting_graph()
+    key = graph.key("diagnose", VALUES)
+    # Dict order is not part of the key; unrelated inputs are ignored
+    assert key == graph.key("diagnose", {"prompt": VALUES["prompt"], "candidate_prompts": ["x"],
+                                         "constraints": {"word_limit": 120, "tone": "warm"}})
+    assert key != graph.key("diagnose", dict(VALUES, constraints={"tone": "formal", "word_limit": 120}))
+    assert key != graph.key("deconstruct", VALUES)
+
+def test_unchanged_inputs_are_served_from_the_memo():
+    graph, calls = _counting_graph()
+    first = graph.evaluate("diagnose", **VALUES)
+    assert graph.evaluate("diagnose", **VALUES) is first
+    assert calls == ["deconstruct", "diagnose"]
+    assert graph.stats() == {"hits": 1, "misses": 2, "entries": 2}
+
+def test_changing_constraints_recomputes_deconstruct_and_diagnose():
+    graph, calls = _counting_graph()
+    graph.evaluate("diagnose", **VALUES)
+    graph.evaluate("heuristics", candidate_prompts=["a", "b"])
+    calls.clear()
+    changed = dict(VALUES, constraints={"tone": "formal"})
+    result = graph.evaluate("diagnose", **changed)
+    assert calls == ["deconstruct", "diagnose"]
+    assert result["deconstruct"]["constraints"] == {"tone": "formal"}
+    graph.evaluate("heuristics", candidate_prompts=["a", "b"])
+    assert calls == ["deconstruct", "diagnose"]  # unrelated node still memoized
+
+def test_least_recently_used_entries_are_evicted():
+    graph, calls = _counting_graph(max_entries=2)
+    for prompts in (["a"], ["b"]):
+        graph.evaluate("heuristics", candidate_prompts=prompts)
+    graph.evaluate("heuristics", candidate_prompts=["a"])  # touch: ["b"] is now the oldest
+    graph.evaluate("heuristics", candidate_prompts=["c"])
+    assert graph.stats() == {"hits": 1, "misses": 3, "entries": 2}
+    calls.clear()
+    graph.evaluate("heuristics", candidate_prompts=["a"])
+    graph.evaluate("heuristics", candidate_prompts=["b"])
+    assert calls == ["heuristics"]
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(KeyError):
+        PhaseGraph().add("diagnose", lambda **kw: None, deps=["deconstruct"])
+
+def test_app_graph_phases():
+    graph = build_app_graph()
+    out = graph.evaluate("diagnose", prompt="You are an editor. Fix the Report.", constraints={"word_limit": 50})
+    assert "issues" in out
+    assert graph.evaluate("deconstruct", prompt="You are an editor. Fix the Report.",
+                          constraints={"word_limit": 50})["entities"]
+    assert graph.stats()["hits"] == 1
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+import core.llm
+from core import hedge
+from core.cache import ResponseCache
+from core.llm import acomplete_text, run_sync
+from benchmarks.fake_llm import FakeLLM, use_fake_llm
+
+def _after(seconds: float, value=None, error: Exception = None):
+    async def call():
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+        return value
+    return call
+
+def _race(primary, hedged, delay=0.05, accept=lambda text: text != "bad"):
+    return asyncio.run(hedge.race(primary, hedged, delay, accept, model="test-model"))
+
+def test_fast_primary_is_not_hedged():
+    fired = []
+
+    async def duplicate():
+        fired.append(True)
+        return "hedge"
+    result, info = _race(_after(0.0, "primary"), duplicate)
+    assert result == "primary" and info["winner"] == "primary" and not info["hedged"]
+    assert fired == []
+
+def test_slow_primary_loses_to_the_hedge():
+    result, info = _race(_after(1.0, "primary"), _after(0.0, "hedge"))
+    assert result == "hedge" and info == dict(info, winner="hedge", hedged=True)
+    assert info["latency_s"] < 0.5
+
+def test_rejected_primary_hedges_immediately():
+    result, info = _race(_after(0.0, "bad"), _after(0.0, "hedge"), delay=10.0)
+    assert result == "hedge" and info["hedged"] and info["latency_s"] < 1.0
+
+def test_nothing_accepted_raises_the_primary_error():
+    with pytest.raises(RuntimeError, match="primary down"):
+        _race(_after(0.0, error=RuntimeError("primary down")), _after(0.0, "bad"))
+
+def test_hedge_delay_uses_the_recent_quantile():
+    cfg = {"quantile": 0.5, "min_samples": 3, "default_delay": 9.0, "min_delay": 0.1}
+    tracker, hedge.latency_tracker = hedge.latency_tracker, hedge.LatencyTracker()
+    try:
+        assert hedge.hedge_delay("m", cfg) == 9.0
+        for s in (1.0, 2.0, 3.0):
+            hedge.latency_tracker.record("m", s)
+        assert hedge.hedge_delay("m", cfg) == 2.0
+    finally:
+        hedge.latency_tracker = tracker
+
+def test_only_upstream_calls_report_latency(tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"))
+    latencies = []
+    with use_fake_llm():
+        monkeypatch.setattr(core.llm, "get_response_cache", lambda: cache)
+        llm = FakeLLM(latency=0.05)
+        call = lambda: acomplete_text(llm, "Produce 3 optimized prompt candidates", "gpt-4o", {},
+                                      on_latency=latencies.append)
+        first = run_sync(call())
+        second = run_sync(call())
+    assert first == second and llm.calls == 1
+    # The cache hit must not pull the latency quantile toward zero
+    assert len(latencies) == 1 and latencies[0] >= 0.04
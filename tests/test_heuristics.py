@@ -0,0 +1,53 @@
+import re
+import pytest
+from core.eval import calc_heuristics, calc_heuristics_batch
+from core.pipeline import PromptAnalyzer
+
+def baseline_heuristics(prompt: str):
+    """The calc_heuristics the single-pass engine replaced, kept as the parity reference."""
+    words = prompt.split()
+    syllables = sum(len(re.findall(r'[aeiouy]+', w.lower())) for w in words)
+    flesch = round(206.835 - 1.015 * (max(len(words), 1) / max(prompt.count('.'), 1))
+                   - 84.6 * (syllables / max(len(words), 1)), 1)
+    pii_terms = ["ssn", "passport", "address", "phone", "email", "patient", "dob", "mrn", "social security", "confidential"]
+    required = ["audience", "format", "length", "role"]
+    return dict(Length=len(words), Flesch=flesch, HasRole="You are " in prompt,
+                HasConstraints="must" in prompt or "limit" in prompt,
+                SpecCoverage=round(100.0 * sum(1 for k in required if k in prompt.lower()) / len(required), 1),
+                PII_Flag=any(t in prompt.lower() for t in pii_terms))
+
+def baseline_entities(prompt: str):
+    return sorted(set(w.lower() for w in re.findall(r'\b([A-Z][a-z]+)\b', prompt)))
+
+# Outputs of the original implementations for fixed prompts:
+# prompt -> (Length, Flesch, HasRole, HasConstraints, SpecCoverage, PII_Flag), entities
+BASELINE = {
+    "": ((0, 205.8, False, False, 0.0, False), []),
+    "Write a launch email.": ((4, 75.9, False, False, 0.0, True), ["write"]),
+    "You are a senior editor. Rewrite the draft for a technical audience in Markdown format; "
+    "it must stay under the length limit.": ((22, 57.2, True, True, 75.0, False), ["markdown", "rewrite", "you"]),
+    "Summarize the patient notes for Dr. Smith without the SSN or Phone number. Keep it CONFIDENTIAL.":
+        ((16, 69.2, False, False, 0.0, True), ["dr", "keep", "phone", "smith", "summarize"]),
+    "Plan a trip from Paris to New York for Anna and Bob in McDonald's style, no iPhone talk.":
+        ((18, 75.8, False, False, 0.0, True), ["anna", "bob", "new", "paris", "plan", "york"]),
+    "you are here. Your role: translate   the\ttext\n\ninto French... then stop!":
+        ((12, 76.9, False, False, 25.0, False), ["french", "your"]),
+    "Über café naïve résumé — Écrire un e-mail à Zoë.": ((10, 103.6, False, False, 0.0, False), []),
+    "Limitless ideas: brainstorm 10 taglines, each under 8 words, with no emojis":
+        ((12, 60.7, False, False, 0.0, False), ["limitless"]),
+}
+KEYS = ("Length", "Flesch", "HasRole", "HasConstraints", "SpecCoverage", "PII_Flag")
+PROMPTS = list(BASELINE)
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_heuristics_match_stored_baseline(prompt):
+    expected = dict(zip(KEYS, BASELINE[prompt][0]))
+    assert calc_heuristics(prompt) == expected == baseline_heuristics(prompt)
+
+def test_batch_matches_single_prompt_results():
+    assert calc_heuristics_batch(PROMPTS) == [calc_heuristics(p) for p in PROMPTS]
+    assert calc_heuristics_batch([]) == []
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_entities_match_stored_baseline(prompt):
+    assert sorted(PromptAnalyzer(prompt).entities()) == BASELINE[prompt][1] == baseline_entities(prompt)
@@ -0,0 +1,113 @@
+import os
+import json
+import datetime
+import pytest
+from core.history import open_history_store
+from core.archive import SegmentWriter, rotate_history, list_segments, iter_archived
+from core.utils import load_history
+
+NOW = datetime.datetime.now()
+
+def _session(days_ago: int, i: int) -> dict:
+    t = NOW - datetime.timedelta(days=days_ago, seconds=i)
+    return {"session_id": t.strftime("%Y%m%d%H%M%S%f"), "timestamp": t.strftime("%Y-%m-%d %H:%M:%S"),
+            "prompt": f"prompt {i}", "tags": "email" if i % 2 else "code", "task_type": "Creative",
+            "candidates": [{"candidate": "A", "prompt": f"optimized {i}"}], "chosen_idx": 0,
+            "deconstruct": {"intent": "x"}, "diagnose": {"issues": []}}
+
+SESSIONS = [_session(d, i) for i, d in enumerate([400, 200, 120, 10, 1])]
+
+@pytest.fixture(params=["sqlite", "jsonl"])
+def store(request, tmp_path):
+    cfg = {"backend": request.param, "path": str(tmp_path / "h.sqlite"), "jsonl_path": str(tmp_path / "h.jsonl"),
+           "archive_dir": str(tmp_path / "archive")}
+    s = open_history_store(cfg)
+    for session in SESSIONS:
+        s.append(session)
+    return s
+
+def test_append_get_and_list(store):
+    assert store.count() == len(SESSIONS)
+    assert store.get(SESSIONS[2]["session_id"]) == SESSIONS[2]
+    assert store.get("missing") == {}
+    page = store.list_sessions(limit=2)
+    assert [p["session_id"] for p in page] == [SESSIONS[4]["session_id"], SESSIONS[3]["session_id"]]
+    assert store.count(tag="email") == 2
+
+def test_summaries_follow_appends(store):
+    assert store.count_cached() == len(SESSIONS)
+    extra = _session(0, 99)
+    store.append(extra)
+    assert store.count_cached() == len(SESSIONS) + 1
+    top = store.list_summaries(limit=1)[0]
+    assert top["session_id"] == extra["session_id"] and top["prompt"] == extra["prompt"]
+
+def test_archive_round_trip(store):
+    counts = rotate_history(store, 90, store.archive_dir)
+    assert sum(counts.values()) == 3
+    assert store.count() == 2
+    # Archived sessions stay reachable by id and through the archive reader
+    for session in SESSIONS[:3]:
+        assert store.get(session["session_id"]) == session
+    assert sorted(s["session_id"] for s in iter_archived(store.archive_dir)) == \
+        sorted(s["session_id"] for s in SESSIONS[:3])
+    # Nothing left to move: no new segments
+    before = list_segments(store.archive_dir)
+    rotate_history(store, 90, store.archive_dir)
+    assert list_segments(store.archive_dir) == before
+
+class _FailingWriter(SegmentWriter):
+    def close(self):
+        super().close()
+        raise OSError("disk full")
+
+def test_failed_segment_close_keeps_sessions(store):
+    with pytest.raises(OSError):
+        store.archive("2100-01-01", _FailingWriter(store.archive_dir))
+    assert store.count() == len(SESSIONS)
+    assert all(store.get(s["session_id"]) == s for s in SESSIONS)
+    assert list_segments(store.archive_dir) == []
+
+def test_load_history_streams(tmp_path):
+    path = tmp_path / "h.jsonl"
+    path.write_text("".join(json.dumps(s) + "\n" for s in SESSIONS), encoding="utf-8")
+    loaded = load_history(str(path))
+    assert not isinstance(loaded, list)
+    assert [s["session_id"] for s in loaded] == [s["session_id"] for s in SESSIONS]
+
+def test_jsonl_history_is_imported_once(tmp_path):
+    jsonl = tmp_path / "h.jsonl"
+    jsonl.write_text("".join(json.dumps(s) + "\n" for s in SESSIONS), encoding="utf-8")
+    cfg = {"path": str(tmp_path / "h.sqlite"), "jsonl_path": str(jsonl), "mirror_jsonl": False}
+    store = open_history_store(cfg)
+    assert store.count() == len(SESSIONS)
+    rotate_history(store, 0, str(tmp_path / "archive"))
+    assert store.count() == 0
+    # The empty store must not be refilled from the stale JSONL file
+    assert open_history_store(cfg).count() == 0
+
+@pytest.mark.parametrize("replace", [True, False])
+def test_jsonl_index_follows_rewrites(tmp_path, replace):
+    path = tmp_path / "h.jsonl"
+    store = open_history_store({"backend": "jsonl", "jsonl_path": str(path)})
+    for session in SESSIONS[:2]:
+        store.append(session)
+    assert store.count() == 2
+    # Same size, different content: only the inode (rotation) or mtime (in place) gives it away
+    rewritten = [dict(s, session_id=s["session_id"][::-1]) for s in SESSIONS[:2]]
+    data = "".join(json.dumps(s) + "\n" for s in rewritten)
+    stat = path.stat()
+    if replace:
+        (tmp_path / "new.jsonl").write_text(data, encoding="utf-8")
+        (tmp_path / "new.jsonl").replace(path)
+    else:
+        path.write_text(data, encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert not store.get(SESSIONS[0]["session_id"])
+    assert store.get(rewritten[0]["session_id"]) == rewritten[0]
+    assert {s["session_id"] for s in store.list_summaries()} == {s["session_id"] for s in rewritten}
+
+def test_history_store_is_abstract():
+    from core.history import HistoryStore
+    with pytest.raises(TypeError):
+        HistoryStore()
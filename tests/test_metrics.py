@@ -0,0 +1,100 @@
+import json
+import threading
+import pytest
+from core import metrics
+
+@pytest.fixture
+def trace(tmp_path, monkeypatch):
+    """Metrics on, tracing to a temp file; the previous configuration is restored afterwards."""
+    for name in ("_enabled", "_trace_path", "_trace_max_bytes"):
+        monkeypatch.setattr(metrics, name, getattr(metrics, name))
+    path = tmp_path / "traces.jsonl"
+    metrics.configure(True, str(path))
+    yield path
+    metrics.configure(False, None)
+
+def _records(path):
+    metrics.flush_trace()
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_span_totals_session_and_trace(trace):
+    with metrics.session_context("s-span"):
+        with metrics.span("test_phase", n=3):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.span("test_phase"):
+                raise ValueError("boom")
+    phases = metrics.session_breakdown("s-span")["phases"]
+    assert phases["test_phase"]["count"] == 2
+    spans = [r for r in _records(trace) if r["name"] == "test_phase"]
+    assert [(r["session_id"], r["error"], r.get("n")) for r in spans] == [("s-span", None, 3), ("s-span", "ValueError", None)]
+
+def test_llm_calls_are_costed_and_traced(trace):
+    with metrics.session_context("s-llm"):
+        metrics.record_llm_call("gpt-4o-2024-08-06", 1000, 500, latency_s=0.25)
+        metrics.record_llm_call("gpt-4o", 1000, 500, cached=True)
+    llm = metrics.session_breakdown("s-llm")["llm"]
+    assert llm == {"calls": 2, "prompt_tokens": 2000, "completion_tokens": 1000, "cost_usd": 0.0075}
+    calls = [r for r in _records(trace) if r["type"] == "llm" and r["session_id"] == "s-llm"]
+    assert [(r["cost_usd"], r["cached"]) for r in calls] == [(0.0075, False), (0.0, True)]
+
+def test_trace_records_are_buffered_until_flushed(trace, monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_FLUSH_SECONDS", 3600.0)
+    metrics.flush_trace()
+    before = trace.read_text(encoding="utf-8") if trace.exists() else ""
+    with metrics.span("test_buffered"):
+        pass
+    assert (trace.read_text(encoding="utf-8") if trace.exists() else "") == before
+    assert any(r["name"] == "test_buffered" for r in _records(trace) if r["type"] == "span")
+
+def test_trace_rolls_over(trace):
+    metrics.configure(True, str(trace), trace_max_bytes=200)
+    for _ in range(10):
+        with metrics.span("test_rollover"):
+            pass
+        metrics.flush_trace()
+    rolled = trace.with_name("traces.jsonl.1")
+    assert rolled.exists() and rolled.stat().st_size >= 200
+    assert all(r["name"] == "test_rollover" for r in map(json.loads, rolled.read_text(encoding="utf-8").splitlines()))
+
+def test_trace_io_does_not_block_the_counters(trace, monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_FLUSH_LINES", 1)
+    done = threading.Event()
+
+    def traced_span():
+        with metrics.span("test_slow_write"):
+            pass
+
+    def read_metrics():
+        metrics.render_prometheus()
+        metrics.record_queue_depth("gpt-4o", "interactive", 2)
+        done.set()
+    with metrics._trace_lock:  # a slow trace write in progress
+        writer = threading.Thread(target=traced_span, daemon=True)
+        writer.start()
+        writer.join(0.1)
+        assert writer.is_alive()  # waiting to write its record...
+        threading.Thread(target=read_metrics, daemon=True).start()
+        assert done.wait(2.0)  # ...while readers and other counters carry on
+    writer.join(2.0)
+    assert 'phase="test_slow_write"' in metrics.render_prometheus()
+
+def test_prometheus_exposition(trace):
+    with metrics.span("test_prom"):
+        pass
+    metrics.record_llm_call("test-model", 10, 5)
+    metrics.record_retry("test-model", "429")
+    text = metrics.render_prometheus()
+    assert text.endswith("\n")
+    assert 'prompt_optimizer_phase_seconds_count{phase="test_prom"} 1' in text
+    assert 'prompt_optimizer_llm_calls_total{model="test-model",cached="false"} 1' in text
+    assert 'prompt_optimizer_llm_tokens_total{model="test-model",cached="false",kind="completion"} 5' in text
+    assert 'prompt_optimizer_llm_retries_total{model="test-model",reason="429"} 1' in text
+    for line in text.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2
+
+def test_disabled_metrics_record_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_enabled", False)
+    assert metrics.span("test_disabled") is metrics._NULL_SPAN
+    metrics.record_llm_call("test-disabled-model", 10, 5)
+    assert "test-disabled-model" not in metrics.render_prometheus()
@@ -0,0 +1,74 @@
+import re
+import pytest
+from benchmarks.fake_llm import fake_generation_text
+from core.pipeline import extract_candidates, CandidateStreamParser
+
+FIELDS = ("candidate", "strategy", "prompt", "rationale")
+
+def baseline_extract(content: str):
+    """The regex extractor CandidateScanner replaced, kept as the parity reference."""
+    candidate_pattern = re.compile(r"(Candidate [A-Z]:\s*Strategy:.*?)(?=Candidate [A-Z]:|$)", re.DOTALL)
+    strategy_pattern = re.compile(r"Strategy:\s*(.*?)(?:\n|$)", re.DOTALL)
+    prompt_pattern = re.compile(r"Prompt:\s*\"{0,1}(.*?)(?<!\\)\"{0,1}\s*(?:\n|$)", re.DOTALL)
+    rationale_pattern = re.compile(r"Rationale:\s*(.*?)(?=\n(?:Candidate [A-Z]:|$)|$)", re.DOTALL)
+    out = []
+    for match in candidate_pattern.finditer(content):
+        block = match.group(1)
+        strategy, prompt, rationale = (p.search(block) for p in (strategy_pattern, prompt_pattern, rationale_pattern))
+        out.append({
+            "candidate": re.match(r"Candidate ([A-Z]):", block).group(1),
+            "strategy": strategy.group(1).strip() if strategy else "",
+            "prompt": prompt.group(1).strip() if prompt else "",
+            "rationale": rationale.group(1).strip() if rationale else "",
+        })
+    return out
+
+def fields(candidates):
+    return [{k: c[k] for k in FIELDS} for c in candidates]
+
+PARITY_CASES = {
+    "fake_llm": fake_generation_text(n_candidates=5, prompt_words=40),
+    "unquoted": "Candidate A:\nStrategy: Role first.\nPrompt: Act as an editor.\nRationale: Sets the voice.\n",
+    "intro_prose": "Here are two options.\n\nCandidate A:\nStrategy: s1\nPrompt: \"p1\"\nRationale: r1\n\n"
+                   "Candidate B:\nStrategy: s2\nPrompt: \"p2\"\nRationale: r2",
+    "trailing_prose": "Candidate A:\nStrategy: s1\nPrompt: \"p1\"\nRationale: r1\n\n"
+                      "Candidate B:\nStrategy: s2\nPrompt: \"p2\"\nRationale: r2\n\n"
+                      "Both options keep the word limit.\nLet me know if you want more.",
+    "multiline_rationale": "Candidate A:\nStrategy: s1\nPrompt: p1\nRationale: r1\nand more r1\n"
+                           "Candidate B:\nStrategy: s2\nPrompt: p2\nRationale: r2",
+    "missing_rationale": "Candidate A:\nStrategy: s1\nPrompt: \"p1\"\nCandidate B:\nStrategy: s2\nPrompt: \"p2\"",
+    "escaped_quote": "Candidate A:\nStrategy: s1\nPrompt: \"Say \\\"hi\\\"\nRationale: r1",
+}
+
+@pytest.mark.parametrize("name", sorted(PARITY_CASES))
+def test_matches_baseline(name):
+    content = PARITY_CASES[name]
+    assert fields(extract_candidates(content)) == baseline_extract(content)
+
+@pytest.mark.parametrize("name", sorted(PARITY_CASES))
+def test_streaming_matches_whole_text(name):
+    content = PARITY_CASES[name]
+    parser = CandidateStreamParser()
+    streamed = []
+    for i in range(0, len(content), 7):
+        streamed += parser.feed(content[i:i + 7])
+    streamed += parser.close()
+    assert fields(streamed) == fields(extract_candidates(content))
+
+def test_duplicate_prompt_lines_are_appended():
+    content = "Candidate A:\nStrategy: s1\nPrompt: \"Write the email.\"\nPrompt: \"Keep it under 100 words.\"\nRationale: r1"
+    (c,) = extract_candidates(content)
+    # The baseline kept only the first line; later lines used to overwrite it
+    assert c["prompt"].startswith(baseline_extract(content)[0]["prompt"])
+    assert c["prompt"] == "Write the email.\nKeep it under 100 words."
+    assert c["rationale"] == "r1"
+
+def test_duplicate_rationale_lines_are_appended():
+    (c,) = extract_candidates("Candidate A:\nStrategy: s1\nPrompt: p1\nRationale: r1\nRationale: r2")
+    assert c["rationale"] == "r1\nr2"
+
+def test_explicit_prompt_wins_over_implicit_text():
+    (c,) = extract_candidates("Candidate A:\nStrategy: s1\nDraft text picked up early\nPrompt: \"p1\"\nRationale: r1")
+    assert c["prompt"] == "p1"
+    (c,) = extract_candidates("Candidate A:\nStrategy: s1\n\"Bare prompt\"\nRationale: r1")
+    assert c["prompt"] == "Bare prompt"
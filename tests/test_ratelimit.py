@@ -0,0 +1,113 @@
+import time
+import asyncio
+import threading
+import pytest
+from core.ratelimit import RateLimiter, TokenBucket, is_retryable, INTERACTIVE, BATCH
+
+class APIError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}, "status_code": status_code})()
+
+def _flaky(failures):
+    """fn() raising each exception in `failures` once, then returning "ok"."""
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "ok"
+    return fn, calls
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60)  # one per second
+    now = bucket.updated
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+    # A request larger than the bucket waits for a full bucket, not forever
+    assert bucket.wait_time(600, now + 1.0) == pytest.approx(59.0)
+
+def test_acquire_waits_for_the_request_bucket():
+    limiter = RateLimiter("m", rpm=600, tpm=100000)  # one request per 0.1 s
+    limiter._requests.level = 0
+    started = time.monotonic()
+    limiter.acquire(10)
+    assert time.monotonic() - started >= 0.09
+    assert limiter.stats()["tokens_available"] < 100000
+
+def test_settle_returns_unused_tokens():
+    limiter = RateLimiter("m", rpm=600, tpm=1000)
+    limiter.acquire(800)
+    limiter.settle(800, 100)
+    assert limiter.stats()["tokens_available"] == pytest.approx(900, abs=5)
+
+def test_interactive_overtakes_queued_batch_work():
+    limiter = RateLimiter("m", rpm=120, tpm=100000)  # one request per 0.5 s
+    limiter._requests.level = 0
+    order = []
+
+    def worker(priority, name):
+        limiter.acquire(1, priority)
+        order.append(name)
+    batch = threading.Thread(target=worker, args=(BATCH, "batch"))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=worker, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+def test_retryable_errors_are_retried():
+    limiter = RateLimiter("m", base_delay=0.001, max_delay=0.01)
+    fn, calls = _flaky([APIError(429), APIError(503)])
+    assert limiter.call(fn, 1) == "ok"
+    assert len(calls) == 3 and limiter.retries == 2
+
+def test_async_calls_are_retried():
+    limiter = RateLimiter("m", base_delay=0.001, max_delay=0.01)
+    fn, calls = _flaky([APIError(429)])
+
+    async def call():
+        return fn()
+    assert asyncio.run(limiter.acall(call, 1)) == "ok"
+    assert len(calls) == 2
+
+def test_client_errors_and_exhausted_retries_raise():
+    limiter = RateLimiter("m", max_retries=1, base_delay=0.001)
+    fn, calls = _flaky([APIError(400)])
+    with pytest.raises(APIError):
+        limiter.call(fn, 1)
+    assert len(calls) == 1
+    fn, calls = _flaky([APIError(500), APIError(500)])
+    with pytest.raises(APIError):
+        limiter.call(fn, 1)
+    assert len(calls) == 2
+
+def test_retry_after_pauses_the_queue():
+    limiter = RateLimiter("m", base_delay=0.001, max_delay=0.001)
+    fn, calls = _flaky([APIError(429, {"retry-after-ms": "200"})])
+    assert limiter.call(fn, 1) == "ok"
+    assert calls[1] - calls[0] >= 0.19
+
+def test_retry_after_holds_other_callers():
+    limiter = RateLimiter("m", base_delay=0.001, max_delay=0.001)
+    limiter._backoff(0, APIError(429, {"retry-after": "0.2"}))
+    started = time.monotonic()
+    limiter.acquire(1)  # a different caller, not the one that was throttled
+    assert time.monotonic() - started >= 0.19
+
+@pytest.mark.parametrize("exc, expected", [
+    (APIError(429), True),
+    (APIError(502), True),
+    (APIError(401), False),
+    (TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ValueError("bad json"), False),
+])
+def test_is_retryable(exc, expected):
+    assert is_retryable(exc) is expected
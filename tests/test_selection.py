@@ -0,0 +1,84 @@
+import re
+import json
+import pytest
+import core.llm
+from core.cache import ResponseCache
+from core.eval import RUBRIC
+from core.selection import prefilter_candidates, successive_halving, select_candidates
+
+def _candidates(n):
+    return [{"candidate": chr(65 + q), "prompt": f"Act as an editor and write launch email variant [q{q}].",
+             "token_estimate": 12} for q in range(n)]
+
+class StubJudge:
+    """Scores each labelled prompt by its [qN] marker: higher N, higher weighted score."""
+    def __init__(self, invalid=False):
+        self.invalid = invalid
+        self.calls = []
+
+    def complete(self, prompt, **kwargs):
+        self.calls.append(kwargs.get("seed"))
+        if self.invalid:
+            text = "no scores"
+        else:
+            scores = {}
+            for label, q in re.findall(r"### (C\d+)\n.*?\[q(\d+)\]", prompt):
+                q = int(q)
+                scores[label] = dict({k: 3 for k in RUBRIC}, Clarity=1 + q // 2, Completeness=1 + q % 2)
+            text = json.dumps(scores)
+        return type("Response", (), {"text": text, "raw": None})()
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.llm, "get_response_cache", lambda: ResponseCache(path=str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(core.llm.ratelimit, "enabled", lambda: False)
+
+def _halve(n, judge, **kwargs):
+    return successive_halving(_candidates(n), "gpt-4o", "fake-key", llm=judge, use_cache=False, **kwargs)
+
+def test_prefilter_drops_duplicates_empty_and_over_budget():
+    pool = _candidates(4) + [
+        {"prompt": "  ACT as an editor and write launch email variant [q0].  ", "token_estimate": 12},
+        {"prompt": "   ", "token_estimate": 0},
+        {"prompt": "An overlong prompt.", "token_estimate": 999},
+    ]
+    kept = prefilter_candidates(pool, keep=10, max_prompt_tokens=100)
+    assert sorted(c["candidate"] for c in kept) == ["A", "B", "C", "D"]
+    assert all("heuristics" in c and "heuristic_score" in c for c in kept)
+    assert [c["heuristic_score"] for c in kept] == sorted((c["heuristic_score"] for c in kept), reverse=True)
+    assert len(prefilter_candidates(pool, keep=2, max_prompt_tokens=100)) == 2
+
+def test_successive_halving_rounds_and_calls():
+    judge = StubJudge()
+    ranked, stats = _halve(8, judge, final_k=2, eta=2, group_size=4)
+    # 8 -> 4 survivors (two groups), then 4 -> 2 (one group)
+    assert stats == dict(stats, rounds=2, judge_calls=3, budget_exhausted=False)
+    assert sorted(judge.calls) == [0, 0, 1]  # a fresh seed per round, no retries
+    assert [c["candidate"] for c in ranked] == ["H", "G"]
+    assert all(c["judge_rounds"] == 2 and c["judge"]["Clarity"] == 4 for c in ranked)
+
+def test_invalid_judge_reply_is_not_retried():
+    judge = StubJudge(invalid=True)
+    ranked, stats = _halve(8, judge, final_k=2, group_size=4)
+    assert len(judge.calls) == stats["judge_calls"]
+    assert all(c["judge"] is None and c["judge_mean"] is None for c in ranked)
+
+def test_judge_call_budget_stops_before_the_next_round():
+    judge = StubJudge()
+    ranked, stats = _halve(8, judge, final_k=2, group_size=4, max_judge_calls=2)
+    assert stats == dict(stats, rounds=1, judge_calls=2, budget_exhausted=True)
+    assert len(judge.calls) == 2
+    assert [c["candidate"] for c in ranked] == ["H", "G"]
+
+def test_judge_token_budget_stops_before_any_call():
+    judge = StubJudge()
+    ranked, stats = _halve(8, judge, final_k=3, max_judge_tokens=10)
+    assert stats == dict(stats, rounds=0, judge_calls=0, judge_tokens_est=0, budget_exhausted=True)
+    assert judge.calls == [] and len(ranked) == 3
+
+def test_select_candidates_relabels_the_winners():
+    ranked, stats = select_candidates(_candidates(6), "gpt-4o", "fake-key", prefilter_keep=4, final_k=2,
+                                      use_cache=False, llm=StubJudge())
+    assert [c["candidate"] for c in ranked] == ["A", "B"]
+    assert all(c["pool_label"] in "ABCDEF" for c in ranked)
+    assert stats == dict(stats, pool=6, prefiltered=4, linear_judge_calls=6)
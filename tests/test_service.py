@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from benchmarks.fake_llm import use_fake_llm
+from core import service
+
+@pytest.fixture(autouse=True)
+def no_prewarm(monkeypatch):
+    monkeypatch.setattr(service.warmup, "prewarm_from_settings", lambda *args, **kwargs: None)
+
+def _serve(test, **kwargs):
+    """Runs `await test(client, app)` against a fresh in-process service."""
+    async def run():
+        app = service.create_app(openai_api_key="fake-key", **kwargs)
+        async with TestClient(TestServer(app)) as client:
+            await test(client, app)
+    asyncio.run(run())
+
+def _blocking(release: threading.Event):
+    def endpoint(payload, openai_api_key):
+        release.wait(5)
+        return {"echo": payload["prompt"]}
+    return endpoint
+
+async def _wait_for(client, **expected):
+    for _ in range(200):
+        stats = await (await client.get("/v1/stats")).json()
+        if stats == dict(stats, **expected):
+            return stats
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"stats never reached {expected}: {stats}")
+
+def test_analyze_runs_the_pipeline():
+    async def test(client, app):
+        resp = await client.post("/v1/analyze", json={"prompt": "Write a launch email", "task_type": "Creative"})
+        assert resp.status == 200 and "X-Elapsed-S" in resp.headers
+        body = await resp.json()
+        assert body["deconstruct"]["intent"] and "issues" in body["diagnose"]
+    with use_fake_llm(latency=0.0):
+        _serve(test)
+
+def test_submitted_job_is_visible_until_it_completes(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(service.ENDPOINTS, "analyze", _blocking(release))
+
+    async def test(client, app):
+        request = asyncio.ensure_future(client.post("/v1/analyze", json={"prompt": "p"}))
+        await _wait_for(client, in_flight=1, completed=0)
+        release.set()
+        resp = await request
+        assert resp.status == 200 and await resp.json() == {"echo": "p"}
+        await _wait_for(client, in_flight=0, completed=1)
+    _serve(test, workers=1)
+
+def test_full_queue_answers_503(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(service.ENDPOINTS, "analyze", _blocking(release))
+
+    async def test(client, app):
+        running = asyncio.ensure_future(client.post("/v1/analyze", json={"prompt": "1"}))
+        await _wait_for(client, in_flight=1)
+        queued = asyncio.ensure_future(client.post("/v1/analyze", json={"prompt": "2"}))
+        await _wait_for(client, queued=1)
+        resp = await client.post("/v1/analyze", json={"prompt": "3"})
+        assert resp.status == 503 and resp.headers["Retry-After"] == "1"
+        release.set()
+        assert [r.status for r in await asyncio.gather(running, queued)] == [200, 200]
+        await _wait_for(client, completed=2, rejected=1)
+        assert app[service.JOBS].rejected == 1
+    _serve(test, workers=1, queue_size=1)
+
+@pytest.mark.parametrize("error, status", [(KeyError("prompt"), 400), (ValueError("bad"), 400),
+                                           (RuntimeError("upstream down"), 500)])
+def test_job_errors_are_propagated(monkeypatch, error, status):
+    def endpoint(payload, openai_api_key):
+        raise error
+    monkeypatch.setitem(service.ENDPOINTS, "evaluate", endpoint)
+
+    async def test(client, app):
+        resp = await client.post("/v1/evaluate", json={"candidates": []})
+        assert resp.status == status
+        assert type(error).__name__ in (await resp.json())["error"]
+        await _wait_for(client, failed=1)
+    _serve(test)
+
+def test_invalid_body_and_auth():
+    async def test(client, app):
+        assert (await client.post("/v1/analyze", data="not json")).status == 400
+        assert (await client.post("/v1/analyze", json=["p"])).status == 400
+        assert (await client.get("/healthz")).status == 200
+    _serve(test)
+
+    async def guarded(client, app):
+        assert (await client.post("/v1/analyze", json={"prompt": "p"})).status == 401
+        assert (await client.get("/healthz")).status == 200
+    _serve(guarded, auth_token="secret")